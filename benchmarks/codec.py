@@ -0,0 +1,76 @@
+"""
+Benchmark of compressed image archive.
+
+Encodes batch of synthetic images with each transform and compression ratio into archive created with
+`src.codec.write_images`, then decodes it, reporting encode and decode throughput in MB/s of float64 images,
+compression ratio of the archive size to the raw image size and PSNR of decoded images.
+Run from the repository root with `python -m benchmarks.codec`.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.codec import read_images, write_images
+from src.conv import convolve
+from src.fourier import CompressionTransform, FourierTransform2D, WaveletTransform2D
+
+
+def synthetic_images(n_images: int, size: int) -> NDArray:
+    """Smooth random images with some noise, which are compressible similarly to natural images"""
+    kernel = np.outer(np.hanning(15), np.hanning(15))
+    noise = np.random.rand(n_images, size, size)
+    images = convolve(noise, kernel / kernel.sum(), mode="valid", backend="vectorized", axes=(1, 2))
+    # stretch each image to [0, 1] range, since smoothing averages noise to nearly constant value
+    low, high = images.min(axis=(1, 2), keepdims=True), images.max(axis=(1, 2), keepdims=True)
+    return (images - low) / (high - low) + 0.01 * np.random.randn(*images.shape)
+
+
+def benchmark(images: NDArray, transform: CompressionTransform, compression: float, bits: int) -> None:
+    """Prints single row of the benchmark table"""
+    megabytes = images.nbytes / 2**20
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "images.mvcz")
+
+        start = time.perf_counter()
+        write_images(path, images, transform, compression, bits)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoded = np.asarray(list(read_images(path)))
+        decode_time = time.perf_counter() - start
+        ratio = images.nbytes / os.path.getsize(path)
+
+    psnr = 10 * np.log10((images.max() - images.min()) ** 2 / np.mean((images - decoded) ** 2))
+    name = type(transform).__name__ + (" (real)" if getattr(transform, "real", False) else "")
+    print(
+        f"{name:>26} {compression:>12.2f} {bits:>5} {megabytes / encode_time:>10.1f} {megabytes / decode_time:>10.1f} "
+        f"{ratio:>8.1f}x {psnr:>8.2f}dB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=16, help="number of images")
+    parser.add_argument("--size", type=int, default=512, help="height and width of images")
+    args = parser.parse_args()
+
+    images = synthetic_images(args.images, args.size)
+    print(f"{images.shape[0]} images of shape {images.shape[1:]}, {images.nbytes / 2**20:.1f} MB")
+    print(
+        f"{'transform':>26} {'compression':>12} {'bits':>5} {'enc MB/s':>10} {'dec MB/s':>10} {'ratio':>9} {'PSNR':>10}"
+    )
+
+    transforms = [FourierTransform2D(), FourierTransform2D(real=True), WaveletTransform2D("db2", 3)]
+    for transform in transforms:
+        for compression in [0.9, 0.99]:
+            for bits in [8, 16]:
+                benchmark(images, transform, compression, bits)
+
+
+if __name__ == "__main__":
+    main()
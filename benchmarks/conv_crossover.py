@@ -0,0 +1,60 @@
+"""
+Crossover benchmark for convolution methods.
+
+Sweeps kernel sizes for fixed signal sizes and reports the time of each method of `src.conv.convolve` next to the
+method selected by `choose_conv_method`, showing where direct convolution stops being faster than FFT convolution.
+Run from the repository root with `python -m benchmarks.conv_crossover`.
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+
+from src.conv import choose_conv_method, convolve
+
+
+def measure(func: Callable[[], object], repeats: int) -> float:
+    """Returns the best wall time of `repeats` runs in seconds"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def crossover(signal_shape: tuple[int, ...], kernel_sizes: list[int], methods: list[str], repeats: int) -> None:
+    """Prints timing table for all methods and kernel sizes for signal of given shape"""
+    signal = np.random.randn(*signal_shape)
+    print(f"\nsignal shape: {signal_shape}")
+    print(f"{'kernel':>8} " + " ".join(f"{method:>12}" for method in methods) + f" {'fastest':>12} {'auto':>12}")
+
+    for kernel_size in kernel_sizes:
+        kernel = np.random.randn(*[kernel_size] * len(signal_shape))
+        times = {
+            method: measure(lambda: convolve(signal, kernel, method=method, backend="vectorized"), repeats)
+            for method in methods
+        }
+        fastest = min(times, key=times.get)  # type: ignore
+        selected = choose_conv_method(signal.shape, kernel.shape)
+
+        row = " ".join(f"{times[method] * 1000:>10.2f}ms" for method in methods)
+        print(f"{kernel_size:>8} {row} {fastest:>12} {selected:>12}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3, help="number of runs, the best time is reported")
+    args = parser.parse_args()
+
+    crossover((2**16,), [3, 9, 17, 33, 65, 129, 257], ["direct", "fft", "overlap-add"], args.repeats)
+    crossover((2**20,), [3, 9, 17, 33, 65, 129, 257], ["direct", "fft", "overlap-add"], args.repeats)
+    crossover((512, 512), [3, 5, 7, 9, 11, 15, 21, 31], ["direct", "fft"], args.repeats)
+    crossover((2048, 2048), [3, 5, 7, 9, 11, 15, 21, 31], ["direct", "fft"], args.repeats)
+
+
+if __name__ == "__main__":
+    main()
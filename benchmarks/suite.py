@@ -0,0 +1,323 @@
+"""
+Benchmark suite with scaling curves and regression gates.
+
+Each case runs a function from `src` for a sweep of input sizes and records the best wall time, throughput in
+input elements per second and peak memory allocated during the call (measured with `tracemalloc`, which tracks
+numpy allocations). Scaling exponent of time with the number of elements is fitted on log-log scale, so 1 means
+linear scaling. Convolution cases are generated from all values of `backend` and `method` arguments of
+`src.conv.convolve`, so every new backend is measured without changes to the suite.
+
+Results are saved as JSON and can be compared with a baseline, the run fails, when any case is slower or uses more
+memory than the baseline by more than the threshold. Run from the repository root with:
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --baseline baseline.json --threshold 0.25
+"""
+
+import argparse
+import inspect
+import json
+import platform
+import re
+import sys
+import tracemalloc
+from typing import Callable, NamedTuple, get_args
+
+import numpy as np
+
+from benchmarks.conv_crossover import measure
+from src.conv import convolve
+from src.downsampling import downsample
+from src.fourier import FourierTransform2D, WaveletTransform2D, compress_and_decompress
+from src.interpolate import kernels
+from src.interpolate.core import image_interpolate1d, image_interpolate2d
+from src.interpolate.dirac import dirac_interpolate, dirac_interpolate2d
+
+Setup = Callable[[int], tuple[Callable[[], object], int]]
+
+_CONV_BACKENDS = get_args(inspect.signature(convolve).parameters["backend"].annotation)
+_CONV_METHODS = get_args(inspect.signature(convolve).parameters["method"].annotation)
+
+
+class Case(NamedTuple):
+    """
+    Single benchmark case
+
+    :param name: unique name of the case, used as key in JSON results
+    :param setup: function creating inputs for given size, returns function to measure and number of input elements
+    :param sizes: swept sizes, such as signal length or image side
+    """
+
+    name: str
+    setup: Setup
+    sizes: tuple[int, ...]
+
+
+def _image(size: int) -> np.ndarray:
+    return np.random.default_rng(0).random((size, size))
+
+
+def _convolve_setup(ndim: int, kernel_size: int, **kwargs) -> Setup:
+    def setup(size: int) -> tuple[Callable[[], object], int]:
+        signal = np.random.default_rng(0).random([size] * ndim)
+        kernel = np.random.default_rng(1).random([kernel_size] * ndim)
+        return lambda: convolve(signal, kernel, **kwargs), signal.size
+
+    return setup
+
+
+def _convolve_cases() -> list[Case]:
+    cases = []
+    for backend in _CONV_BACKENDS:
+        for method in _CONV_METHODS:
+            if method != "direct" and backend != _CONV_BACKENDS[0]:
+                continue  # backend is used only by the direct method
+
+            # loop backend is the readable reference implementation, so it is measured on small inputs
+            sizes_1d, sizes_2d = (
+                ((256, 1024, 4096), (32, 64, 128)) if backend == "loop" else ((2**14, 2**16, 2**18), (128, 256, 512))
+            )
+            for mode in ("full", "valid"):
+                for step in (1, 2):
+                    for kernel_size in (3, 9, 31):
+                        kwargs = dict(step=step, mode=mode, backend=backend, method=method)
+                        implementation = backend if method == "direct" else method
+                        name = f"convolve/{implementation}/{mode}/step={step}/kernel={kernel_size}"
+                        cases.append(Case(f"{name}/1d", _convolve_setup(1, kernel_size, **kwargs), sizes_1d))
+                        if method != "overlap-add":  # overlap-add supports only 1D signals
+                            cases.append(Case(f"{name}/2d", _convolve_setup(2, kernel_size, **kwargs), sizes_2d))
+
+    return cases
+
+
+def _kernel_setup(kernel: Callable, ndim: int) -> Setup:
+    def setup(size: int) -> tuple[Callable[[], object], int]:
+        x = np.random.default_rng(0).uniform(-3, 3, size=(size, 2) if ndim == 2 else size)
+        return lambda: kernel(x, offset=0, width=1), size
+
+    return setup
+
+
+def _kernel_cases() -> list[Case]:
+    # every kernel function of the module, which are named "<name>_kernel" and "<name>_kernel2d"
+    names = [
+        name for name, _ in inspect.getmembers(kernels, inspect.isfunction) if re.fullmatch(r"\w+_kernel(2d)?", name)
+    ]
+    return [
+        Case(
+            f"kernels/{name}",
+            _kernel_setup(getattr(kernels, name), 2 if name.endswith("2d") else 1),
+            (2**14, 2**17, 2**20),
+        )
+        for name in names
+    ]
+
+
+def _interpolate_cases() -> list[Case]:
+    def interpolate1d(kernel: Callable) -> Setup:
+        def setup(size: int) -> tuple[Callable[[], object], int]:
+            image = _image(size)
+            return lambda: image_interpolate1d(image, kernel, ratio=2), image.size
+
+        return setup
+
+    def interpolate2d(kernel: Callable) -> Setup:
+        def setup(size: int) -> tuple[Callable[[], object], int]:
+            image = _image(size)
+            return lambda: image_interpolate2d(image, kernel, ratio=2), image.size
+
+        return setup
+
+    return [
+        Case("image_interpolate1d/linear", interpolate1d(kernels.linear_kernel), (128, 256, 512, 1024)),
+        Case("image_interpolate1d/keys", interpolate1d(kernels.keys_kernel), (128, 256, 512, 1024)),
+        Case("image_interpolate1d/sinc", interpolate1d(kernels.sinc_kernel), (64, 128, 256)),
+        Case("image_interpolate2d/linear", interpolate2d(kernels.linear_kernel2d), (32, 64, 128)),
+        Case("image_interpolate2d/keys", interpolate2d(kernels.keys_kernel2d), (32, 64, 128)),
+    ]
+
+
+def _dirac_cases() -> list[Case]:
+    def interpolate(method: str) -> Setup:
+        def setup(size: int) -> tuple[Callable[[], object], int]:
+            x = np.linspace(0, 1, size)
+            y = np.random.default_rng(0).random(size)
+            return lambda: dirac_interpolate(x, y, 4, 33, 1.0, kernels.keys_kernel, method=method), size
+
+        return setup
+
+    def interpolate2d(size: int) -> tuple[Callable[[], object], int]:
+        image = _image(size)
+        return lambda: dirac_interpolate2d(image, 2, 9, 1.0, kernels.keys_kernel), image.size
+
+    return [
+        Case("dirac_interpolate/polyphase", interpolate("polyphase"), (2**12, 2**15, 2**18)),
+        Case("dirac_interpolate/zero-stuffing", interpolate("zero-stuffing"), (2**12, 2**15, 2**18)),
+        Case("dirac_interpolate2d", interpolate2d, (128, 256, 512, 1024)),
+    ]
+
+
+def _downsample_cases() -> list[Case]:
+    def setup_downsample(kernel_size: int, boundary: str) -> Setup:
+        def setup(size: int) -> tuple[Callable[[], object], int]:
+            image = _image(size)
+            return lambda: downsample(image, kernel_size, boundary=boundary), image.size
+
+        return setup
+
+    return [
+        Case(
+            f"downsample/kernel={kernel_size}/{boundary}",
+            setup_downsample(kernel_size, boundary),
+            (256, 512, 1024, 2048),
+        )
+        for kernel_size in (2, 3)
+        for boundary in ("crop", "partial")
+    ]
+
+
+def _compression_cases() -> list[Case]:
+    def compress(transform: object) -> Setup:
+        def setup(size: int) -> tuple[Callable[[], object], int]:
+            image = _image(size)
+            return lambda: compress_and_decompress(image, transform, compression=0.9), image.size
+
+        return setup
+
+    transforms = {
+        "fourier": FourierTransform2D(),
+        "fourier-real": FourierTransform2D(real=True),
+        "wavelet-db4": WaveletTransform2D("db4", level=3),
+    }
+    return [
+        Case(f"compress_and_decompress/{name}", compress(t), (128, 256, 512, 1024)) for name, t in transforms.items()
+    ]
+
+
+def all_cases() -> list[Case]:
+    """All benchmark cases of the suite"""
+    return (
+        _convolve_cases()
+        + _kernel_cases()
+        + _interpolate_cases()
+        + _dirac_cases()
+        + _downsample_cases()
+        + _compression_cases()
+    )
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    """Returns peak memory in bytes allocated during single run of the function"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case: Case, repeats: int) -> dict:
+    """Runs the case for all sizes, returns its scaling curve and fitted scaling exponent"""
+    curve = {}
+    for size in case.sizes:
+        func, n_elements = case.setup(size)
+        func()  # warm-up run fills caches, such as kernel weights or FFT plans
+        seconds = measure(func, repeats)
+        curve[str(size)] = {
+            "elements": n_elements,
+            "seconds": seconds,
+            "throughput": n_elements / seconds,
+            "peak_bytes": peak_memory(func),
+        }
+
+    elements = [point["elements"] for point in curve.values()]
+    seconds = [point["seconds"] for point in curve.values()]
+    exponent = float(np.polyfit(np.log(elements), np.log(seconds), 1)[0]) if len(curve) > 1 else None
+    return {"curve": curve, "exponent": exponent}
+
+
+def compare(results: dict, baseline: dict, threshold: float, memory_threshold: float) -> list[str]:
+    """
+    Compares results with the baseline, only cases and sizes present in both are compared
+
+    :param results: cases of the current run, as returned by `run_case`, keyed by case name
+    :param baseline: cases of the baseline run in the same format
+    :param threshold: allowed relative increase of time, such as 0.25 for 25% slower
+    :param memory_threshold: allowed relative increase of peak memory
+
+    :return: descriptions of all regressions, empty when there are none
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline_curve = baseline.get(name, {}).get("curve", {})
+        for size, point in result["curve"].items():
+            if size not in baseline_curve:
+                continue
+
+            reference = baseline_curve[size]
+            if point["seconds"] > reference["seconds"] * (1 + threshold):
+                change = point["seconds"] / reference["seconds"] - 1
+                regressions.append(
+                    f"{name} size={size}: time {reference['seconds'] * 1000:.3f}ms -> "
+                    f"{point['seconds'] * 1000:.3f}ms (+{change:.0%})"
+                )
+            if point["peak_bytes"] > reference["peak_bytes"] * (1 + memory_threshold):
+                change = point["peak_bytes"] / max(reference["peak_bytes"], 1) - 1
+                regressions.append(
+                    f"{name} size={size}: peak memory {reference['peak_bytes'] / 2**20:.2f}MB -> "
+                    f"{point['peak_bytes'] / 2**20:.2f}MB (+{change:.0%})"
+                )
+
+    return regressions
+
+
+def _print_result(name: str, result: dict) -> None:
+    exponent = "-" if result["exponent"] is None else f"{result['exponent']:.2f}"
+    print(f"\n{name} (scaling exponent {exponent})")
+    print(f"{'size':>10} {'time':>12} {'throughput':>16} {'peak memory':>14}")
+    for size, point in result["curve"].items():
+        print(
+            f"{size:>10} {point['seconds'] * 1000:>10.3f}ms {point['throughput'] / 1e6:>10.2f}Melem/s "
+            f"{point['peak_bytes'] / 2**20:>12.2f}MB"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="regular expression, only cases with matching names are run")
+    parser.add_argument("--repeats", type=int, default=5, help="number of runs, the best time is reported")
+    parser.add_argument("--quick", action="store_true", help="run only the two smallest sizes of each case")
+    parser.add_argument("--output", help="path of JSON file to save the results, which can be used as a baseline")
+    parser.add_argument("--baseline", help="path of JSON file with baseline results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative increase of time")
+    parser.add_argument("--memory-threshold", type=float, default=0.1, help="allowed relative increase of memory")
+    parser.add_argument("--list", action="store_true", help="print names of the cases and exit")
+    args = parser.parse_args()
+
+    cases = [case for case in all_cases() if re.search(args.filter, case.name)]
+    if args.list:
+        print("\n".join(case.name for case in cases))
+        return
+
+    results = {}
+    for case in cases:
+        results[case.name] = run_case(case._replace(sizes=case.sizes[:2]) if args.quick else case, args.repeats)
+        _print_result(case.name, results[case.name])
+
+    if args.output:
+        environment = {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()}
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment, "cases": results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["cases"]
+
+        regressions = compare(results, baseline, args.threshold, args.memory_threshold)
+        print(f"\n{len(regressions)} regressions compared to {args.baseline}")
+        print("\n".join(regressions))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
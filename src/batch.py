@@ -0,0 +1,274 @@
+"""
+Batch processing of image files.
+
+Applies chain of operations to all images in directories or matching glob patterns and writes results with the same
+file names into the output directory. Images are decoded by a pool of threads, at most `--prefetch` images ahead of
+the processing, processed in batches of images of the same shape and encoded in background, so file I/O overlaps
+with computation. Run from the repository root, for example:
+    python -m src.batch data/ --output out/ --op convolve:gaussian5 --op downsample:2 --op interpolate:2:keys
+    python -m src.batch "data/*.jpg" --output out/ --op compress:wavelet:0.95:db4:3 --batch-size 16
+
+Operations:
+    convolve:<kernel>                           same size convolution with named kernel, gaussian<size>, mean<size>,
+                                                sharpen, laplacian, sobel-x or sobel-y
+    downsample:<size>                           block mean downsampling
+    interpolate:<ratio>[:<kernel>]              kernel interpolation, kernel is keys (default), linear, sinc,
+                                                nearest or sample-hold
+    compress:fourier:<compression>              Fourier compression removing given ratio of coefficients
+    compress:wavelet:<compression>[:<name>:<level>]  wavelet compression, defaults to db4 wavelet with 3 levels
+
+Linear operations (convolve, downsample and interpolate) are fused and evaluated in tiles, see `src.pipeline`.
+"""
+
+import argparse
+import glob
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import numpy as np
+from numpy.typing import NDArray
+from skimage import io
+
+from src.fourier import FourierTransform2D, WaveletTransform2D, compress_and_decompress
+from src.interpolate import kernels
+from src.pipeline import Pipeline
+from src.poisson import filter_kernel
+from src.profiling import REGISTRY
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+NAMED_KERNELS = {
+    "sharpen": np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=float),
+    "laplacian": np.array([[0, 1, 0], [1, -4, 1], [0, 1, 0]], dtype=float),
+    "sobel-x": np.array([[1, 0, -1], [2, 0, -2], [1, 0, -1]], dtype=float),
+    "sobel-y": np.array([[1, 2, 1], [0, 0, 0], [-1, -2, -1]], dtype=float),
+}
+
+INTERPOLATION_KERNELS = {
+    "keys": kernels.keys_kernel,
+    "linear": kernels.linear_kernel,
+    "sinc": kernels.sinc_kernel,
+    "nearest": kernels.nearest_neighbour_kernel,
+    "sample-hold": kernels.sample_hold_kernel,
+}
+
+
+class Operation(NamedTuple):
+    """Single operation of the chain, `name` is a method of `src.pipeline.Pipeline` or "compress" """
+
+    name: str
+    kwargs: dict
+
+
+class BatchReport(NamedTuple):
+    """Summary of processed images, wait times are spent by the main thread waiting for decoding or encoding"""
+
+    images: int
+    seconds: float
+    compute_seconds: float
+    decode_wait_seconds: float
+    encode_wait_seconds: float
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.seconds if self.seconds > 0 else 0.0
+
+
+def named_kernel(name: str) -> NDArray:
+    """Convolution kernel by its name, such as "gaussian5", "mean3" or "sobel-x" """
+    if match := re.fullmatch(r"(gaussian|mean)(\d+)", name):
+        return filter_kernel(match[1], int(match[2]))  # type: ignore
+    if name not in NAMED_KERNELS:
+        raise ValueError(f"Kernel {name} not supported!")
+
+    return NAMED_KERNELS[name]
+
+
+def parse_operation(spec: str) -> Operation:
+    """Parses operation given as colon separated name and arguments, such as "interpolate:2:keys" """
+    match spec.split(":"):
+        case ["convolve", kernel]:
+            kernel = named_kernel(kernel)
+            # padding of valid convolution with odd kernel keeps the size of the image
+            return Operation("convolve", dict(kernel=kernel, padding=(kernel.shape[0] - 1) // 2, mode="valid"))
+        case ["downsample", size]:
+            return Operation("downsample", dict(kernel_size=int(size)))
+        case ["interpolate", ratio, *kernel] if len(kernel) <= 1:
+            name = kernel[0] if kernel else "keys"
+            if name not in INTERPOLATION_KERNELS:
+                raise ValueError(f"Kernel {name} not supported!")
+            return Operation("interpolate", dict(kernel=INTERPOLATION_KERNELS[name], ratio=int(ratio)))
+        case ["compress", "fourier", compression]:
+            return Operation("compress", dict(transform=FourierTransform2D(real=True), compression=float(compression)))
+        case ["compress", "wavelet", compression, *wavelet] if len(wavelet) in (0, 2):
+            name, level = wavelet or ["db4", "3"]
+            transform = WaveletTransform2D(name, int(level))
+            return Operation("compress", dict(transform=transform, compression=float(compression)))
+        case _:
+            raise ValueError(f"Operation {spec} not supported!")
+
+
+def process_batch(batch: NDArray, operations: list[Operation]) -> NDArray:
+    """
+    Applies operations to batch of images
+
+    :param batch: (N, H, W) or (N, H, W, C) batch of images
+    :param operations: chain of operations, consecutive linear operations are fused
+    """
+    pipeline = Pipeline(batch, axes=(1, 2))
+    for operation in operations:
+        if operation.name == "compress":
+            compressed = compress_and_decompress(pipeline.evaluate(), axes=(1, 2), **operation.kwargs)
+            pipeline = Pipeline(compressed.astype(batch.dtype, copy=False), axes=(1, 2))
+        else:
+            pipeline = getattr(pipeline, operation.name)(**operation.kwargs)
+
+    return pipeline.evaluate()
+
+
+def find_images(inputs: Iterable[str]) -> list[str]:
+    """Image files in given directories or matching glob patterns, in sorted order"""
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths.extend(
+                sorted(str(path) for path in Path(pattern).iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+            )
+        else:
+            paths.extend(sorted(glob.glob(pattern)))
+
+    return paths
+
+
+def read_image(path: str) -> NDArray:
+    """Reads image as float32 array scaled to [0, 1] range, float32 is kept by all operations"""
+    image = io.imread(path)
+    if np.issubdtype(image.dtype, np.integer):
+        return image.astype(np.float32) / np.iinfo(image.dtype).max
+
+    return image.astype(np.float32, copy=False)
+
+
+def write_image(path: str, image: NDArray) -> None:
+    """Writes image clipped to [0, 1] range as 8-bit image"""
+    io.imsave(path, (np.clip(image, 0, 1) * 255 + 0.5).astype(np.uint8), check_contrast=False)
+
+
+def prefetch(executor: Executor, func: Callable, items: Iterable, size: int) -> Iterator:
+    """Maps function over items in executor, keeping at most `size` of them in flight, results are in order"""
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= size:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_files(
+    paths: list[str],
+    output: str,
+    operations: list[Operation],
+    batch_size: int = 8,
+    workers: int = 4,
+    prefetch_size: int = 16,
+) -> BatchReport:
+    """
+    Processes image files and writes results with the same names into the output directory
+
+    :param paths: paths of input images
+    :param output: output directory, which is created when it does not exist
+    :param operations: chain of operations, see `parse_operation`
+    :param batch_size: maximal number of images of the same shape processed at once
+    :param workers: number of threads decoding and encoding images
+    :param prefetch_size: maximal number of images decoded ahead of processing and waiting for encoding
+
+    :return: number of processed images and timings
+    """
+    os.makedirs(output, exist_ok=True)
+    compute_seconds, decode_wait, encode_wait = 0.0, 0.0, 0.0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(workers) as readers, ThreadPoolExecutor(workers) as writers:
+        images = zip(paths, prefetch(readers, read_image, paths, prefetch_size))
+        writes: deque = deque()
+        batch: list[tuple[str, NDArray]] = []
+
+        def flush() -> None:
+            nonlocal compute_seconds, encode_wait
+            compute_start = time.perf_counter()
+            processed = process_batch(np.stack([image for _, image in batch]), operations)
+            compute_seconds += time.perf_counter() - compute_start
+
+            for (path, _), result in zip(batch, processed):
+                writes.append(writers.submit(write_image, os.path.join(output, os.path.basename(path)), result))
+            batch.clear()
+
+            wait_start = time.perf_counter()
+            while len(writes) > prefetch_size:
+                writes.popleft().result()  # bounds memory held by pending results and raises errors of writes
+            encode_wait += time.perf_counter() - wait_start
+
+        while True:
+            wait_start = time.perf_counter()
+            path, image = next(images, (None, None))
+            decode_wait += time.perf_counter() - wait_start
+            if path is None:
+                break
+
+            # batches contain only images of the same shape, so they can be stacked
+            if batch and (len(batch) == batch_size or batch[0][1].shape != image.shape):
+                flush()
+            batch.append((path, image))
+
+        if batch:
+            flush()
+
+        wait_start = time.perf_counter()
+        for write in writes:
+            write.result()
+        encode_wait += time.perf_counter() - wait_start
+
+    return BatchReport(len(paths), time.perf_counter() - start, compute_seconds, decode_wait, encode_wait)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="directories or glob patterns of input images")
+    parser.add_argument("--output", required=True, help="output directory")
+    parser.add_argument("--op", dest="operations", type=parse_operation, action="append", default=[])
+    parser.add_argument("--batch-size", type=int, default=8, help="maximal number of images processed at once")
+    parser.add_argument("--workers", type=int, default=4, help="number of decoding and encoding threads")
+    parser.add_argument("--prefetch", type=int, default=16, help="maximal number of images decoded ahead")
+    parser.add_argument("--profile", help="path of Chrome trace of instrumented functions, see `src.profiling`")
+    args = parser.parse_args(argv)
+
+    paths = find_images(args.inputs)
+    if not paths:
+        parser.error("no images found")
+
+    if args.profile:
+        REGISTRY.clear()
+        REGISTRY.enable()
+
+    report = process_files(paths, args.output, args.operations, args.batch_size, args.workers, args.prefetch)
+    print(
+        f"processed {report.images} images in {report.seconds:.2f}s ({report.images_per_second:.1f} images/s), "
+        f"compute {report.compute_seconds:.2f}s, waiting for decoding {report.decode_wait_seconds:.2f}s "
+        f"and encoding {report.encode_wait_seconds:.2f}s"
+    )
+
+    if args.profile:
+        REGISTRY.disable()
+        REGISTRY.save_chrome_trace(args.profile)
+        print(REGISTRY.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+
+def working_dtype(*arrays: NDArray, dtype: DTypeLike = None) -> np.dtype:
+    """
+    Type used for computations on the arrays and for their output. Single precision inputs are processed in single
+    precision, so float32 (and float16) images are not converted to float64, which would double memory traffic.
+    Integer images, such as uint8, and double precision inputs are processed in float64.
+
+    :param arrays: input arrays, such as images, without kernels or weights, which are cast to the working type
+    :param dtype: explicit type, such as `np.float64` for double precision accumulation of float32 images
+    """
+    if dtype is not None:
+        return np.dtype(dtype)
+
+    result = np.result_type(*arrays)
+    if result.kind == "c":
+        return np.dtype(np.complex64 if result.itemsize <= 8 else np.complex128)
+    if result.kind == "f" and result.itemsize <= 4:
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def output_array(out: NDArray | None, shape: tuple[int, ...], dtype: DTypeLike) -> NDArray:
+    """Returns caller-supplied output buffer after checking its shape, or allocates new one when not given"""
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+
+    if out.shape != tuple(shape):
+        raise ValueError(f"Output must have shape {tuple(shape)}, got {out.shape}!")
+
+    return out
+
+
+class Workspace:
+    """
+    Named scratch buffers reused between calls, so steady-state loops, such as processing video frames of the same
+    size, do not allocate intermediate arrays. Buffer is reallocated only when larger or different type is requested.
+    Workspace is not thread-safe, each thread needs its own instance.
+
+    Example:
+        >>> workspace = Workspace()
+        >>> for frame in frames:
+        >>>     convolve(frame, kernel, backend="vectorized", out=output, workspace=workspace)
+    """
+
+    def __init__(self):
+        self.buffers: dict[str, NDArray] = {}
+
+    def get(self, name: str, shape: tuple[int, ...], dtype: DTypeLike) -> NDArray:
+        """
+        Returns contiguous buffer of given shape, its content is undefined
+
+        :param name: name of the buffer, each intermediate array of an algorithm uses different name
+        :param shape: shape of the buffer
+        :param dtype: type of the buffer
+        """
+        size, dtype = int(np.prod(shape)), np.dtype(dtype)
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = self.buffers[name] = np.empty(size, dtype=dtype)
+
+        return buffer[:size].reshape(shape)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of all buffers in bytes"""
+        return sum(buffer.nbytes for buffer in self.buffers.values())
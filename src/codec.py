@@ -0,0 +1,271 @@
+import json
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.fourier import CompressionTransform, FourierTransform2D, WaveletTransform2D, coefficient_thresholds
+
+# file layout: header (magic, version, JSON description), records of encoded images, record offsets and footer
+_MAGIC = b"MVCZ"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBI")  # magic, version, length of JSON description
+_FOOTER = struct.Struct("<QQ4s")  # offset of the record index, number of records, magic
+# image height and width, coefficient array height and width, number of kept coefficients, index coding,
+# size of coded indices in bytes, quantization scales of real and imaginary parts
+_RECORD = struct.Struct("<IIIIIBIdd")
+
+_BITMAP, _VARINT = 0, 1
+_QUANTIZED_TYPES = {8: np.dtype("<i1"), 16: np.dtype("<i2"), 32: np.dtype("<i4")}
+
+
+def _transform_spec(transform: CompressionTransform) -> dict:
+    match transform:
+        case FourierTransform2D():
+            return {"name": "fourier", "real": transform.real}
+        case WaveletTransform2D():
+            return {"name": "wavelet", "wavelet": transform.wavelet_name, "level": transform.level}
+        case _:
+            raise ValueError(f"Transform {type(transform).__name__} not supported!")
+
+
+def _transform_from_spec(spec: dict) -> CompressionTransform:
+    match spec["name"]:
+        case "fourier":
+            return FourierTransform2D(real=spec["real"])
+        case "wavelet":
+            return WaveletTransform2D(spec["wavelet"], spec["level"])
+        case _:
+            raise ValueError(f"Transform {spec['name']} not supported!")
+
+
+def encode_varint(values: NDArray) -> bytes:
+    """
+    Encodes non-negative integers with LEB128 variable length code, each byte stores 7 bits of the value
+    and the highest bit marks, that more bytes of the same value follow. Small values (such as differences
+    of sorted indices) take a single byte.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b""
+
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for group in range(1, 10):  # 64 bit values need at most 10 groups of 7 bits
+        n_bytes += values >= np.uint64(1 << (7 * group))
+
+    positions = np.arange(n_bytes.max())
+    digits = ((values[:, np.newaxis] >> (7 * positions).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    digits[positions < (n_bytes - 1)[:, np.newaxis]] |= 0x80
+    return digits[positions < n_bytes[:, np.newaxis]].tobytes()
+
+
+def decode_varint(data: NDArray) -> NDArray:
+    """Decodes array of bytes created with `encode_varint`"""
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    last = (data & 0x80) == 0
+    starts = np.concatenate([[0], np.flatnonzero(last)[:-1] + 1])
+    value_index = np.cumsum(last) - last  # index of decoded value for each byte
+    positions = (np.arange(len(data)) - starts[value_index]).astype(np.uint64)
+
+    digits = (data & 0x7F).astype(np.uint64) << (np.uint64(7) * positions)
+    return np.add.reduceat(digits, starts)
+
+
+def _encode_indices(mask: NDArray) -> tuple[int, bytes]:
+    """Codes positions of kept coefficients with bitmap or differences of flat indices, whichever is smaller"""
+    bitmap = np.packbits(mask.ravel()).tobytes()
+    indices = np.flatnonzero(mask)
+    # varint differences are at least one byte per index, so they are only tried when they can be smaller
+    if len(indices) < len(bitmap):
+        varint = encode_varint(np.diff(indices, prepend=0))
+        if len(varint) < len(bitmap):
+            return _VARINT, varint
+
+    return _BITMAP, bitmap
+
+
+def _decode_indices(coding: int, data: NDArray, size: int) -> NDArray:
+    if coding == _BITMAP:
+        return np.flatnonzero(np.unpackbits(data, count=size))
+    if coding == _VARINT:
+        return np.cumsum(decode_varint(data)).astype(np.intp)
+
+    raise ValueError(f"Index coding {coding} not supported!")
+
+
+def _quantize(values: NDArray, dtype: np.dtype) -> tuple[NDArray, float]:
+    """Uniform quantization to signed integers, scale maps the largest magnitude to the largest integer"""
+    peak = float(np.max(np.abs(values))) if len(values) else 0.0
+    scale = peak / np.iinfo(dtype).max if peak > 0 else 1.0
+    return np.round(values / scale).astype(dtype), scale
+
+
+def encode_image(image: NDArray, transform: CompressionTransform, compression: float, bits: int = 16) -> bytes:
+    """
+    Encodes single image as a record, which stores only the coefficients kept by `compress_and_decompress`.
+
+    :param image: 2D greyscale image, color channels need to be encoded as separate images
+    :param transform: FourierTransform2D or WaveletTransform2D
+    :param compression: ratio of coefficients to remove
+    :param bits: number of bits of quantized coefficients, 8, 16 or 32
+
+    :return: record bytes, which can be decoded with `decode_image`
+    """
+    if np.ndim(image) != 2:
+        raise ValueError("Only 2D images can be encoded!")
+
+    if bits not in _QUANTIZED_TYPES:
+        raise ValueError(f"Quantization to {bits} bits not supported!")
+
+    transformed = transform.forward(image, axes=(0, 1))
+    magnitudes = np.abs(transformed)
+    (threshold,) = coefficient_thresholds(magnitudes, [compression], axes=(0, 1))
+
+    mask = magnitudes > threshold
+    coding, indices = _encode_indices(mask)
+    values = transformed[mask]  # row-major order, same as order of indices
+    real, real_scale = _quantize(values.real, _QUANTIZED_TYPES[bits])
+    imaginary, imaginary_scale = _quantize(values.imag, _QUANTIZED_TYPES[bits])
+
+    header = _RECORD.pack(
+        *image.shape, *transformed.shape, len(values), coding, len(indices), real_scale, imaginary_scale
+    )
+    parts = [header, indices, real.tobytes()]
+    if np.iscomplexobj(transformed):
+        parts.append(imaginary.tobytes())
+
+    return b"".join(parts)
+
+
+def decode_image(record: NDArray | bytes, transform: CompressionTransform, bits: int = 16, offset: int = 0) -> NDArray:
+    """
+    Decodes single image from record created with `encode_image`.
+
+    :param record: buffer containing the record, such as bytes or memory-mapped file, which is not copied
+    :param transform: transform used for encoding
+    :param bits: number of bits of quantized coefficients used for encoding
+    :param offset: position of the record in the buffer
+
+    :return: decoded image
+    """
+    height, width, coefficient_height, coefficient_width, kept, coding, index_bytes, real_scale, imaginary_scale = (
+        _RECORD.unpack_from(record, offset)
+    )
+    dtype = _QUANTIZED_TYPES[bits]
+    position = offset + _RECORD.size
+    indices = _decode_indices(
+        coding, np.frombuffer(record, np.uint8, index_bytes, position), coefficient_height * coefficient_width
+    )
+    position += index_bytes
+    values = np.frombuffer(record, dtype, kept, position) * real_scale
+
+    is_complex = isinstance(transform, FourierTransform2D)
+    coefficients = np.zeros(coefficient_height * coefficient_width, dtype=complex if is_complex else float)
+    coefficients[indices] = values
+    if is_complex:
+        coefficients[indices] += (
+            1j * np.frombuffer(record, dtype, kept, position + kept * dtype.itemsize) * imaginary_scale
+        )
+
+    coefficients = coefficients.reshape(coefficient_height, coefficient_width)
+    return transform.backward(coefficients, axes=(0, 1), shape=(height, width))
+
+
+class CompressedWriter:
+    """
+    Streaming writer of compressed image archive. Images are encoded and written one by one, so the archive can be
+    larger than memory. Index of records, needed for random access, is written when the writer is closed.
+
+    Example:
+        >>> with CompressedWriter("images.mvcz", WaveletTransform2D("db2", 3), compression=0.9) as writer:
+        >>>     for image in images:
+        >>>         writer.write(image)
+    """
+
+    def __init__(self, path: str | Path, transform: CompressionTransform, compression: float, bits: int = 16):
+        """
+        :param path: path to the archive, which is overwritten
+        :param transform: FourierTransform2D or WaveletTransform2D
+        :param compression: ratio of coefficients to remove
+        :param bits: number of bits of quantized coefficients, 8, 16 or 32
+        """
+        description = {"transform": _transform_spec(transform), "compression": compression, "bits": bits}
+
+        self.transform = transform
+        self.compression = compression
+        self.bits = bits
+        self.offsets: list[int] = []
+        self.file: BinaryIO = open(path, "wb")
+
+        encoded = json.dumps(description).encode("utf-8")
+        self.file.write(_HEADER.pack(_MAGIC, _VERSION, len(encoded)) + encoded)
+
+    def write(self, image: NDArray) -> None:
+        """Encodes and appends single 2D image to the archive"""
+        self.offsets.append(self.file.tell())
+        self.file.write(encode_image(image, self.transform, self.compression, self.bits))
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+
+        index_offset = self.file.tell()
+        self.file.write(np.asarray(self.offsets, dtype="<u8").tobytes())
+        self.file.write(_FOOTER.pack(index_offset, len(self.offsets), _MAGIC))
+        self.file.close()
+
+    def __enter__(self) -> "CompressedWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class CompressedReader:
+    """
+    Reader of compressed image archive, which is memory-mapped, so only the records of accessed images are read.
+    Supports random access by image index and iteration over all images.
+    """
+
+    def __init__(self, path: str | Path):
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, description_size = _HEADER.unpack_from(self.data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"File {path} is not compressed image archive of version {_VERSION}!")
+
+        index_offset, count, magic = _FOOTER.unpack_from(self.data, len(self.data) - _FOOTER.size)
+        if magic != _MAGIC:
+            raise ValueError(f"File {path} has no record index, writer was not closed!")
+
+        self.description = json.loads(bytes(self.data[_HEADER.size : _HEADER.size + description_size]))
+        self.transform = _transform_from_spec(self.description["transform"])
+        self.offsets = np.frombuffer(self.data, "<u8", count, index_offset)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> NDArray:
+        return decode_image(self.data, self.transform, self.description["bits"], offset=int(self.offsets[index]))
+
+    def __iter__(self) -> Iterator[NDArray]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+def write_images(
+    path: str | Path, images: Iterable[NDArray], transform: CompressionTransform, compression: float, bits: int = 16
+) -> None:
+    """Writes all images to compressed archive, images can be a generator or batch array of shape (N, H, W)"""
+    with CompressedWriter(path, transform, compression, bits) as writer:
+        for image in images:
+            writer.write(image)
+
+
+def read_images(path: str | Path) -> Iterator[NDArray]:
+    """Reads images from compressed archive one by one"""
+    yield from CompressedReader(path)
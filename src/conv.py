@@ -1,8 +1,23 @@
-# flake8: noqa: F203
+from functools import lru_cache
 from typing import Literal
 
 import numpy as np
-from numpy.typing import NDArray
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.typing import DTypeLike, NDArray
+from scipy import fft
+
+from src.buffers import Workspace, output_array, working_dtype
+from src.parallel import Executor, axis_index, read_rows, row_tiles, run_tiles
+from src.profiling import instrument
+
+# einsum subscripts contracting sliding windows of the signal with the kernel, indexed by dimensionality
+# leading axes of the signal (ellipsis) are treated as batch axes
+_WINDOW_SUBSCRIPTS = {1: "...ik,k->...i", 2: "...ijkl,kl->...ij"}
+# relative cost of a single FFT butterfly compared to a single multiply-add of direct convolution
+# calibrated using `benchmarks/conv_crossover.py`, used by `choose_conv_method`
+_FFT_COST = 3.0
+# singular values smaller than this fraction of the largest one are treated as zero when separating kernels
+_SEPARABLE_TOLERANCE = 1e-10
 
 
 def _full_conv1d(signal: NDArray, kernel: NDArray, step: int = 1, padding: int = 0):
@@ -11,7 +26,7 @@ def _full_conv1d(signal: NDArray, kernel: NDArray, step: int = 1, padding: int =
     # ((x + p) + m - 1) / s  (m = len(kernel), p = padding, s = step)
     output_size = len(padded) + len(kernel) - 1
     output_size = int(np.ceil(output_size / step))
-    output = np.zeros(output_size)
+    output = np.zeros(output_size, dtype=np.result_type(padded, kernel))
 
     # n = tracking index(for step = 1, equal to ((x + p) + m - 1) / s
     # y = output, x = signal, k = kernel, m = len(kernel)
@@ -28,9 +43,9 @@ def _full_conv1d(signal: NDArray, kernel: NDArray, step: int = 1, padding: int =
     for conv_step in range(output_size):
         for kernel_step in range(len(kernel)):
             index = conv_step * step - kernel_step  # note: tracking index can be negative here
-            if 0 <= index < len(signal):  # index needs to be within bounds of signal
+            if 0 <= index < len(padded):  # index needs to be within bounds of signal
                 # increment output position by summing aligned signal and kernel
-                output[conv_step] += signal[index] * kernel[kernel_step]
+                output[conv_step] += padded[index] * kernel[kernel_step]
 
     return output
 
@@ -44,14 +59,14 @@ def _valid_conv1d(signal: NDArray, kernel: NDArray, step: int = 1, padding: int
     # ((x + p) - m + 1) / s  (m = len(kernel), p = padding, s = step)
     output_size = len(padded) - len(kernel) + 1
     output_size = int(np.ceil(output_size / step))
-    output = np.zeros(output_size)
+    output = np.zeros(output_size, dtype=np.result_type(padded, kernel))
 
-    for conv_step, index in enumerate(range(0, len(signal), step)):
-        if index + kernel_size <= len(signal):  # needed, when len(single) is not multiple of kernel_size or step
+    for conv_step, index in enumerate(range(0, len(padded), step)):
+        if index + kernel_size <= len(padded):  # needed, when len(single) is not multiple of kernel_size or step
             # sum of aligned element-wise multiplication of signal and kernel
             # x is the signal, k is the kernel, n is tracking index and m = len(kernel)
             # x[n]k[n] + x[n+1]k[n+1] + ... + x[n+m]k[m]
-            output[conv_step] = np.sum(signal[index : index + kernel_size] * kernel)
+            output[conv_step] = np.sum(padded[index : index + kernel_size] * kernel)
 
     return output
 
@@ -65,16 +80,16 @@ def _full_conv2d(image: NDArray, kernel: NDArray, step: int = 1, padding: int =
     kernel_height, kernel_width = kernel.shape
     # compute aligned length of output image, where x is either height or width of the image
     # ((x + p) + m - 1) / s  (m = len(kernel), p = padding, s = step)
-    output_height = height + kernel_height - 1
-    output_width = width + kernel_width - 1
-    output_height = int(np.ceil(output_height / step))
-    output_width = int(np.ceil(output_width / step))
+    full_height = height + kernel_height - 1
+    full_width = width + kernel_width - 1
+    output_height = int(np.ceil(full_height / step))
+    output_width = int(np.ceil(full_width / step))
 
-    output = np.zeros((output_height, output_width))
+    output = np.zeros((output_height, output_width), dtype=np.result_type(conv_input, kernel))
     # account for conv-steps, where kernel is not fully overlapping with the image with zero-padding
     # the padding created with `padding` is included as "real" image data here
     # the second zero-padding is used to avoid tracking negative indices in the convolution loop
-    conv_input = np.pad(image, ((kernel_height - 1, kernel_height - 1), (kernel_width - 1, kernel_width - 1)))
+    conv_input = np.pad(conv_input, ((kernel_height - 1, kernel_height - 1), (kernel_width - 1, kernel_width - 1)))
 
     # h,w = tracking index for wight and height (using step = 1, equal to ((x + p) + m - 1) / s
     # y = output, x = signal (or image), k = kernel, kh, kw = kernel.shape (kernel size)
@@ -88,9 +103,9 @@ def _full_conv2d(image: NDArray, kernel: NDArray, step: int = 1, padding: int =
     # ...
     # y[h + kh, w + kw] = x[h,0] k[kh, kw] + x[h,1] k[kh, kw-1] + ... + x[h+kh, w+kw] k[0,0]
 
-    for conv_h_step in range(0, output_height, step):
-        for conv_w_step in range(0, output_width, step):
-            window = conv_input[conv_h_step : conv_h_step + kernel_height, conv_w_step : conv_w_step + kernel_width]
+    for conv_h_step, h_index in enumerate(range(0, full_height, step)):
+        for conv_w_step, w_index in enumerate(range(0, full_width, step)):
+            window = conv_input[h_index : h_index + kernel_height, w_index : w_index + kernel_width]
             if window.shape == kernel.shape:  # kernel must fit into window
                 output[conv_h_step, conv_w_step] = np.sum(window * kernel)
 
@@ -106,60 +121,487 @@ def _valid_conv2d(image: NDArray, kernel: NDArray, step: int = 1, padding: int =
     kernel_height, kernel_width = kernel.shape
     # compute aligned length of output image, where x is either height or width of the image
     # ((x + p) - m + 1) / s  (m = len(kernel), p = padding, s = step)
-    output_height = height - kernel_height + 1
-    output_width = width - kernel_width + 1
-    output_height = int(np.ceil(output_height / step))
-    output_width = int(np.ceil(output_width / step))
+    valid_height = height - kernel_height + 1
+    valid_width = width - kernel_width + 1
+    output_height = int(np.ceil(valid_height / step))
+    output_width = int(np.ceil(valid_width / step))
 
     if output_height <= 0 or output_width <= 0:  # safety check
         raise ValueError("Kernel size is too large for valid convolution")
 
-    output = np.zeros((output_height, output_width))
+    output = np.zeros((output_height, output_width), dtype=np.result_type(padded, kernel))
 
-    for conv_h_step, h_index in enumerate(range(0, output_height, step)):
-        for conv_w_step, w_index in enumerate(range(0, output_width, step)):
+    for conv_h_step, h_index in enumerate(range(0, valid_height, step)):
+        for conv_w_step, w_index in enumerate(range(0, valid_width, step)):
             # slice image to kernel sized window (kw and kh denotes kernel width and height)
             # sum of aligned element-wise multiplication of signal and kernel
 
             # x is the signal, k is the kernel, h is tracking index for height, w is tracking index for width
             # x[h+kh, w+kw] * k[0, 0] + x[h+kh, w+kw+1] * k[0, 1] + ... + x[h+kh, w+kw+kw] * k[0, kw]
-            window = image[h_index : h_index + kernel_height, w_index : w_index + kernel_width]
+            window = padded[h_index : h_index + kernel_height, w_index : w_index + kernel_width]
             output[conv_h_step, conv_w_step] = np.sum(window * kernel)
 
     return output
 
 
-def convolve(
-    signal: NDArray, kernel: NDArray, step: int = 1, padding: int = 0, mode: Literal["full", "valid"] = "full"
+@instrument("conv.pad")
+def _pad_last(
+    array: NDArray, widths: list[tuple[int, int]], dtype: DTypeLike = None, workspace: Workspace | None = None
 ) -> NDArray:
+    # zero-pad only the trailing (convolved) axes, leading batch axes are left untouched
+    dtype = array.dtype if dtype is None else np.dtype(dtype)
+    if not any(before or after for before, after in widths):
+        return array.astype(dtype, copy=False)  # np.pad always copies
+
+    if workspace is None:
+        return np.pad(array.astype(dtype, copy=False), [(0, 0)] * (array.ndim - len(widths)) + widths)
+
+    # padded copy is written into reused buffer, only the borders are zeroed
+    trailing = [size + before + after for size, (before, after) in zip(array.shape[-len(widths) :], widths)]
+    padded = workspace.get("padded", (*array.shape[: -len(widths)], *trailing), dtype)
+    for axis, (before, after) in zip(range(-len(widths), 0), widths):
+        padded[axis_index(padded.ndim, axis, slice(0, before))] = 0
+        padded[axis_index(padded.ndim, axis, slice(padded.shape[axis] - after, None))] = 0
+
+    interior = [slice(before, before + size) for size, (before, _) in zip(array.shape[-len(widths) :], widths)]
+    padded[(Ellipsis, *interior)] = array
+    return padded
+
+
+@lru_cache(maxsize=128)
+def _cached_separate_kernel(data: bytes, shape: tuple[int, int], dtype: str, tolerance: float):
+    # kernels are not hashable, so the cache is keyed by their raw bytes, shape and dtype
+    kernel = np.frombuffer(data, dtype=dtype).reshape(shape)
+    u, s, vh = np.linalg.svd(kernel)
+    rank = int(np.sum(s > tolerance * s[0])) if s[0] > 0 else 1
+
+    columns = (u[:, :rank] * s[:rank]).T  # singular values are absorbed into column filters
+    rows = vh[:rank]
+    # cached arrays are shared between calls, they must not be modified by the caller
+    columns.flags.writeable = False
+    rows.flags.writeable = False
+
+    return columns, rows
+
+
+def separate_kernel(kernel: NDArray, tolerance: float = _SEPARABLE_TOLERANCE) -> tuple[NDArray, NDArray]:
     """
-    Educational implementation of `np.convolve` for 1D or 2D signals and kernels with step and padding support.
-    See: https://numpy.org/doc/2.1/reference/generated/numpy.convolve.html for more.
+    Decomposes 2D kernel into a sum of separable terms using SVD, such that `kernel = sum(outer(c, r))` for each
+    column filter `c` and row filter `r`. Rank-1 kernels, such as box, Gaussian, Sobel or Prewitt have a single term.
+    Decompositions are cached, so repeated calls with the same kernel do not compute the SVD again.
+
+    :param kernel: 2D kernel to decompose
+    :param tolerance: singular values smaller than `tolerance` times the largest singular value are discarded
+
+    :return: column filters with shape (rank, KH) and row filters with shape (rank, KW), both read-only
+    """
+    kernel = np.ascontiguousarray(kernel)
+    return _cached_separate_kernel(kernel.tobytes(), kernel.shape, kernel.dtype.str, tolerance)
+
+
+def _einsum_into(subscripts: str, operands: tuple[NDArray, NDArray], out: NDArray | None) -> NDArray:
+    # einsum writes directly into output of the same type, other types are cast after computing the result
+    if out is not None and out.dtype == np.result_type(*operands):
+        return np.einsum(subscripts, *operands, out=out)
+
+    result = np.einsum(subscripts, *operands)
+    if out is None:
+        return result
+
+    out[...] = result
+    return out
+
+
+def _separable_conv2d(
+    padded: NDArray,
+    columns: NDArray,
+    rows: NDArray,
+    step: int = 1,
+    out: NDArray | None = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    # valid convolution with sum of separable terms computed as column pass followed by row pass
+    # each pass costs KH or KW multiply-adds per pixel, instead of KH * KW for the full 2D kernel
+    columns, rows = columns[:, ::-1], rows[:, ::-1]  # reverse filters to agree with definition of convolution
+    # column pass computes all terms at once, resulting in array of shape (..., rank, output_height, width)
+    windows = sliding_window_view(padded, columns.shape[1], axis=-2)[..., ::step, :, :]
+    vertical = None
+    if workspace is not None:
+        shape = (*windows.shape[:-3], len(columns), *windows.shape[-3:-1])
+        vertical = workspace.get("vertical", shape, np.result_type(padded, columns))
+    vertical = _einsum_into("...ijk,rk->...rij", (windows, columns), vertical)
+    # row pass sums the terms, resulting in array of shape (..., output_height, output_width)
+    windows = sliding_window_view(vertical, rows.shape[1], axis=-1)[..., ::step, :]
+    return _einsum_into("...rijk,rk->...ij", (windows, rows), out)
+
+
+@instrument("conv.vectorized")
+def _vectorized_conv(
+    signal: NDArray,
+    kernel: NDArray,
+    step: int = 1,
+    padding: int = 0,
+    mode: str = "full",
+    dtype: DTypeLike = None,
+    out: NDArray | None = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    # same semantics as the loop implementations, but all output elements are computed in a single einsum call
+    # running over a strided (zero-copy) view of all kernel-sized windows of the signal
+    dtype = np.result_type(signal, kernel, np.float64) if dtype is None else dtype
+    # for full mode, pad with m - 1 more zeros on both sides, so every partial overlap becomes a complete window
+    widths = [(padding + size - 1 if mode == "full" else padding,) * 2 for size in kernel.shape]
+    padded = _pad_last(signal, widths, dtype, workspace)
+    kernel = kernel.astype(dtype, copy=False)
+
+    _check_valid_size(padded.shape[-kernel.ndim :], kernel.shape, "valid")
+
+    if kernel.ndim == 2:
+        columns, rows = separate_kernel(kernel)
+        # separable terms are used only when cheaper than the full kernel, e.g. rank-1 or small rank large kernels
+        if len(columns) * sum(kernel.shape) < kernel.size:
+            return _separable_conv2d(padded, columns, rows, step, out, workspace)
+
+    windows = sliding_window_view(padded, kernel.shape, axis=tuple(range(-kernel.ndim, 0)))
+    # step is applied to the view, not to the output
+    windows = windows[(Ellipsis,) + (slice(None, None, step),) * kernel.ndim + (slice(None),) * kernel.ndim]
+    # reverse the kernel in all axes -> needed to agree with mathematical definition of convolution
+    flipped = kernel[(slice(None, None, -1),) * kernel.ndim]
 
-    :param signal: Supports 1D and 2D signals
-    :param kernel: Kernel to convolve with the signal, must have the same dimensionality as the signal
+    return _einsum_into(_WINDOW_SUBSCRIPTS[kernel.ndim], (windows, flipped), out)
+
+
+def _crop_full(full: NDArray, signal_shape: tuple, kernel_shape: tuple, step: int, mode: str) -> NDArray:
+    # select "full" or "valid" part of the full convolution and apply the step
+    # full convolution has (x + m - 1) elements, valid part starts at (m - 1) and ends at x
+    if mode == "full":
+        slices = [slice(0, size + kernel_size - 1, step) for size, kernel_size in zip(signal_shape, kernel_shape)]
+    else:
+        slices = [slice(kernel_size - 1, size, step) for size, kernel_size in zip(signal_shape, kernel_shape)]
+
+    return full[(Ellipsis, *slices)]
+
+
+def _check_valid_size(signal_shape: tuple, kernel_shape: tuple, mode: str) -> None:
+    if mode == "valid" and any(kernel_size > size for size, kernel_size in zip(signal_shape, kernel_shape)):
+        raise ValueError("Kernel size is too large for valid convolution")
+
+
+@instrument("conv.fft")
+def _fft_conv(
+    signal: NDArray, kernel: NDArray, step: int = 1, padding: int = 0, mode: str = "full", dtype: DTypeLike = None
+) -> NDArray:
+    # convolution theorem: full convolution is the inverse transform of the product of zero-padded spectra
+    # transforms are padded to lengths, which have only small prime factors, since those are the fastest to compute
+    # single precision inputs are transformed in single precision
+    kernel = kernel if dtype is None else kernel.astype(dtype, copy=False)
+    padded = _pad_last(signal, [(padding, padding)] * kernel.ndim, dtype)
+    signal_shape = padded.shape[-kernel.ndim :]
+    _check_valid_size(signal_shape, kernel.shape, mode)
+    full_shape = [size + kernel_size - 1 for size, kernel_size in zip(signal_shape, kernel.shape)]
+    axes = tuple(range(-kernel.ndim, 0))  # batch axes are transformed independently, kernel spectrum is broadcast
+
+    if np.iscomplexobj(padded) or np.iscomplexobj(kernel):
+        fast_shape = [fft.next_fast_len(size) for size in full_shape]
+        spectrum = fft.fftn(padded, fast_shape, axes=axes) * fft.fftn(kernel, fast_shape)
+        full = fft.ifftn(spectrum, fast_shape, axes=axes)
+    else:  # real input has Hermitian-symmetric spectrum, so only half of it needs to be computed
+        fast_shape = [fft.next_fast_len(size, real=True) for size in full_shape]
+        spectrum = fft.rfftn(padded, fast_shape, axes=axes) * fft.rfftn(kernel, fast_shape)
+        full = fft.irfftn(spectrum, fast_shape, axes=axes)
+
+    return _crop_full(full, signal_shape, kernel.shape, step, mode)
+
+
+def _overlap_add_fft_size(signal_size: int, kernel_size: int) -> int:
+    # each block of B samples is filtered with FFT of size F = B + m - 1, which costs F log F for B outputs
+    # select power of two F minimizing the cost per output sample, F can not exceed the full convolution length
+    full_size = signal_size + kernel_size - 1
+    candidates = 2 ** np.arange(int(np.ceil(np.log2(2 * kernel_size))), int(np.ceil(np.log2(full_size))) + 1)
+    costs = candidates * np.log2(candidates) / (candidates - kernel_size + 1)
+    return int(candidates[np.argmin(costs)]) if len(candidates) > 0 else fft.next_fast_len(full_size, real=True)
+
+
+@instrument("conv.overlap_add")
+def _overlap_add_conv1d(
+    signal: NDArray, kernel: NDArray, step: int = 1, padding: int = 0, mode: str = "full", dtype: DTypeLike = None
+):
+    # long signal is split into blocks, each block is convolved with the kernel using FFT of small size
+    # convolved blocks are longer than input blocks by (m - 1) samples, those tails are added to the next block
+    kernel = kernel if dtype is None else kernel.astype(dtype, copy=False)
+    padded = _pad_last(signal, [(padding, padding)], dtype)
+    *batch_shape, signal_size = padded.shape
+    _check_valid_size((signal_size,), kernel.shape, mode)
+
+    kernel_size = len(kernel)
+    fft_size = _overlap_add_fft_size(signal_size, kernel_size)
+    block_size = fft_size - kernel_size + 1  # always >= (m - 1), so each tail overlaps only with the next block
+    n_blocks = int(np.ceil(signal_size / block_size))
+
+    blocks = _pad_last(padded, [(0, n_blocks * block_size - signal_size)]).reshape(*batch_shape, n_blocks, block_size)
+    if np.iscomplexobj(blocks) or np.iscomplexobj(kernel):
+        filtered = fft.ifft(fft.fft(blocks, fft_size, axis=-1) * fft.fft(kernel, fft_size), fft_size, axis=-1)
+    else:
+        filtered = fft.irfft(fft.rfft(blocks, fft_size, axis=-1) * fft.rfft(kernel, fft_size), fft_size, axis=-1)
+
+    full = np.zeros((*batch_shape, (n_blocks + 1) * block_size), dtype=filtered.dtype)
+    full[..., : n_blocks * block_size] += filtered[..., :block_size].reshape(*batch_shape, -1)
+    # tails have (m - 1) samples, padding them to block size allows adding all of them at once
+    tails = _pad_last(filtered[..., block_size:], [(0, 2 * block_size - fft_size)])
+    full[..., block_size:] += tails.reshape(*batch_shape, -1)
+
+    return _crop_full(full, (signal_size,), kernel.shape, step, mode)
+
+
+def choose_conv_method(
+    signal_shape: tuple[int, ...],
+    kernel_shape: tuple[int, ...],
+    step: int = 1,
+    padding: int = 0,
+    mode: Literal["full", "valid"] = "full",
+    rank: int | None = None,
+) -> Literal["direct", "fft", "overlap-add"]:
+    """
+    Selects the fastest convolution method using a cost model of signal and kernel sizes.
+
+    Direct convolution costs one multiply-add per kernel element for every output element (only kept elements are
+    computed, so step reduces the cost), while FFT convolution costs (F log F) for transform of size F regardless of
+    the kernel size. Overlap-add is only considered for 1D signals.
+
+    :param signal_shape: shape of the signal, before padding
+    :param kernel_shape: shape of the kernel
     :param step: step size for the convolution
-    :param padding: input padding for the convolution, applied to signal on both sides
-    :param mode: "full" or "valid" mode for the convolution:
-                 "full" returns the convolution at each point of overlap
-                 "valid" returns convolution, only for points where the signals overlap completely
+    :param padding: input padding for the convolution
+    :param mode: "full" or "valid" mode for the convolution
+    :param rank: number of separable terms of 2D kernel, when given direct cost accounts for separable execution
+
+    :return: name of the method, which can be passed to `convolve`
     """
-    if signal.ndim != kernel.ndim:
-        raise ValueError("Signal and kernel must have the same dimensionality!")
+    padded_shape = [size + 2 * padding for size in signal_shape]
+    sign = 1 if mode == "full" else -1
+    output_sizes = [max(size + sign * (kernel_size - 1), 0) for size, kernel_size in zip(padded_shape, kernel_shape)]
+
+    kernel_cost = np.prod(kernel_shape)
+    if rank is not None:
+        kernel_cost = min(kernel_cost, rank * sum(kernel_shape))
+
+    direct_cost = np.prod([np.ceil(size / step) for size in output_sizes]) * kernel_cost
+    fast_size = np.prod(
+        [fft.next_fast_len(size + kernel_size - 1, True) for size, kernel_size in zip(padded_shape, kernel_shape)]
+    )
+    costs = {"direct": direct_cost, "fft": _FFT_COST * fast_size * np.log2(fast_size)}
+
+    if len(signal_shape) == 1:
+        fft_size = _overlap_add_fft_size(padded_shape[0], kernel_shape[0])
+        n_blocks = np.ceil(padded_shape[0] / (fft_size - kernel_shape[0] + 1))
+        costs["overlap-add"] = _FFT_COST * n_blocks * fft_size * np.log2(fft_size)
+
+    return min(costs, key=costs.get)  # type: ignore
+
+
+@instrument("conv.loop")
+def _loop_conv(
+    signal: NDArray, kernel: NDArray, step: int, padding: int, mode: str, dtype: DTypeLike = None
+) -> NDArray:
+    # reference implementations handle a single signal, batches are convolved one element at a time
+    if dtype is not None:
+        signal, kernel = signal.astype(dtype, copy=False), kernel.astype(dtype, copy=False)
 
-    dim = signal.ndim
+    if signal.ndim > kernel.ndim:
+        batch_shape = signal.shape[: -kernel.ndim]
+        elements = signal.reshape(-1, *signal.shape[-kernel.ndim :])
+        outputs = [_loop_conv(element, kernel, step, padding, mode) for element in elements]
+        return np.stack(outputs).reshape(*batch_shape, *outputs[0].shape)
 
-    match mode, dim:
+    match mode, signal.ndim:
         case "full", 1:
             return _full_conv1d(signal, kernel, step, padding)
         case "valid", 1:
             return _valid_conv1d(signal, kernel, step, padding)
         case "full", 2:
             return _full_conv2d(signal, kernel, step, padding)
-        case "valid", 2:
+        case _:
             return _valid_conv2d(signal, kernel, step, padding)
-        case _, _:
-            if dim > 2:
-                raise ValueError(f"Only 1D and 2D signals are supported! {dim} > 2!")
-            else:
-                raise ValueError(f"Mode {mode} not supported!")
+
+
+def conv_output_shape(
+    signal_shape: tuple[int, ...], kernel_shape: tuple[int, ...], step: int = 1, padding: int = 0, mode: str = "full"
+) -> tuple[int, ...]:
+    """
+    Computes shape of the convolution output for convolved axes
+
+    :param signal_shape: shape of the convolved axes of the signal, before padding
+    :param kernel_shape: shape of the kernel
+    :param step: step size for the convolution
+    :param padding: input padding for the convolution
+    :param mode: "full" or "valid" mode for the convolution
+    """
+    # ((x + p) +/- (m - 1)) / s  (m = kernel size, p = padding, s = step)
+    sign = 1 if mode == "full" else -1
+    sizes = [size + 2 * padding + sign * (kernel_size - 1) for size, kernel_size in zip(signal_shape, kernel_shape)]
+
+    if any(size <= 0 for size in sizes):
+        raise ValueError("Kernel size is too large for valid convolution")
+
+    return tuple(int(np.ceil(size / step)) for size in sizes)
+
+
+def _dispatch_conv(
+    signal: NDArray,
+    kernel: NDArray,
+    step: int,
+    padding: int,
+    mode: str,
+    method: str,
+    backend: str,
+    dtype: DTypeLike = None,
+    out: NDArray | None = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    match method, backend:
+        case "direct", "loop":
+            output = _loop_conv(signal, kernel, step, padding, mode, dtype)
+        case "direct", "vectorized":
+            return _vectorized_conv(signal, kernel, step, padding, mode, dtype, out, workspace)
+        case "fft", _:
+            output = _fft_conv(signal, kernel, step, padding, mode, dtype)
+        case _:
+            output = _overlap_add_conv1d(signal, kernel, step, padding, mode, dtype)
+
+    if out is None:
+        return output
+
+    out[...] = output
+    return out
+
+
+def _convolve_tile(
+    signal: NDArray, output: NDArray, tile: slice, kernel: NDArray, step: int, padding: int, mode: str, **kwargs
+) -> None:
+    # computes tile of output rows (first convolved axis) as valid convolution of padded input rows, including halo
+    # output row r is computed from padded input rows [r * s, r * s + m)
+    halo = [kernel_size - 1 if mode == "full" else 0 for kernel_size in kernel.shape]
+    start, stop = tile.start * step, (tile.stop - 1) * step + kernel.shape[0]
+    rows = read_rows(signal, start, stop, leading=padding + halo[0], axis=-kernel.ndim)
+    rows = _pad_last(rows, [(padding + size, padding + size) for size in halo[1:]])
+
+    index = axis_index(output.ndim, -kernel.ndim, tile)
+    _dispatch_conv(rows, kernel, step, padding=0, mode="valid", out=output[index], **kwargs)
+
+
+def _check_conv_arguments(
+    signal_ndim: int, kernel_ndim: int, mode: str, backend: str, method: str, axes: tuple[int, ...] | None
+) -> tuple[int, ...]:
+    """Validates arguments of `convolve` and returns convolved axes, which default to all axes of the signal"""
+    if axes is None:
+        if signal_ndim != kernel_ndim:
+            raise ValueError("Signal and kernel must have the same dimensionality, unless axes are given!")
+        axes = tuple(range(signal_ndim))
+
+    if len(axes) != kernel_ndim:
+        raise ValueError(f"Number of axes must match kernel dimensionality! {len(axes)} != {kernel_ndim}")
+
+    if kernel_ndim > 2:
+        raise ValueError(f"Only 1D and 2D signals are supported! {kernel_ndim} > 2!")
+
+    if mode not in ("full", "valid"):
+        raise ValueError(f"Mode {mode} not supported!")
+
+    if backend not in ("loop", "vectorized"):
+        raise ValueError(f"Backend {backend} not supported!")
+
+    if method not in ("direct", "fft", "overlap-add", "auto"):
+        raise ValueError(f"Method {method} not supported!")
+
+    if method == "overlap-add" and kernel_ndim != 1:
+        raise ValueError("Overlap-add method only supports 1D signals!")
+
+    return axes
+
+
+def _select_method(
+    signal_shape: tuple[int, ...], kernel: NDArray, step: int, padding: int, mode: str, method: str, backend: str
+) -> tuple[str, str]:
+    """Resolves "auto" method with `choose_conv_method`, direct method selected automatically is vectorized"""
+    if method != "auto":
+        return method, backend
+
+    rank = len(separate_kernel(kernel)[0]) if kernel.ndim == 2 else None
+    return choose_conv_method(signal_shape, kernel.shape, step, padding, mode, rank), "vectorized"
+
+
+@instrument("conv.convolve")
+def convolve(
+    signal: NDArray,
+    kernel: NDArray,
+    step: int = 1,
+    padding: int = 0,
+    mode: Literal["full", "valid"] = "full",
+    backend: Literal["loop", "vectorized"] = "loop",
+    method: Literal["direct", "fft", "overlap-add", "auto"] = "direct",
+    axes: tuple[int, ...] | None = None,
+    workers: int | None = None,
+    executor: Executor = "thread",
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    """
+    Educational implementation of `np.convolve` for 1D or 2D signals and kernels with step and padding support.
+    See: https://numpy.org/doc/2.1/reference/generated/numpy.convolve.html for more.
+
+    The default "loop" backend is the reference implementation, written to be read rather than to be fast.
+    The "vectorized" backend computes the same result using sliding window views and a single `np.einsum` call.
+    For 2D kernels, which are separable or have low rank, it runs column and row 1D passes (see `separate_kernel`).
+
+    Batches of signals, such as (N, H, W, C) stacks of color images, are convolved in a single call by passing the
+    `axes`, over which the kernel is applied, all remaining axes are treated as batch axes.
+
+    :param signal: Supports 1D and 2D signals or batches of them, when `axes` are given
+    :param kernel: 1D or 2D kernel to convolve with the signal
+    :param step: step size for the convolution
+    :param padding: input padding for the convolution, applied to signal on both sides
+    :param mode: "full" or "valid" mode for the convolution:
+                 "full" returns the convolution at each point of overlap
+                 "valid" returns convolution, only for points where the signals overlap completely
+    :param backend: "loop" or "vectorized" implementation of direct method, both give the same results
+    :param method: "direct", "fft", "overlap-add" or "auto" method for computing the convolution:
+                   "direct" uses the implementation selected with `backend`
+                   "fft" uses convolution theorem with real-valued FFT, fast for large kernels
+                   "overlap-add" splits the signal into blocks filtered with small FFTs, only for long 1D signals
+                   "auto" selects the fastest method using `choose_conv_method`, direct method is vectorized
+    :param axes: axes of the signal to convolve over, one for each kernel dimension, defaults to all axes
+    :param workers: when given, output is split into tiles of rows (first convolved axis) computed in parallel,
+                    the output does not depend on the number of workers
+    :param executor: "thread" or "process" pool used for parallel execution, see `src.parallel.run_tiles`
+    :param out: output array, the result is written into it, vectorized backend writes it without intermediate copy
+    :param dtype: type of the computation, defaults to float32 for single precision signals and float64 otherwise
+                  (see `src.buffers.working_dtype`), pass `np.float64` with float32 `out` to accumulate in float64
+    :param workspace: reused buffers for padded signal and intermediate results of the vectorized backend,
+                      which make repeated calls with same shapes allocation free, not used with `workers`,
+                      see `src.buffers.Workspace`
+    """
+    axes = _check_conv_arguments(signal.ndim, kernel.ndim, mode, backend, method, axes)
+
+    # convolved axes are moved to the end, so all implementations can treat leading axes as batch
+    trailing = tuple(range(-kernel.ndim, 0))
+    signal = np.moveaxis(signal, axes, trailing)
+
+    method, backend = _select_method(signal.shape[-kernel.ndim :], kernel, step, padding, mode, method, backend)
+    dtype = np.result_type(working_dtype(signal, dtype=dtype), np.float32 if np.isrealobj(kernel) else np.complex64)
+    batch_shape, signal_shape = signal.shape[: -kernel.ndim], signal.shape[-kernel.ndim :]
+    output_shape = batch_shape + conv_output_shape(signal_shape, kernel.shape, step, padding, mode)
+    # output is written through its view with convolved axes at the end, same as for the signal
+    moved = None if out is None else output_array(np.moveaxis(out, axes, trailing), output_shape, out.dtype)
+
+    if workers is None:
+        output = _dispatch_conv(signal, kernel, step, padding, mode, method, backend, dtype, moved, workspace)
+    else:
+        output = output_array(moved, output_shape, dtype)
+        kwargs = dict(kernel=kernel, step=step, padding=padding, mode=mode, method=method, backend=backend, dtype=dtype)
+        run_tiles(_convolve_tile, signal, output, row_tiles(output_shape[-kernel.ndim]), workers, executor, **kwargs)
+
+    if out is not None:
+        return out
+
+    return np.moveaxis(output, trailing, axes)
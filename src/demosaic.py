@@ -0,0 +1,319 @@
+from functools import lru_cache
+from typing import Literal, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.conv import convolve
+
+COLORS = "RGB"
+
+
+# gradient-corrected kernels from Malvar, He and Cutler, "High-quality linear interpolation for demosaicing of
+# Bayer-patterned color images", 2004, each kernel is scaled by 1 / 8
+_GREEN_AT_RED_BLUE = (
+    np.array(
+        [
+            [0, 0, -1, 0, 0],
+            [0, 0, 2, 0, 0],
+            [-1, 2, 4, 2, -1],
+            [0, 0, 2, 0, 0],
+            [0, 0, -1, 0, 0],
+        ]
+    )
+    / 8
+)
+# red (blue) at green pixel, which has red (blue) neighbours in the same row
+_RED_BLUE_AT_GREEN_ROW = (
+    np.array(
+        [
+            [0, 0, 0.5, 0, 0],
+            [0, -1, 0, -1, 0],
+            [-1, 4, 5, 4, -1],
+            [0, -1, 0, -1, 0],
+            [0, 0, 0.5, 0, 0],
+        ]
+    )
+    / 8
+)
+_RED_BLUE_AT_GREEN_COLUMN = _RED_BLUE_AT_GREEN_ROW.T
+_RED_AT_BLUE = (
+    np.array(
+        [
+            [0, 0, -1.5, 0, 0],
+            [0, 2, 0, 2, 0],
+            [-1.5, 0, 6, 0, -1.5],
+            [0, 2, 0, 2, 0],
+            [0, 0, -1.5, 0, 0],
+        ]
+    )
+    / 8
+)
+
+
+class CFAPattern:
+    """
+    Color filter array pattern, which is repeated over the whole sensor, each pixel measures a single color.
+
+    Example:
+        >>> CFAPattern(["RG", "GB"])  # Bayer RGGB, same as `CFAPattern.bayer("RGGB")`
+        >>> CFAPattern(["GGRGGB", "GGBGGR", "BRGRBG", "GGBGGR", "GGRGGB", "RBGBRG"])  # X-Trans
+    """
+
+    def __init__(self, layout: Sequence[str]):
+        """
+        :param layout: rows of the pattern as strings of "R", "G" and "B" letters
+        """
+        if len(layout) == 0 or len({len(row) for row in layout}) != 1:
+            raise ValueError("Pattern rows must be non-empty and have equal length!")
+
+        if any(color not in COLORS for row in layout for color in row):
+            raise ValueError(f"Pattern can only contain {COLORS} colors!")
+
+        self.layout = tuple(layout)
+        self.colors = np.asarray([[COLORS.index(color) for color in row] for row in layout])
+
+    @classmethod
+    def bayer(cls, name: str) -> "CFAPattern":
+        """Creates 2x2 Bayer pattern from its name, such as RGGB, BGGR, GRBG or GBRG"""
+        if sorted(name) != sorted("RGGB"):
+            raise ValueError(f"Bayer pattern {name} not supported!")
+
+        return cls([name[:2], name[2:]])
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.colors.shape  # type: ignore
+
+    @property
+    def mask(self) -> NDArray:
+        """Pattern as binary mask of shape (pattern height, pattern width, channel)"""
+        return (self.colors[..., np.newaxis] == np.arange(len(COLORS))).astype(np.uint8)
+
+    def color_indices(self, shape: tuple[int, int]) -> NDArray:
+        """Index of the color measured by each pixel of the sensor of given shape, pattern is cropped at the edges"""
+        repeats = [-(-size // pattern_size) for size, pattern_size in zip(shape, self.shape)]
+        return np.tile(self.colors, repeats)[: shape[0], : shape[1]]
+
+    def masks(self, shape: tuple[int, int]) -> NDArray:
+        """Boolean masks of pixels measuring each color, with shape (H, W, 3)"""
+        return self.color_indices(shape)[..., np.newaxis] == np.arange(len(COLORS))
+
+    def mosaic(self, image: NDArray) -> NDArray:
+        """
+        Simulates sensor reading of the RGB image, by keeping only the color measured by each pixel
+
+        :param image: RGB image or batch of images, such as (N, H, W, 3)
+        :return: raw sensor image of shape (N, H, W)
+        """
+        indices = self.color_indices(image.shape[-3:-1])
+        return np.take_along_axis(image, indices[..., np.newaxis], axis=-1)[..., 0]
+
+    def __repr__(self) -> str:
+        return f"CFAPattern({list(self.layout)})"
+
+
+RGGB = CFAPattern.bayer("RGGB")
+BGGR = CFAPattern.bayer("BGGR")
+GRBG = CFAPattern.bayer("GRBG")
+GBRG = CFAPattern.bayer("GBRG")
+XTRANS = CFAPattern(["GGRGGB", "GGBGGR", "BRGRBG", "GGBGGR", "GGRGGB", "RBGBRG"])
+
+
+def _tent_kernel(radius: int) -> NDArray:
+    # bilinear interpolation weights, for radius 1 it is [[1, 2, 1], [2, 4, 2], [1, 2, 1]] / 4
+    weights = radius + 1 - np.abs(np.arange(-radius, radius + 1))
+    return np.outer(weights, weights) / (radius + 1) ** 2
+
+
+def _padded_masks(pattern: CFAPattern, shape: tuple[int, int], radius: int) -> NDArray:
+    # float masks of shape (3, H + 2 * radius, W + 2 * radius) reflected at the edges
+    masks = np.moveaxis(pattern.masks(shape), -1, 0).astype(float)
+    return np.pad(masks, [(0, 0), (radius, radius), (radius, radius)], mode="reflect")
+
+
+@lru_cache(maxsize=16)
+def _neighbour_weights(layout: tuple[str, ...], shape: tuple[int, int], kernel_data: bytes, radius: int) -> NDArray:
+    """
+    Sum of weights of measured neighbours of each color with shape (3, H, W), images are reflected at the edges.
+    Weights depend only on the pattern and the image shape, so they are cached for consecutive frames.
+    """
+    kernel = np.frombuffer(kernel_data).reshape(2 * radius + 1, 2 * radius + 1)
+    weights = convolve(
+        _padded_masks(CFAPattern(layout), shape, radius), kernel, mode="valid", backend="vectorized", axes=(-2, -1)
+    )
+    weights.flags.writeable = False
+    return weights
+
+
+def _is_bayer(pattern: CFAPattern) -> bool:
+    # 2x2 pattern with single red and blue pixel and green pixels on the diagonal
+    if pattern.shape != (2, 2) or sorted("".join(pattern.layout)) != sorted("RGGB"):
+        return False
+    return pattern.colors[0, 0] == pattern.colors[1, 1] or pattern.colors[0, 1] == pattern.colors[1, 0]
+
+
+def _plane_view(
+    planes: list[list[NDArray]], row: int, column: int, tap: tuple[int, int], height: int, width: int
+) -> NDArray:
+    # view of padded pixels (row + i + 2y, column + j + 2x) for kernel tap (i, j), taken from contiguous phase plane
+    (y, a), (x, b) = divmod(row + tap[0], 2), divmod(column + tap[1], 2)
+    return planes[a][b][..., y : y + height, x : x + width]
+
+
+def _phase_demosaic(raw: NDArray, pattern: CFAPattern, kernels: dict[tuple[int, int, int], NDArray]) -> NDArray:
+    """
+    Demosaicking of 2x2 pattern, where each missing color of each of the 4 pixels of the pattern (phases) is computed
+    with its own kernel directly from raw pixels of all frames at once, so each kernel is evaluated only on pixels
+    where it is needed and no masked copies of the frames are created. Phase kernels are mostly zeros, so strided
+    convolution is computed as a sum of shifted views of the frames scaled by non-zero kernel elements.
+
+    :param raw: raw sensor image or batch of images, such as (N, H, W)
+    :param pattern: 2x2 pattern, reflection at the edges keeps its colors, since it does not repeat the edge pixel
+    :param kernels: odd sized convolution kernel for each (row, column) of the pattern and each missing color
+    """
+    radius = max(kernel.shape[0] for kernel in kernels.values()) // 2
+    padded = np.pad(raw.astype(float), [(0, 0)] * (raw.ndim - 2) + [(radius, radius), (radius, radius)], mode="reflect")
+    # contiguous planes of padded pixels of each phase, so shifted views read consecutive memory
+    planes = [[np.ascontiguousarray(padded[..., a::2, b::2]) for b in range(2)] for a in range(2)]
+    rgb = np.empty((*raw.shape, len(COLORS)))
+
+    for row, column in np.ndindex(*pattern.shape):
+        color = pattern.colors[row, column]
+        phase = (..., slice(row, None, 2), slice(column, None, 2))
+        rgb[(*phase, color)] = raw[phase]
+        height, width = raw[phase].shape[-2:]
+        accumulated, scaled = np.empty((2, *raw.shape[:-2], height, width))
+
+        for target in range(len(COLORS)):
+            if target == color:
+                continue
+
+            # convolution is correlation with flipped kernel, kernel is centered at padded pixel (row + r, column + r)
+            kernel = kernels[row, column, target][::-1, ::-1]
+            start = radius - kernel.shape[0] // 2
+            accumulated[...] = 0
+            # taps with equal weights (all of them for bilinear kernels) are summed first and scaled once
+            for weight in np.unique(kernel[kernel != 0]):
+                taps = list(zip(*np.nonzero(kernel == weight)))
+                group = _plane_view(planes, row + start, column + start, taps[0], height, width)
+                np.copyto(scaled, group)
+                for tap in taps[1:]:
+                    scaled += _plane_view(planes, row + start, column + start, tap, height, width)
+                accumulated += np.multiply(scaled, weight, out=scaled)
+
+            rgb[(*phase, target)] = accumulated
+
+    return rgb
+
+
+def _bilinear_phase_kernels(pattern: CFAPattern, kernel: NDArray) -> dict[tuple[int, int, int], NDArray]:
+    # kernel restricted to the neighbours of each color, which is the normalized convolution for single phase
+    radius = kernel.shape[0] // 2
+    offsets = np.arange(radius, -radius - 1, -1)  # element i of convolution kernel multiplies pixel at offset r - i
+    kernels = {}
+    for row, column in np.ndindex(*pattern.shape):
+        colors = pattern.colors[np.ix_((row + offsets) % 2, (column + offsets) % 2)]
+        for target in range(len(COLORS)):
+            if target != pattern.colors[row, column]:
+                masked = kernel * (colors == target)
+                kernels[row, column, target] = masked / masked.sum()
+
+    return kernels
+
+
+def bilinear_demosaic(raw: NDArray, pattern: CFAPattern, kernel: NDArray | None = None) -> NDArray:
+    """
+    Demosaicking by normalized convolution, each missing color is a weighted mean of its measured neighbours.
+    Works for any pattern, for Bayer patterns with default kernel it is the bilinear interpolation.
+
+    For 2x2 patterns, each missing color of each pixel of the pattern is a strided convolution of the raw frames,
+    other patterns (such as X-Trans) convolve all color channels of all frames masked by the pattern at once.
+
+    :param raw: raw sensor image or batch of images, such as (N, H, W), can be integer, such as 12-bit frames
+    :param pattern: color filter array pattern of the sensor
+    :param kernel: odd sized interpolation weights of neighbours, by default the smallest bilinear (tent) kernel,
+                   which covers all colors of the pattern around each pixel, 3x3 for Bayer
+
+    :return: RGB image or batch of images, such as (N, H, W, 3)
+    """
+    raw = np.asarray(raw)
+    shape = raw.shape[-2:]
+
+    def weights_of(candidate: NDArray) -> NDArray:
+        data = np.ascontiguousarray(candidate, dtype=float).tobytes()
+        return _neighbour_weights(pattern.layout, shape, data, candidate.shape[0] // 2)
+
+    if kernel is None:
+        # smallest tent kernel, which has measured neighbours of all colors around every pixel
+        kernel = _tent_kernel(1)
+        while np.any(weights_of(kernel) == 0) and len(kernel) < min(shape):
+            kernel = _tent_kernel(len(kernel) // 2 + 1)
+
+    weights = weights_of(kernel)
+    if np.any(weights == 0):
+        raise ValueError("Kernel does not cover all colors of the pattern around each pixel!")
+
+    if pattern.shape == (2, 2):
+        return _phase_demosaic(raw, pattern, _bilinear_phase_kernels(pattern, kernel))
+
+    radius = kernel.shape[0] // 2
+    padded = np.pad(raw, [(0, 0)] * (raw.ndim - 2) + [(radius, radius), (radius, radius)], mode="reflect")
+    # color channels are placed before height and width, so each convolved plane is contiguous
+    measured = padded[..., np.newaxis, :, :] * _padded_masks(pattern, shape, radius)
+    interpolated = convolve(measured, kernel, mode="valid", backend="vectorized", axes=(-2, -1))
+
+    masks = np.moveaxis(pattern.masks(shape), -1, 0)
+    return np.moveaxis(np.where(masks, raw[..., np.newaxis, :, :], interpolated / weights), -3, -1)
+
+
+def malvar_demosaic(raw: NDArray, pattern: CFAPattern) -> NDArray:
+    """
+    Gradient-corrected linear demosaicking of Malvar, He and Cutler for Bayer patterns. Missing color is bilinear
+    estimate corrected with the Laplacian of the measured color, which reduces color fringes along the edges.
+    Each kernel is evaluated only on the pixels of the pattern, where it is needed.
+
+    :param raw: raw sensor image or batch of images, such as (N, H, W), can be integer, such as 12-bit frames
+    :param pattern: Bayer pattern of the sensor, such as `RGGB`
+
+    :return: RGB image or batch of images, such as (N, H, W, 3)
+    """
+    if not _is_bayer(pattern):
+        raise ValueError("Malvar-He-Cutler demosaicking requires 2x2 Bayer pattern!")
+
+    kernels = {}
+    for row, column in np.ndindex(*pattern.shape):
+        color = pattern.colors[row, column]
+        for target in range(len(COLORS)):
+            match COLORS[color], COLORS[target]:
+                case _ if color == target:
+                    continue
+                case ("R" | "B"), "G":
+                    kernels[row, column, target] = _GREEN_AT_RED_BLUE
+                case ("R" | "B"), _:
+                    kernels[row, column, target] = _RED_AT_BLUE
+                case _ if pattern.colors[row, 1 - column] == target:
+                    kernels[row, column, target] = _RED_BLUE_AT_GREEN_ROW
+                case _:
+                    kernels[row, column, target] = _RED_BLUE_AT_GREEN_COLUMN
+
+    return _phase_demosaic(np.asarray(raw), pattern, kernels)
+
+
+def demosaic(raw: NDArray, pattern: CFAPattern, method: Literal["bilinear", "malvar"] = "bilinear") -> NDArray:
+    """
+    Reconstructs RGB image from raw sensor image
+
+    :param raw: raw sensor image or batch of images, such as (N, H, W), can be integer, such as 12-bit frames
+    :param pattern: color filter array pattern of the sensor
+    :param method: "bilinear" for any pattern or "malvar" for gradient-corrected interpolation of Bayer patterns
+
+    :return: RGB image or batch of images, such as (N, H, W, 3)
+    """
+    match method:
+        case "bilinear":
+            return bilinear_demosaic(raw, pattern)
+        case "malvar":
+            return malvar_demosaic(raw, pattern)
+        case _:
+            raise ValueError(f"Demosaicking method {method} not supported!")
@@ -1,21 +1,335 @@
+from functools import partial
+from typing import Callable, Literal
+
 import numpy as np
-from numpy.typing import NDArray
-from skimage.util import view_as_windows
+from numpy.typing import DTypeLike, NDArray
+
+from src.buffers import Workspace, output_array, working_dtype
+from src.parallel import Executor, axis_index, row_tiles, run_tiles
+from src.profiling import instrument
+
+Boundary = Literal["crop", "partial"]
+# aggregations, which can be computed one axis at a time, which is faster for strided blocks than both axes at once
+_SEPARABLE_AGGREGATES = {
+    np.max: np.maximum,
+    np.amax: np.maximum,
+    np.min: np.minimum,
+    np.amin: np.minimum,
+    np.sum: np.add,
+}
+
+
+def _split_blocks(image: NDArray, block_sizes: tuple[int, int], axes: tuple[int, int]) -> tuple[NDArray, tuple]:
+    """
+    Splits each of the axes of length n * k into two axes (n, k), which is a view of the image without copying.
+    Returns the view and the positions of the block axes (k), which are reduced by the aggregation.
+    """
+    shape, block_axes = [], []
+    for axis, size in enumerate(image.shape):
+        if axis in axes:
+            block_size = block_sizes[axes.index(axis)]
+            shape += [size // block_size, block_size]
+            block_axes.append(len(shape) - 1)
+        else:
+            shape.append(size)
+
+    return image.reshape(shape), tuple(block_axes)
+
+
+def _block_reduce(
+    image: NDArray, reduce: callable, kernel_size: int, axes: tuple[int, int], boundary: Boundary, out: NDArray
+) -> NDArray:
+    """
+    Reduces non-overlapping kernel sized blocks over given axes with `reduce(blocks, axis=block_axes, out=out)`.
+    When the shape is not divisible by the kernel size, remaining pixels are either cropped, or reduced as smaller
+    blocks at the bottom and right edge, which are handled by separate reductions, so `reduce` needs no masking.
+    Each reduction writes directly into its part of the output.
+    """
+    axes = (axes[0] % image.ndim, axes[1] % image.ndim)
+    if boundary not in ("crop", "partial"):
+        raise ValueError(f"Boundary {boundary} not supported!")
+
+    # each axis is split into part divisible by the kernel size and the remainder, which is empty for "crop"
+    parts = []
+    for axis in axes:
+        n_blocks = image.shape[axis] // kernel_size
+        divisible = n_blocks * kernel_size
+        remainder = image.shape[axis] - divisible if boundary == "partial" else 0
+        parts.append(
+            [(slice(0, divisible), kernel_size, slice(0, n_blocks))]
+            + ([(slice(divisible, None), remainder, slice(n_blocks, None))] if remainder else [])
+        )
+
+    for row_slice, row_block, row_output in parts[0]:
+        for column_slice, column_block, column_output in parts[1]:
+            index, output_index = [slice(None)] * image.ndim, [slice(None)] * image.ndim
+            index[axes[0]], index[axes[1]] = row_slice, column_slice
+            output_index[axes[0]], output_index[axes[1]] = row_output, column_output
+            blocks, block_axes = _split_blocks(image[tuple(index)], (row_block, column_block), axes)
+            reduce(blocks, axis=block_axes, out=out[tuple(output_index)])
+
+    return out
+
+
+def _separable_reduce(
+    ufunc: np.ufunc,
+    blocks: NDArray,
+    axis: tuple[int, int],
+    dtype: DTypeLike = None,
+    out: NDArray | None = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    # reducing the outer block axis first reads the memory in contiguous runs
+    first, second = sorted(axis)
+    reduced = None
+    if workspace is not None:
+        shape = blocks.shape[:first] + blocks.shape[first + 1 :]
+        reduced = workspace.get("reduced", shape, np.result_type(blocks) if dtype is None else dtype)
+
+    reduced = ufunc.reduce(blocks, axis=first, dtype=dtype, out=reduced)
+    return ufunc.reduce(reduced, axis=second - 1, out=out)
+
+
+def _aggregate_into(aggregate: callable, blocks: NDArray, axis: tuple[int, int], out: NDArray) -> NDArray:
+    # any aggregation function, which does not support writing into output
+    out[...] = aggregate(blocks, axis=axis)
+    return out
+
+
+def _flat_aggregate(aggregate: callable, blocks: NDArray, axis: tuple[int, int]) -> NDArray:
+    # aggregation over a single axis, block axes are moved to the end and merged, which copies the blocks
+    flat = np.moveaxis(blocks, axis, (-2, -1))
+    return aggregate(flat.reshape(*flat.shape[:-2], -1), axis=-1)
+
+
+def _output_size(size: int, kernel_size: int, boundary: Boundary) -> int:
+    return -(-size // kernel_size) if boundary == "partial" else size // kernel_size
+
+
+def _output_shape(shape: tuple[int, ...], kernel_size: int, axes: tuple[int, int], boundary: Boundary) -> tuple:
+    shape = list(shape)
+    for axis in axes:
+        shape[axis] = _output_size(shape[axis], kernel_size, boundary)
+    return tuple(shape)
+
+
+def _downsample_tile(
+    image: NDArray,
+    output: NDArray,
+    tile: slice,
+    downsample_func: callable,
+    kernel_size: int,
+    axes: tuple[int, int],
+    **kwargs,
+) -> None:
+    """Downsample rows of the image needed for given tile of output rows, blocks do not overlap, so there is no halo"""
+    rows = image[axis_index(image.ndim, axes[0], slice(tile.start * kernel_size, tile.stop * kernel_size))]
+    out = output[axis_index(output.ndim, axes[0], tile)]
+    downsample_func(rows, kernel_size=kernel_size, axes=axes, out=out, **kwargs)
+
+
+def _parallel_downsample(
+    downsample_func: callable,
+    image: NDArray,
+    kernel_size: int,
+    axes: tuple[int, int],
+    out: NDArray,
+    workers: int,
+    executor: Executor,
+    boundary: Boundary,
+    **kwargs,
+) -> NDArray:
+    """Runs downsampling function on tiles of output rows in parallel"""
+    kwargs = dict(downsample_func=downsample_func, kernel_size=kernel_size, axes=axes, boundary=boundary, **kwargs)
+    return run_tiles(_downsample_tile, image, out, row_tiles(out.shape[axes[0]]), workers, executor, **kwargs)
+
+
+@instrument("downsampling.downsample")
+def downsample(
+    image: NDArray,
+    kernel_size: int = 2,
+    axes: tuple[int, int] = (0, 1),
+    workers: int | None = None,
+    executor: Executor = "thread",
+    boundary: Boundary = "crop",
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    """
+    Downsample an image using a convolution kernel, which averages non-overlapping blocks of the image
+
+    :param image: greyscale image or batch of images, such as (N, H, W, C)
+    :param kernel_size: size of the averaging kernel, also used as the step
+    :param axes: height and width axes of the image, all remaining axes are downsampled independently
+    :param workers: when given, tiles of output rows are computed in parallel, see `src.parallel.run_tiles`
+    :param executor: "thread" or "process" pool used for parallel execution
+    :param boundary: for shapes not divisible by the kernel size, "crop" drops remaining pixels, "partial" averages
+                     them as smaller blocks
+    :param out: output array, block means are written directly into it
+    :param dtype: type of the accumulation, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
+    :param workspace: reused buffer for partial sums, see `src.buffers.Workspace`, not used with `workers`
+    """
+    image = np.asarray(image)
+    dtype = working_dtype(image, dtype=dtype)
+    out = output_array(out, _output_shape(image.shape, kernel_size, axes, boundary), dtype)
+    if workers is not None:
+        kwargs = dict(dtype=dtype)
+        return _parallel_downsample(downsample, image, kernel_size, axes, out, workers, executor, boundary, **kwargs)
+
+    def mean(blocks: NDArray, axis: tuple[int, int], out: NDArray) -> NDArray:
+        _separable_reduce(np.add, blocks, axis, dtype, out, workspace)
+        return np.divide(out, blocks.shape[axis[0]] * blocks.shape[axis[1]], out=out)
+
+    return _block_reduce(image, mean, kernel_size, axes, boundary, out)
+
+
+@instrument("downsampling.nonlinear_downsample")
+def nonlinear_downsample(
+    image: NDArray,
+    aggregate: callable,
+    kernel_size: int = 2,
+    axes: tuple[int, int] = (0, 1),
+    workers: int | None = None,
+    executor: Executor = "thread",
+    boundary: Boundary = "crop",
+    out: NDArray | None = None,
+) -> NDArray:
+    """
+    Downsample an image using any aggregation function, such as `np.max` or `np.median`.
+    Aggregation is called once for all blocks, which are a view of the image, so no windows are copied.
+
+    :param image: greyscale image or batch of images, such as (N, H, W, C)
+    :param aggregate: function accepting array and tuple of axes to aggregate over, as `axis` keyword argument,
+                      functions raising TypeError for tuple of axes are called with blocks flattened into single axis
+    :param kernel_size: size of the aggregation window, also used as the step
+    :param axes: height and width axes of the image, all remaining axes are downsampled independently
+    :param workers: when given, tiles of output rows are computed in parallel, see `src.parallel.run_tiles`
+    :param executor: "thread" or "process" pool used for parallel execution, process pool requires picklable aggregate
+    :param boundary: for shapes not divisible by the kernel size, "crop" drops remaining pixels, "partial" aggregates
+                     them as smaller blocks
+    :param out: output array, max, min and sum are written directly into it, type of the image is preserved for them
+    """
+    image = np.asarray(image)
+    # output type is not known upfront, so it is taken from aggregation of a single element window
+    window = np.zeros((1, 1), dtype=image.dtype)
+    try:
+        dtype = np.asarray(aggregate(window, axis=(-2, -1))).dtype
+    except TypeError:
+        aggregate = partial(_flat_aggregate, aggregate)
+        dtype = np.asarray(aggregate(window, axis=(-2, -1))).dtype
+    out = output_array(out, _output_shape(image.shape, kernel_size, axes, boundary), dtype)
+    if workers is not None:
+        kwargs = dict(aggregate=aggregate)
+        return _parallel_downsample(
+            nonlinear_downsample, image, kernel_size, axes, out, workers, executor, boundary, **kwargs
+        )
+
+    if aggregate in _SEPARABLE_AGGREGATES:
+        reduce = partial(_separable_reduce, _SEPARABLE_AGGREGATES[aggregate])
+    else:
+        reduce = partial(_aggregate_into, aggregate)
+
+    return _block_reduce(image, reduce, kernel_size, axes, boundary, out)
+
+
+@instrument("downsampling.box_downsample")
+def box_downsample(
+    image: NDArray,
+    box_size: int | tuple[int, int],
+    step: int | tuple[int, int] | None = None,
+    axes: tuple[int, int] = (0, 1),
+    boundary: Boundary = "crop",
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+) -> NDArray:
+    """
+    Downsample an image by averaging boxes of any size placed every `step` pixels, boxes can overlap.
+    Box sums are computed from summed-area table with 4 lookups each, so the cost does not depend on the box size.
+    The table is always accumulated in float64, since in single precision sums over the whole image would lose the
+    precision of small boxes.
+
+    :param image: greyscale image or batch of images, such as (N, H, W, C)
+    :param box_size: height and width of the box, or single size of square box
+    :param step: distance between boxes in both axes, defaults to the box size
+    :param axes: height and width axes of the image, all remaining axes are downsampled independently
+    :param boundary: "crop" uses only boxes inside the image, "partial" adds boxes starting inside the image and
+                     crossing its edge, which average only pixels inside the image
+    :param out: output array, box means are written directly into it
+    :param dtype: type of the output, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
+    """
+    box_height, box_width = (box_size, box_size) if np.isscalar(box_size) else box_size
+    step = (box_height, box_width) if step is None else step
+    step_height, step_width = (step, step) if np.isscalar(step) else step
+    if boundary not in ("crop", "partial"):
+        raise ValueError(f"Boundary {boundary} not supported!")
+
+    image = np.asarray(image)
+    moved = np.moveaxis(image, axes, (-2, -1))
+    height, width = moved.shape[-2:]
+    # table[..., y, x] holds sum of all pixels above and to the left of (y, x), first row and column are zero
+    table = np.zeros((*moved.shape[:-2], height + 1, width + 1))
+    np.cumsum(np.cumsum(moved, axis=-2, dtype=np.float64), axis=-1, out=table[..., 1:, 1:])
+
+    def box_edges(size: int, box: int, box_step: int) -> tuple[NDArray, NDArray]:
+        starts = np.arange(0, size if boundary == "partial" else size - box + 1, box_step)
+        return starts, np.minimum(starts + box, size)
+
+    top, bottom = box_edges(height, box_height, step_height)
+    left, right = box_edges(width, box_width, step_width)
+    top, bottom = top[:, np.newaxis], bottom[:, np.newaxis]
+
+    output_shape = list(image.shape)
+    output_shape[axes[0]], output_shape[axes[1]] = len(top), len(left)
+    out = output_array(out, tuple(output_shape), working_dtype(image, dtype=dtype))
+
+    sums = table[..., bottom, right] - table[..., top, right] - table[..., bottom, left] + table[..., top, left]
+    np.divide(sums, (bottom - top) * (right - left), out=np.moveaxis(out, axes, (-2, -1)))
+    return out
+
+
+@instrument("downsampling.build_pyramid")
+def build_pyramid(
+    image: NDArray,
+    levels: int | None = None,
+    kernel_size: int = 2,
+    aggregate: Callable | None = None,
+    axes: tuple[int, int] = (0, 1),
+    boundary: Boundary = "partial",
+) -> list[NDArray]:
+    """
+    Builds image pyramid (mipmaps), where each level is downsampled from the previous one, so every pixel of the
+    original image is read only once.
+
+    :param image: greyscale image or batch of images, such as (N, H, W, C)
+    :param levels: maximal number of downsampled levels, by default levels are added until the image is a single pixel
+    :param kernel_size: downsampling ratio between consecutive levels
+    :param aggregate: aggregation function, such as `np.max`, averaging is used by default
+    :param axes: height and width axes of the image, all remaining axes are downsampled independently
+    :param boundary: handling of shapes not divisible by the kernel size, see `downsample`
 
+    :return: list of pyramid levels, starting with the original image
+    """
+    if kernel_size < 2:
+        raise ValueError(f"Pyramid requires kernel size of at least 2! {kernel_size} < 2")
 
-def downsample(image: NDArray, kernel_size: int = 2) -> np.array:
-    """Downsample an image using a convolution kernel"""
-    kernel = np.ones((kernel_size, kernel_size)) / kernel_size**2
-    windows = view_as_windows(image, window_shape=kernel_size, step=kernel_size)
-    return np.apply_over_axes(np.sum, windows * kernel, axes=(2, 3)).squeeze()
+    pyramid = [image]
+    while levels is None or len(pyramid) <= levels:
+        previous = pyramid[-1]
+        sizes = [previous.shape[axis] for axis in axes]
+        if all(size == 1 for size in sizes) or any(_output_size(size, kernel_size, boundary) == 0 for size in sizes):
+            break
 
+        if aggregate is None:
+            pyramid.append(downsample(previous, kernel_size, axes=axes, boundary=boundary))
+        else:
+            pyramid.append(nonlinear_downsample(previous, aggregate, kernel_size, axes=axes, boundary=boundary))
 
-def nonlinear_downsample(image: NDArray, aggregate: callable, kernel_size: int = 2) -> NDArray:
-    """Downsample an image using any aggregation function, such as `np.max` or `np.median`"""
-    windows = view_as_windows(image, window_shape=kernel_size, step=kernel_size)
-    return np.apply_over_axes(aggregate, windows, axes=(2, 3)).squeeze()
+    return pyramid
 
 
 def rgb_downsample(image: NDArray, kernel_size: int = 2, downsample_func: callable = downsample) -> NDArray:
-    """Downsample an RGB image by applying the downsample function to each channel"""
-    return np.stack([downsample_func(image[:, :, channel], kernel_size) for channel in range(3)], axis=2)
+    """Downsample an RGB image by applying the downsample function to all channels at once"""
+    return downsample_func(image, kernel_size, axes=(0, 1))
@@ -1,89 +1,310 @@
+import inspect
 from abc import abstractmethod
-from typing import Optional
+from functools import lru_cache
+from typing import NamedTuple, Sequence
 
 import numpy as np
 import pywt
-from numpy.typing import NDArray
+from numpy.typing import DTypeLike, NDArray
+from scipy import fft
+
+from src.buffers import output_array, working_dtype
+from src.profiling import instrument
 
 
 class CompressionTransform:
     """
     Interface for compression transforms.
+    Methods `forward` and `backward` of all subclasses are instrumented, see `src.profiling`.
     """
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method in ("forward", "backward"):
+            if method in vars(cls):
+                setattr(cls, method, instrument(f"fourier.{cls.__name__}.{method}")(vars(cls)[method]))
+
     @abstractmethod
-    def forward(self, variables: NDArray) -> NDArray: ...
+    def forward(self, variables: NDArray, axes: tuple[int, int] = (-2, -1)) -> NDArray: ...
 
     @abstractmethod
-    def backward(self, variables: NDArray) -> NDArray: ...
+    def backward(
+        self, variables: NDArray, axes: tuple[int, int] = (-2, -1), shape: tuple[int, int] | None = None
+    ) -> NDArray:
+        """
+        :param variables: transformed coefficients
+        :param axes: axes along which the coefficients were computed
+        :param shape: size of the original image along `axes`, inverse transform is cropped to it when given
+        """
+        ...
+
+
+def _crop(variables: NDArray, axes: tuple[int, int], shape: tuple[int, int] | None) -> NDArray:
+    # inverse transforms of odd sized images can be larger than the original image
+    if shape is None:
+        return variables
+
+    index = [slice(None)] * variables.ndim
+    for axis, size in zip(axes, shape):
+        index[axis] = slice(0, size)
+    return variables[tuple(index)]
 
 
 class FourierTransform2D(CompressionTransform):
     """
     2D Fourier transform used for compression.
     Inverse transform uses absolute value by default.
+
+    With `real=True` only non-negative frequencies along the last axis are stored (`rfft2`), since spectrum of real
+    images is Hermitian symmetric, which halves memory and time. Inverse is real, so absolute value is not used and
+    `shape` must be passed to `backward` for images of odd width.
+
+    Transforms of single precision images are computed in single precision (complex64 coefficients).
     """
 
-    def forward(self, variables: NDArray) -> NDArray:
-        return np.fft.fft2(variables)
+    def __init__(self, real: bool = False):
+        self.real = real
+
+    def forward(self, variables: NDArray, axes: tuple[int, int] = (-2, -1)) -> NDArray:
+        if self.real:
+            return fft.rfft2(variables, axes=axes)
+        return fft.fft2(variables, axes=axes)
+
+    def backward(
+        self, variables: NDArray, axes: tuple[int, int] = (-2, -1), shape: tuple[int, int] | None = None
+    ) -> NDArray:
+        if self.real:
+            return fft.irfft2(variables, s=shape, axes=axes)
+        return _crop(np.abs(fft.ifft2(variables, axes=axes)), axes, shape)
+
+
+_DETAIL_KEYS = ("da", "ad", "dd")  # order of horizontal, vertical and diagonal details returned by `pywt.wavedec2`
+
 
-    def backward(self, variables: NDArray) -> NDArray:
-        return np.abs(np.fft.ifft2(variables))
+def _coefficient_size(size: int, wavelet_name: str, level: int) -> int:
+    """Size of the coefficient array along single axis, which is sum of detail lengths and approximation length"""
+    filter_length = pywt.Wavelet(wavelet_name).dec_len
+    total = 0
+    for _ in range(level):
+        size = pywt.dwt_coeff_len(size, filter_length, mode="symmetric")
+        total += size
+    return total + size
+
+
+@lru_cache(maxsize=256)
+def _image_size(coefficient_size: int, wavelet_name: str, level: int) -> int:
+    """Smallest image size along single axis, which has coefficient array of given size"""
+    # coefficient lengths of every level do not decrease with image size, so all image sizes with equal coefficient
+    # array size have equal coefficient lengths and layout, which allows finding the layout without the image shape
+    low, high = 1, 2 * coefficient_size
+    while low < high:
+        middle = (low + high) // 2
+        if _coefficient_size(middle, wavelet_name, level) < coefficient_size:
+            low = middle + 1
+        else:
+            high = middle
+
+    if _coefficient_size(low, wavelet_name, level) != coefficient_size:
+        raise ValueError(f"Coefficient array of size {coefficient_size} does not match wavelet {wavelet_name}!")
+    return low
+
+
+@lru_cache(maxsize=64)
+def _wavelet_layout(shape: tuple[int, int], wavelet_name: str, level: int) -> tuple[tuple[int, int], list]:
+    """Shape of the coefficient array and 2D slices of each coefficient, computed once per image shape"""
+    coefficients, slices = pywt.coeffs_to_array(pywt.wavedec2(np.zeros(shape), wavelet_name, level=level))
+    return coefficients.shape, slices
+
+
+def _expand_index(index: tuple[slice, slice], axes: tuple[int, int], ndim: int) -> tuple[slice, ...]:
+    # index of 2D coefficient in array with batch axes
+    expanded = [slice(None)] * ndim
+    expanded[axes[0]], expanded[axes[1]] = index
+    return tuple(expanded)
 
 
 class WaveletTransform2D(CompressionTransform):
     """
     2D wavelet transform used for compression.
+
+    Transform is stateless, so single instance can be shared between threads. Layout of coefficients in the
+    coefficient array is computed once per image shape, wavelet and level and cached. All images of a batch
+    (all axes apart from `axes`) are transformed in a single call.
     """
 
     def __init__(self, wavelet_name: str, level: int):
         self.wavelet_name = wavelet_name
         self.level = level
-        self.slices: Optional[NDArray] = None
 
-    def forward(self, variables: NDArray) -> NDArray:
-        transformed = pywt.wavedec2(variables, self.wavelet_name, level=self.level)
-        coefficients, slices = pywt.coeffs_to_array(transformed)
-        self.slices = slices
+    def forward(self, variables: NDArray, axes: tuple[int, int] = (-2, -1)) -> NDArray:
+        variables = np.asarray(variables)
+        axes = (axes[0] % variables.ndim, axes[1] % variables.ndim)
+        shape = (variables.shape[axes[0]], variables.shape[axes[1]])
+        coefficient_shape, slices = _wavelet_layout(shape, self.wavelet_name, self.level)
+
+        transformed = pywt.wavedec2(variables, self.wavelet_name, level=self.level, axes=axes)
+        output_shape = list(variables.shape)
+        output_shape[axes[0]], output_shape[axes[1]] = coefficient_shape
+        # parts of the array are not covered by any coefficient, when detail sizes of consecutive levels differ
+        coefficients = np.zeros(output_shape, dtype=transformed[0].dtype)
+
+        coefficients[_expand_index(slices[0], axes, variables.ndim)] = transformed[0]
+        for details, level_slices in zip(transformed[1:], slices[1:]):
+            for detail, key in zip(details, _DETAIL_KEYS):
+                coefficients[_expand_index(level_slices[key], axes, variables.ndim)] = detail
 
         return coefficients
 
-    def backward(self, variables: NDArray) -> NDArray:
-        if self.slices is None:
-            raise ValueError("Cannot perform inverse transform without first performing forward transform!")
+    def backward(
+        self, variables: NDArray, axes: tuple[int, int] = (-2, -1), shape: tuple[int, int] | None = None
+    ) -> NDArray:
+        ndim = np.ndim(variables)
+        axes = (axes[0] % ndim, axes[1] % ndim)
+        image_shape = shape or tuple(_image_size(variables.shape[axis], self.wavelet_name, self.level) for axis in axes)
+        _, slices = _wavelet_layout(image_shape, self.wavelet_name, self.level)
+
+        coefficients = [variables[_expand_index(slices[0], axes, ndim)]]
+        for level_slices in slices[1:]:
+            coefficients.append(tuple(variables[_expand_index(level_slices[key], axes, ndim)] for key in _DETAIL_KEYS))
+
+        return _crop(pywt.waverec2(coefficients, self.wavelet_name, axes=axes), axes, shape)
 
-        variables = pywt.array_to_coeffs(variables, self.slices, output_format="wavedec2")  # type: ignore
-        return pywt.waverec2(variables, self.wavelet_name)
 
+class CompressionResult(NamedTuple):
+    """Reconstruction and quality metrics for a single compression ratio"""
 
-def compress_and_decompress(image: NDArray, transform: CompressionTransform, compression: float) -> NDArray:
+    compression: float
+    image: NDArray
+    psnr: float
+    kept: int  # number of non-zero coefficients after thresholding
+    size_ratio: float  # number of kept coefficients divided by the number of image elements
+
+
+def coefficient_thresholds(magnitudes: NDArray, compressions: Sequence[float], axes: tuple[int, int]) -> list[NDArray]:
+    """
+    Magnitude thresholds of each image in the batch, for each compression ratio.
+    Coefficients with magnitudes above the threshold are kept, shared by `compress_and_decompress` and `src.codec`.
+
+    :param magnitudes: magnitudes of transform coefficients
+    :param compressions: ratios of coefficients to remove, in [0, 1) range
+    :param axes: axes of the coefficients of single image, thresholds are computed separately for remaining axes
+
+    :return: threshold array for each compression ratio, broadcastable with `magnitudes`
+    """
+    for compression in compressions:
+        if not 0 <= compression < 1:
+            raise ValueError(f"Compression ratio must be in [0, 1) range, got {compression}!")
+
+    # move transformed axes to the end and flatten them, so each image is thresholded independently
+    moved = np.moveaxis(magnitudes, axes, (-2, -1))
+    flat = moved.reshape(*moved.shape[:-2], -1)
+    # threshold is k-th smallest magnitude, partition places all of them at their sorted positions in O(n)
+    kth = [int(compression * flat.shape[-1]) for compression in compressions]
+    partitioned = np.partition(flat, sorted(set(kth)), axis=-1)
+
+    return [np.expand_dims(partitioned[..., k], axis=axes) for k in kth]
+
+
+def _psnr(image: NDArray, reconstructed: NDArray, data_range: float) -> float:
+    mse = np.mean((image - reconstructed) ** 2)
+    return float(10 * np.log10(data_range**2 / mse)) if mse > 0 else np.inf
+
+
+@instrument("fourier.compress_and_decompress")
+def compress_and_decompress(
+    image: NDArray,
+    transform: CompressionTransform,
+    compression: float,
+    axes: tuple[int, int] = (0, 1),
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+) -> NDArray:
     """
     Compresses and decompresses an image using the Fourier transform.
     This function can be used to see compression and decompression effects.
 
-    :param image: greyscale image
+    :param image: greyscale image or batch of images, such as (N, H, W, C)
     :param transform: transform to use, using CompressionTransform interface
     :param compression: ratio of coefficients to remove
+    :param axes: height and width axes of the image, threshold is computed separately for each of remaining axes
+    :param out: output array, the decompressed image is written into it
+    :param dtype: type of the computation, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
 
     :return: image after compression and decompression
     """
-    transformed = transform.forward(image)
-    coefficients = np.sort(np.abs(transformed.reshape(-1)))  # sort by magnitude
+    image = np.asarray(image)
+    transformed = transform.forward(image.astype(working_dtype(image, dtype=dtype), copy=False), axes=axes)
+    magnitudes = np.abs(transformed)
+    (threshold,) = coefficient_thresholds(magnitudes, [compression], axes)
 
-    threshold = coefficients[int(compression * len(coefficients))]
-    indices = np.abs(transformed) > threshold
+    # coefficients are a new array, so removed ones are zeroed in place
+    np.multiply(transformed, magnitudes > threshold, out=transformed)
+    decompressed = transform.backward(transformed, axes=axes, shape=tuple(image.shape[axis] for axis in axes))
+    if out is None:
+        return decompressed
 
-    decompressed = transformed * indices
-    return transform.backward(decompressed)
+    output_array(out, decompressed.shape, decompressed.dtype)[...] = decompressed
+    return out
+
+
+def compression_sweep(
+    image: NDArray,
+    transform: CompressionTransform,
+    compressions: Sequence[float],
+    axes: tuple[int, int] = (0, 1),
+    data_range: float | None = None,
+    dtype: DTypeLike = None,
+) -> list[CompressionResult]:
+    """
+    Compresses and decompresses an image with each of the compression ratios, to compare rate and distortion.
+    Forward transform and thresholds for all ratios are computed once, only inverse transform is run per ratio.
+
+    :param image: greyscale image or batch of images, such as (N, H, W, C)
+    :param transform: transform to use, using CompressionTransform interface
+    :param compressions: ratios of coefficients to remove
+    :param axes: height and width axes of the image, threshold is computed separately for each of remaining axes
+    :param data_range: peak value used for PSNR, defaults to the difference of maximum and minimum of the image
+    :param dtype: type of the computation, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
+
+    :return: list of results in the order of `compressions`
+    """
+    image = np.asarray(image)
+    transformed = transform.forward(image.astype(working_dtype(image, dtype=dtype), copy=False), axes=axes)
+    magnitudes = np.abs(transformed)
+    shape = tuple(image.shape[axis] for axis in axes)
+    data_range = float(np.max(image) - np.min(image)) if data_range is None else data_range
+
+    results = []
+    for compression, threshold in zip(compressions, coefficient_thresholds(magnitudes, compressions, axes)):
+        kept = magnitudes > threshold
+        reconstructed = transform.backward(np.where(kept, transformed, 0), axes=axes, shape=shape)
+        n_kept = int(np.count_nonzero(kept))
+        psnr = _psnr(image, reconstructed, data_range)
+        results.append(CompressionResult(compression, reconstructed, psnr, n_kept, n_kept / np.size(image)))
+
+    return results
 
 
 def apply_rgb(func: callable, image: NDArray, *args, **kwargs) -> NDArray:
     """
     Applies a function to each color channel of an image.
 
-    :param func: function to apply to each color channel
+    :param func: function to apply to each color channel, functions accepting `axes` keyword argument are applied to
+                 all channels in a single call with `axes=(0, 1)`, other functions are called for each channel
     :param image: image to apply function to
 
     :return: image after function has been applied to each color channel
     """
+    if _accepts_axes(func):
+        return func(image, *args, axes=(0, 1), **kwargs)
+
     return np.dstack([func(image[:, :, channel], *args, **kwargs) for channel in range(3)])
+
+
+def _accepts_axes(func: callable) -> bool:
+    try:
+        return "axes" in inspect.signature(func).parameters
+    except (TypeError, ValueError):  # signature of some builtins can not be inspected
+        return False
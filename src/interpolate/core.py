@@ -1,60 +1,252 @@
+from functools import lru_cache
 from typing import Callable
 
 import numpy as np
-from numpy.typing import NDArray
+from numpy.typing import DTypeLike, NDArray
+from scipy import sparse
+
+from src.buffers import Workspace, output_array, working_dtype
+from src.parallel import Executor, axis_index, row_tiles, run_tiles
+from src.profiling import instrument
 
 KernelCallable = Callable[[NDArray, NDArray | float, float], NDArray]
 InterpolateCallable = Callable[[NDArray, KernelCallable, int], NDArray]
 
+# kernel matrices denser than this are stored as dense arrays, since dense matrix product is faster for them
+SPARSE_DENSITY = 0.25
+
+
+def _sample_width(x_measure: NDArray) -> float:
+    # mean period between samples, which is the sampling period of uniformly spaced samples
+    return float(np.max(x_measure) - np.min(x_measure)) / (len(x_measure) - 1)
+
+
+def sparse_kernel_matrix(
+    x_measure: NDArray, x_interpolate: NDArray, kernel: KernelCallable, width: float | None = None
+) -> sparse.csr_matrix:
+    """
+    Creates kernel matrix of compact support kernel in sparse CSR format, storing only its nonzero band.
+    Measurements within the support of each interpolation point are found with binary search, so they can be
+    spaced non-uniformly. Memory and kernel evaluations are O(len(x_interpolate) * support).
+
+    :param x_measure: x values of the measurements, do not need to be sorted
+    :param x_interpolate: x values of the interpolation
+    :param kernel: interpolation kernel with finite `support` attribute, see `kernels.compact_support`
+    :param width: width of the kernel, defaults to the mean period between measurements
+
+    :return: sparse matrix with shape (len(x_measure), len(x_interpolate))
+    """
+    support = getattr(kernel, "support", np.inf)
+    if not np.isfinite(support):
+        raise ValueError("Sparse kernel matrix requires kernel with finite support!")
+
+    x_measure, x_interpolate = np.asarray(x_measure), np.asarray(x_interpolate)
+    width = _sample_width(x_measure) if width is None else width
+    order = np.argsort(x_measure, kind="stable")
+    radius = support * width
+
+    # measurements in closed interval [x - radius, x + radius] around each interpolation point x, widened by one
+    # measurement on both sides, since kernels can be non-zero at the edge of the support (nearest neighbour) and
+    # kernel evaluated on (x - offset) / width can round differently than the comparison, zeros are removed below
+    sorted_measure = x_measure[order]
+    first = np.maximum(np.searchsorted(sorted_measure, x_interpolate - radius, side="left") - 1, 0)
+    stop = np.minimum(np.searchsorted(sorted_measure, x_interpolate + radius, side="right") + 1, len(x_measure))
+    counts = stop - first
+    pointers = np.concatenate([[0], np.cumsum(counts)])
+    columns = np.repeat(np.arange(len(x_interpolate)), counts)
+    rows = order[np.arange(pointers[-1]) - np.repeat(pointers[:-1] - first, counts)]
+
+    values = kernel(x_interpolate[columns], offset=x_measure[rows], width=width)  # type: ignore
+    weights = sparse.csr_matrix(
+        (np.asarray(values, dtype=float), (rows, columns)), shape=(len(x_measure), len(x_interpolate))
+    )
+    weights.eliminate_zeros()
+    return weights
 
+
+@instrument("interpolate.convolve_interpolate")
 def convolve_interpolate(
     x_measure: NDArray, y_measure: NDArray, x_interpolate: NDArray, kernel: KernelCallable, return_kernels: bool = False
-) -> NDArray | tuple[NDArray, NDArray]:
-    width = x_measure[1] - x_measure[0]  # store period between samples
-    kernels = []
+) -> NDArray | tuple[NDArray, NDArray | sparse.csr_matrix]:
+    """
+    Interpolate as a sum of kernels centred at each measurement and scaled by its value
 
-    for x_sample, y_sample in zip(x_measure, y_measure):
-        # compute kernel for each sample using convolution, y_sample is just a single value
-        kernel = np.convolve(y_sample, kernel(x_interpolate, offset=x_sample, width=width), mode="same")  # type: ignore
-        kernels.append(kernel)
+    :param x_measure: x values of the measurements, can be spaced non-uniformly for compact support kernels
+    :param y_measure: y values of the measurements
+    :param x_interpolate: x values of the interpolation
+    :param kernel: callable interpolation kernel accepting x, offset and width
+    :param return_kernels: when True, scaled kernel of each measurement is returned as a row of the matrix,
+                           which is sparse (see `sparse_kernel_matrix`) for compact support kernels
+
+    :return: y values of the interpolation and optionally matrix of scaled kernels
+    """
+    weights = _kernel_weights(x_measure, x_interpolate, kernel)
+    y_interp = y_measure @ weights
 
-    y_interp = np.sum(np.asarray(kernels), axis=0)
     if return_kernels:
-        return y_interp, np.asarray(kernels)
+        # each row of kernel matrix is scaled by its measurement
+        if sparse.issparse(weights):
+            return y_interp, sparse.csr_matrix(weights.multiply(np.asarray(y_measure)[:, np.newaxis]))
+        return y_interp, weights * np.asarray(y_measure)[:, np.newaxis]
 
     return y_interp
 
 
+def kernel_matrix(x_measure: NDArray, x_interpolate: NDArray, kernel: KernelCallable) -> NDArray:
+    """
+    Creates matrix of kernel values, centred at each measurement and evaluated at each interpolation point
+
+    :param x_measure: x values of the measurements
+    :param x_interpolate: x values of the interpolation
+    :param kernel: callable interpolation kernel accepting x, offset and width
+
+    :return: matrix with shape (len(x_measure), len(x_interpolate))
+    """
+    width = _sample_width(x_measure)
+    return np.asarray([kernel(x_interpolate, offset=offset, width=width) for offset in x_measure])  # type: ignore
+
+
+def _kernel_weights(x_measure: NDArray, x_interpolate: NDArray, kernel: KernelCallable) -> NDArray | sparse.csr_matrix:
+    # only the nonzero band is evaluated for compact support kernels, other kernels need the dense matrix
+    if np.isfinite(getattr(kernel, "support", np.inf)):
+        return sparse_kernel_matrix(x_measure, x_interpolate, kernel)
+    return kernel_matrix(x_measure, x_interpolate, kernel)
+
+
+@instrument("interpolate.product_interpolate")
 def product_interpolate(
     x_measure: NDArray, y_measure: NDArray, x_interpolate: NDArray, kernel: KernelCallable
 ) -> NDArray:
     """
-    Interpolate using a convolution kernel and efficient dot product
+    Interpolate using a convolution kernel and efficient dot product. Kernels with compact support use sparse
+    kernel matrix, so interpolating long signals needs memory proportional to the number of interpolation points.
 
-    :param x_measure: x values of the measurements
+    :param x_measure: x values of the measurements, can be spaced non-uniformly for compact support kernels
     :param y_measure: y values of the measurements
     :param x_interpolate: x values of the interpolation
     :param kernel: callable interpolation kernel accepting x, offset and width
 
     :return: y values of the interpolation
     """
-    width = x_measure[1] - x_measure[0]  # store period between samples
-    kernels = np.asarray([kernel(x_interpolate, offset=offset, width=width) for offset in x_measure])  # type: ignore
+    return y_measure @ _kernel_weights(x_measure, x_interpolate, kernel)
+
 
-    return y_measure @ kernels
+def _neighbours(target: NDArray, support: float, width: float, origin: float = 0) -> tuple[NDArray, int]:
+    """First candidate source index for each target coordinate and number of candidates covering the kernel support"""
+    # source with index i is placed at origin + i, it contributes only if |target - (origin + i)| < support * width
+    # open interval of length L contains at most ceil(L) integers, one more is needed when its start is an integer
+    radius = support * width
+    return np.floor(target - origin - radius).astype(int), int(np.ceil(2 * radius)) + 1
 
 
-def image_interpolate1d(image: NDArray, kernel: KernelCallable, ratio: int) -> NDArray:
-    """Interpolate an image using row and column-wise interpolations"""
+@lru_cache(maxsize=32)
+@instrument("interpolate.weights")
+def _axis_weights(
+    length: int, ratio: int, kernel: KernelCallable, width: float = 1.0, dtype: DTypeLike = np.float64
+) -> NDArray | sparse.csr_matrix:
+    """
+    Kernel matrix interpolating `length` samples along single axis to `ratio * length` samples.
+    Matrices are cached, since they only depend on the image size, so video frames reuse them.
+    Compact support kernels produce banded matrices, which are stored in sparse CSR format.
+    Matrices are stored in the working type of the images, so single precision images are not promoted.
+    """
+    x_measure = np.arange(length)
+    x_interpolate = np.linspace(0, length, ratio * length, endpoint=False)
+    support = getattr(kernel, "support", np.inf)
 
-    def row_column_interpolate(row: NDArray) -> NDArray:
-        """Interpolate a single row or column of the image"""
-        x_measure = np.arange(len(row))
-        x_interpolate = np.linspace(0, len(row), ratio * len(row), endpoint=False)
-        return product_interpolate(x_measure, row, x_interpolate, kernel)
+    if not np.isfinite(support) or min(np.ceil(2 * support * width) + 1, length) / length > SPARSE_DENSITY:
+        weights = np.asarray([kernel(x_interpolate, offset=x, width=width) for x in x_measure], dtype=dtype)
+        weights.flags.writeable = False  # cached matrix is shared between calls
+        return weights
+
+    weights = sparse_kernel_matrix(x_measure, x_interpolate, kernel, width).astype(dtype)
+    weights.data.flags.writeable = False
+    return weights
+
+
+@instrument("interpolate.apply_weights")
+def _apply_weights(
+    image: NDArray, weights: NDArray | sparse.csr_matrix, axis: int, out: NDArray | None = None
+) -> NDArray:
+    """Interpolate all rows or columns of the image (or batch of images) along single axis at once"""
+    moved = np.moveaxis(image, axis, -1)
+    if sparse.issparse(weights):
+        # sparse product is computed for 2D matrix, all other axes are flattened into its rows
+        interpolated = moved.reshape(-1, moved.shape[-1]) @ weights
+        interpolated = np.moveaxis(interpolated.reshape(*moved.shape[:-1], -1), -1, axis)
+        if out is None:
+            return interpolated
 
-    interpolated = np.apply_along_axis(row_column_interpolate, 1, image)
-    return np.apply_along_axis(row_column_interpolate, 0, interpolated)
+        out[...] = interpolated
+        return out
+
+    # multiply given axis with the kernel matrix, dense product is written directly into the output
+    if out is None:
+        return np.moveaxis(moved @ weights, -1, axis)
+
+    np.matmul(moved, weights, out=np.moveaxis(out, axis, -1))
+    return out
+
+
+def _apply_weights_tile(image: NDArray, output: NDArray, tile: slice, weights: NDArray, axis: int, tile_axis: int):
+    """Interpolate tile of rows (or columns) along the other axis, tiles do not need halo"""
+    index = axis_index(image.ndim, tile_axis, tile)
+    _apply_weights(image[index], weights, axis, out=output[index])
+
+
+@instrument("interpolate.image_interpolate1d")
+def image_interpolate1d(
+    image: NDArray,
+    kernel: KernelCallable,
+    ratio: int,
+    axes: tuple[int, int] = (0, 1),
+    workers: int | None = None,
+    executor: Executor = "thread",
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+    workspace: Workspace | None = None,
+) -> NDArray:
+    """
+    Interpolate an image using row and column-wise interpolations
+
+    :param image: grayscale image or batch of images, such as (N, H, W, C)
+    :param kernel: callable interpolation kernel accepting x, offset and width
+    :param ratio: up-scaling factor
+    :param axes: height and width axes of the image, all remaining axes are interpolated independently
+    :param workers: when given, tiles of rows (and then columns) are interpolated in parallel
+    :param executor: "thread" or "process" pool used for parallel execution, see `src.parallel.run_tiles`
+    :param out: output array, the interpolated image is written into it
+    :param dtype: type of the computation, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
+    :param workspace: reused buffer for the image interpolated along rows, see `src.buffers.Workspace`
+    """
+    image = np.asarray(image)
+    dtype = working_dtype(image, dtype=dtype)
+    height_axis, width_axis = axes
+    shape = list(image.shape)
+    shape[height_axis], shape[width_axis] = ratio * shape[height_axis], ratio * shape[width_axis]
+    out = output_array(out, tuple(shape), dtype)
+
+    # rows are interpolated first (tiled over height), then columns (tiled over width)
+    for axis, tile_axis in ((width_axis, height_axis), (height_axis, width_axis)):
+        weights = _axis_weights(image.shape[axis], ratio, kernel, dtype=dtype)
+        shape = list(image.shape)
+        shape[axis] = weights.shape[1]
+
+        if axis == height_axis:
+            output = out
+        else:  # image interpolated along rows is an intermediate result
+            output = np.empty(shape, dtype) if workspace is None else workspace.get("rows", tuple(shape), dtype)
+
+        if workers is None:
+            image = _apply_weights(image, weights, axis, out=output)
+        else:
+            kwargs = dict(weights=weights, axis=axis, tile_axis=tile_axis)
+            image = run_tiles(
+                _apply_weights_tile, image, output, row_tiles(shape[tile_axis]), workers, executor, **kwargs
+            )
+
+    return out
 
 
 def create_grid(limits: tuple[int, int], shape: tuple[int, int]) -> NDArray:
@@ -67,48 +259,153 @@ def create_grid(limits: tuple[int, int], shape: tuple[int, int]) -> NDArray:
     max_row_value, max_column_value = limits
     height, width = shape
 
-    x = np.linspace(1, width, max_row_value, endpoint=True)
-    y = np.linspace(1, height, max_column_value, endpoint=True)
+    x = np.linspace(1, width, max_column_value, endpoint=True)
+    y = np.linspace(1, height, max_row_value, endpoint=True)
     xx, yy = np.meshgrid(x, y)
     return np.vstack([yy.ravel(), xx.ravel()]).T
 
 
-def image_interpolate2d(image: NDArray, kernel: KernelCallable, ratio: int, eps: float = float(0)) -> NDArray:
+def _target_points(target_y: NDArray, target_x: NDArray) -> NDArray:
+    """Flattened grid of (y, x) target points, ordered row by row, same as `create_grid`"""
+    yy, xx = np.meshgrid(target_y, target_x, indexing="ij")
+    return np.stack([yy.ravel(), xx.ravel()], axis=-1)
+
+
+def _dense_interpolate2d_tile(
+    images: NDArray,
+    output: NDArray,
+    tile: slice,
+    target_y: NDArray,
+    target_x: NDArray,
+    kernel: KernelCallable,
+    width: float,
+    support: float,
+) -> None:
+    """Interpolate tile of target rows, every image point contributes to each tile, so tiles have no halo"""
+    image_shape = images.shape[-2:]
+    # create indexing for image starting from 1 as array of 2D points (shape: [H*W, 2])
+    # [1,1], [1,2], [1,3], ..., [2,1], [2,2], [2,3], ... [H,W]
+    image_grid = create_grid(image_shape, image_shape)  # type: ignore
+    interpolate_grid = _target_points(target_y[tile], target_x)
+
+    values = images.reshape(*images.shape[:-2], -1)
+    interpolated = np.zeros(
+        (*values.shape[:-1], len(interpolate_grid)), dtype=output.dtype
+    )  # do not store all kernels to save memory
+
+    for index, point in enumerate(image_grid):
+        kernel_value = kernel(interpolate_grid, offset=point, width=width)  # type: ignore
+        interpolated += values[..., index, np.newaxis] * kernel_value
+
+    output[..., tile, :] = interpolated.reshape(*values.shape[:-1], -1, len(target_x))
+
+
+def _sparse_interpolate2d_tile(
+    images: NDArray,
+    output: NDArray,
+    tile: slice,
+    target_y: NDArray,
+    target_x: NDArray,
+    kernel: KernelCallable,
+    width: float,
+    support: float,
+) -> None:
+    """Interpolate tile of target rows, by gathering values only from source neighbours within kernel support"""
+    height, image_width = images.shape[-2:]
+    first_rows, n_rows = _neighbours(target_y[tile], support, width, origin=1)
+    first_columns, n_columns = _neighbours(target_x, support, width, origin=1)
+    target_points = _target_points(target_y[tile], target_x)
+
+    interpolated = np.zeros((*images.shape[:-2], len(first_rows), len(first_columns)), dtype=output.dtype)
+    # each step handles single neighbour of every target point at once, such as upper-left one
+    for row_step in range(n_rows):
+        rows = first_rows + row_step
+        valid_rows = (rows >= 0) & (rows < height)
+        rows = np.clip(rows, 0, height - 1)
+
+        for column_step in range(n_columns):
+            columns = first_columns + column_step
+            valid_columns = (columns >= 0) & (columns < image_width)
+            columns = np.clip(columns, 0, image_width - 1)
+
+            offsets = _target_points(rows + 1, columns + 1)  # source points for each target point
+            weights = kernel(target_points, offset=offsets, width=width)  # type: ignore
+            weights = weights.reshape(len(rows), len(columns)) * valid_rows[:, np.newaxis] * valid_columns
+
+            interpolated += images[..., rows[:, np.newaxis], columns[np.newaxis, :]] * weights
+
+    output[..., tile, :] = interpolated
+
+
+@instrument("interpolate.image_interpolate2d")
+def image_interpolate2d(
+    image: NDArray,
+    kernel: KernelCallable,
+    ratio: int,
+    eps: float = float(0),
+    axes: tuple[int, int] = (0, 1),
+    workers: int | None = None,
+    executor: Executor = "thread",
+    support: float | None = None,
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+) -> NDArray:
     """
     Interpolate image using 2D kernel interpolation
 
-    :param image: grayscale image to interpolate as 2D NDArray
+    Kernels with compact support (see `kernels.compact_support`) are evaluated only for source neighbours of each
+    target point, which costs O(support^2) per target point, instead of evaluating each kernel over the entire target
+    grid. Kernels with infinite support, such as sinc, are evaluated densely, unless truncated with `support`.
+
+    :param image: grayscale image to interpolate as 2D NDArray or batch of images, such as (N, H, W, C)
     :param kernel: Callable interpolation kernel accepting 2D grid, offset and width
     :param ratio: up-scaling factor
     :param eps: width correction coefficient to avoid overlapping kernels (use for sinc and keys kernels)
+    :param axes: height and width axes of the image, all remaining axes are interpolated independently
+    :param workers: when given, tiles of target rows are interpolated in parallel
+    :param executor: "thread" or "process" pool used for parallel execution, see `src.parallel.run_tiles`
+    :param support: support radius of the kernel in samples, defaults to `kernel.support`, for infinite support
+                    kernels finite value truncates the kernel, passing `np.inf` forces dense evaluation
+    :param out: output array, the interpolated image is written into it
+    :param dtype: type of the computation, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
 
-    :return: interpolated image as 2D NDArray
+    :return: interpolated image as NDArray
     """
-    target_shape = np.asarray(image.shape) * ratio
-    # create indexing for image starting from 1 as array of 2D points (shape: [H*W, 2])
-    # [1,1], [1,2], [1,3], ..., [2,1], [2,2], [2,3], ... [H,W]
-    image_grid = create_grid(image.shape, image.shape)  # type: ignore
+    # image axes are moved to the end, so each kernel value is broadcast over all leading (batch) axes
+    images = np.moveaxis(image, axes, (-2, -1))
+    batch_shape, (height, width) = images.shape[:-2], images.shape[-2:]
+    target_shape = (height * ratio, width * ratio)
     # create indexing for interpolation grid, filling points in-between points from image grid
     # [1,1], [1, 1 + 1/ratio], [1, 1 + 2/ratio], ..., [H, W]
-    interpolate_grid = create_grid(target_shape, image.shape)  # type: ignore
+    target_y = np.linspace(1, height, target_shape[0], endpoint=True)
+    target_x = np.linspace(1, width, target_shape[1], endpoint=True)
+
+    support = getattr(kernel, "support", np.inf) if support is None else support
+    interpolate_tile = _sparse_interpolate2d_tile if np.isfinite(support) else _dense_interpolate2d_tile
+
+    dtype = working_dtype(images, dtype=dtype)
+    moved = None if out is None else np.moveaxis(out, axes, (-2, -1))
+    interpolated = output_array(moved, (*batch_shape, *target_shape), dtype)
+    kwargs = dict(target_y=target_y, target_x=target_x, kernel=kernel, width=(1 - eps), support=support)
 
-    interpolated = np.zeros(target_shape)  # do not store all kernels to save memory in 2D
-    for point, value in zip(image_grid, image.ravel()):
-        kernel_value = value * kernel(interpolate_grid, offset=point, width=(1 - eps))  # type: ignore
-        interpolated += kernel_value.reshape(target_shape)
+    if workers is None:
+        interpolate_tile(images, interpolated, slice(0, target_shape[0]), **kwargs)
+    else:
+        run_tiles(interpolate_tile, images, interpolated, row_tiles(target_shape[0]), workers, executor, **kwargs)
 
-    return interpolated
+    return out if out is not None else np.moveaxis(interpolated, (-2, -1), axes)
 
 
 def rgb_image_interpolate(
     image: NDArray, kernel: KernelCallable, ratio: int, interpolate: InterpolateCallable = image_interpolate1d
 ) -> NDArray:
     """
-    Interpolate an RGB image by applying the image interpolation function to each channel
+    Interpolate an RGB image by applying the image interpolation function to all channels at once
 
     :param image: RGB image to interpolate as 3D NDArray
     :param kernel: Callable interpolation kernel accepting x, offset and width
     :param ratio: up-scaling factor
-    :param interpolate: image interpolation function to use, default is 1D interpolation
+    :param interpolate: image interpolation function to use, default is 1D interpolation, must accept `axes`
     """
-    return np.stack([interpolate(image[:, :, channel], kernel, ratio) for channel in range(3)], axis=2)
+    return interpolate(image, kernel, ratio, axes=(0, 1))
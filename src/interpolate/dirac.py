@@ -1,11 +1,57 @@
+from typing import Iterable, Iterator, Literal
+
 import numpy as np
-from numpy.typing import NDArray
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.typing import DTypeLike, NDArray
 
+from src.buffers import output_array, working_dtype
 from src.interpolate.core import KernelCallable
+from src.profiling import instrument
+
+
+def _dirac_kernel(kernel_size: int, kernel_width: float, kernel: KernelCallable) -> NDArray:
+    # create centred kernel on -1 to 1 range with given width
+    x_kernel = np.linspace(-1, 1, kernel_size)
+    return np.asarray(kernel(x_kernel, offset=0, width=kernel_width), dtype=float)  # type: ignore
+
+
+def _polyphase_filters(y_kernel: NDArray, ratio: int) -> NDArray:
+    # split kernel into `ratio` sub-filters, column p holds every ratio-th element starting at p: k[p], k[p + r], ...
+    taps = int(np.ceil(len(y_kernel) / ratio))
+    return np.pad(y_kernel, (0, taps * ratio - len(y_kernel))).reshape(taps, ratio)
 
 
+def _polyphase_full(y_measure: NDArray, filters: NDArray, kernel_size: int) -> NDArray:
+    # full convolution of zero-stuffed signal with the kernel, computed only from the original samples
+    # output phase p of sample q is sum_t y[q - t] k[p + r * t], so all phases are a single matrix product
+    # of sliding windows of the signal (along the last axis) and the matrix of sub-filters
+    taps, ratio = filters.shape
+    padded = np.pad(y_measure, [(0, 0)] * (y_measure.ndim - 1) + [(taps - 1, taps - 1)])
+    windows = sliding_window_view(padded, taps, axis=-1)[..., ::-1]  # windows[q, t] = y[q - t]
+    phases = windows @ filters  # shape (..., N + T - 1, ratio)
+    full = phases.reshape(*phases.shape[:-2], -1)  # interleave phases: sample q, phase p is at r * q + p
+    # zero-stuffed signal has (r - 1) trailing zeros, so its full convolution can be longer than the computed phases
+    full_size = ratio * y_measure.shape[-1] + kernel_size - 1
+    return np.pad(full, [(0, 0)] * (full.ndim - 1) + [(0, max(full_size - full.shape[-1], 0))])
+
+
+def _same_slice(signal_size: int, kernel_size: int) -> slice:
+    # part of the full convolution returned by `np.convolve` with mode="same"
+    start = (min(signal_size, kernel_size) - 1) // 2
+    return slice(start, start + max(signal_size, kernel_size))
+
+
+@instrument("interpolate.dirac_interpolate")
 def dirac_interpolate(
-    x_measure: NDArray, y_measure: NDArray, ratio: int, kernel_size: int, kernel_width: float, kernel: KernelCallable
+    x_measure: NDArray,
+    y_measure: NDArray,
+    ratio: int,
+    kernel_size: int,
+    kernel_width: float,
+    kernel: KernelCallable,
+    method: Literal["polyphase", "zero-stuffing"] = "polyphase",
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
 ) -> NDArray:
     """
     :param x_measure: array of samples from x-axis of the measured function, needs to be uniformly spaced
@@ -14,20 +60,146 @@ def dirac_interpolate(
     :param kernel_size: desired size of the kernel for interpolation
     :param kernel_width: kernel width, needs to be selected according to the kernel used and number of samples
     :param kernel: kernel as callable numpy function
+    :param method: "zero-stuffing" convolves representation of the function as dirac deltas with the kernel,
+                   "polyphase" gives the same result, but skips all (ratio - 1) / ratio multiplications with zeros
+    :param out: output array, the interpolated signal is written into it
+    :param dtype: type of the computation, float32 for single precision signals and float64 otherwise,
+                  see `src.buffers.working_dtype`
     """
     if not isinstance(ratio, int):
         raise ValueError("Interpolation ratio must be an integer!")
+    if method not in ("polyphase", "zero-stuffing"):
+        raise ValueError(f"Method {method} not supported!")
+
+    dtype = working_dtype(np.asarray(y_measure), dtype=dtype)
+    y_kernel = _dirac_kernel(kernel_size, kernel_width, kernel).astype(dtype)
+
+    if method == "polyphase":
+        full = _polyphase_full(np.asarray(y_measure, dtype=dtype), _polyphase_filters(y_kernel, ratio), kernel_size)
+        interpolated = full[_same_slice(ratio * len(x_measure), kernel_size)]
+    else:
+        interpolated = _zero_stuffing(x_measure, y_measure, ratio, y_kernel)
 
+    if out is None:
+        return interpolated
+
+    output_array(out, interpolated.shape, dtype)[...] = interpolated
+    return out
+
+
+def _zero_stuffing(x_measure: NDArray, y_measure: NDArray, ratio: int, y_kernel: NDArray) -> NDArray:
     # create new interpolation x-axis and y-axis
     # those have length ratio * len(x_measure) + kernel_size to account for decrease in size from valid convolution
     x_interpolate = np.linspace(x_measure[0], x_measure[-1], ratio * len(x_measure))
-    y_interpolate = np.zeros(len(x_interpolate))
+    y_interpolate = np.zeros(len(x_interpolate), dtype=y_kernel.dtype)
     # compute kernel ratio and prefill y_interpolate with measured values
     # this creates a representation of the original function as dirac delta functions in the target domain,
     # where x-axis is the size expected after interpolation
     y_interpolate[::ratio] = y_measure
-    # create centred kernel on -1 to 1 range with given width
-    x_kernel = np.linspace(-1, 1, kernel_size)
-    y_kernel = kernel(x_kernel, offset=0, width=kernel_width)
     # return valid convolution, which will contain interpolation
     return np.convolve(y_interpolate, y_kernel, mode="same")
+
+
+@instrument("interpolate.dirac_interpolate2d")
+def dirac_interpolate2d(
+    image: NDArray,
+    ratio: int,
+    kernel_size: int,
+    kernel_width: float,
+    kernel: KernelCallable,
+    axes: tuple[int, int] = (0, 1),
+    out: NDArray | None = None,
+    dtype: DTypeLike = None,
+) -> NDArray:
+    """
+    Up-scales an image by integer ratio, using polyphase dirac interpolation along rows and then columns.
+    Result is the same as zero-stuffing image in both axes and convolving it with separable 2D kernel.
+
+    :param image: grayscale image or batch of images, such as (N, H, W, C)
+    :param ratio: integer interpolation ratio
+    :param kernel_size: desired size of the kernel for interpolation
+    :param kernel_width: kernel width, needs to be selected according to the kernel used and number of samples
+    :param kernel: 1D kernel as callable numpy function
+    :param axes: height and width axes of the image, all remaining axes are interpolated independently
+    :param out: output array, the interpolated image is written into it
+    :param dtype: type of the computation, float32 for single precision images and float64 otherwise,
+                  see `src.buffers.working_dtype`
+    """
+    if not isinstance(ratio, int):
+        raise ValueError("Interpolation ratio must be an integer!")
+
+    dtype = working_dtype(np.asarray(image), dtype=dtype)
+    filters = _polyphase_filters(_dirac_kernel(kernel_size, kernel_width, kernel), ratio).astype(dtype)
+    interpolated = np.asarray(image, dtype=dtype)
+
+    for axis in reversed(axes):  # interpolate rows (width axis) first, same as `image_interpolate1d`
+        # interpolated axis is moved to the end, so all other axes are treated as batch
+        moved = np.moveaxis(interpolated, axis, -1)
+        full = _polyphase_full(moved, filters, kernel_size)
+        interpolated = np.moveaxis(full[..., _same_slice(ratio * moved.shape[-1], kernel_size)], -1, axis)
+
+    if out is None:
+        return interpolated
+
+    output_array(out, interpolated.shape, dtype)[...] = interpolated
+    return out
+
+
+def stream_dirac_interpolate(
+    chunks: Iterable[NDArray],
+    ratio: int,
+    kernel_size: int,
+    kernel_width: float,
+    kernel: KernelCallable,
+    dtype: DTypeLike = None,
+) -> Iterator[NDArray]:
+    """
+    Streaming version of polyphase `dirac_interpolate` for long signals, which are read in chunks.
+    Concatenated output chunks are equal to the interpolation of the concatenated input, as long as the kernel is not
+    longer than the interpolated signal. Only (kernel_size / ratio) last samples are kept between chunks.
+
+    :param chunks: iterable of consecutive 1D chunks of the measured signal, chunks can have different lengths
+    :param ratio: integer interpolation ratio
+    :param kernel_size: desired size of the kernel for interpolation
+    :param kernel_width: kernel width, needs to be selected according to the kernel used and number of samples
+    :param kernel: kernel as callable numpy function
+    :param dtype: type of the computation, defaults to the working type of the first chunk, float32 for single
+                  precision signals and float64 otherwise, see `src.buffers.working_dtype`
+
+    :return: iterator of interpolated chunks, each chunk has `ratio` samples per input sample, apart from the delay of
+             the centred kernel, which shifts (kernel_size - 1) // 2 samples from the first to the last chunk
+    """
+    if not isinstance(ratio, int):
+        raise ValueError("Interpolation ratio must be an integer!")
+
+    filters = _polyphase_filters(_dirac_kernel(kernel_size, kernel_width, kernel), ratio)
+    taps = filters.shape[0]
+    history: NDArray | None = None  # previous samples needed by the first windows of the next chunk
+    skip = (kernel_size - 1) // 2  # delay of the centred kernel, same as in `np.convolve` with mode="same"
+
+    def process(samples: NDArray) -> NDArray:
+        nonlocal history, filters, dtype
+        if history is None:
+            # type of the stream is known from the first chunk
+            dtype = working_dtype(samples, dtype=dtype)
+            filters, history = filters.astype(dtype), np.zeros(taps - 1, dtype=dtype)
+
+        samples = samples.astype(dtype, copy=False)
+        extended = np.concatenate([history, samples])
+        history = extended[len(extended) - (taps - 1) :]
+        if len(extended) < taps:  # empty chunk, or flushing kernel with a single tap per phase
+            return np.zeros(0, dtype=dtype)
+
+        windows = sliding_window_view(extended, taps)[..., ::-1]
+        return (windows @ filters).ravel()
+
+    for chunk in chunks:
+        output = process(np.asarray(chunk))
+        dropped = min(skip, len(output))
+        skip -= dropped
+        yield output[dropped:]
+
+    # feeding zeros flushes the tail of the kernel, which is still missing (kernel_size - 1) // 2 samples
+    delay = (kernel_size - 1) // 2
+    tail = np.pad(process(np.zeros(taps - 1)), (0, delay))
+    yield tail[skip:delay]
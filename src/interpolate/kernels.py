@@ -1,34 +1,241 @@
+from abc import abstractmethod
+from typing import Callable
+
 import numpy as np
 from numpy.typing import NDArray
 
+from src.profiling import instrument
+
+
+def compact_support(radius: float) -> Callable[[Callable], Callable]:
+    """
+    Decorator storing support radius of the kernel as its `support` attribute.
+    Kernel evaluated with given width is zero for all |x - offset| >= radius * width (in each axis for 2D kernels).
+    """
+
+    def decorator(kernel: Callable) -> Callable:
+        kernel.support = radius  # type: ignore
+        return kernel
+
+    return decorator
+
+
+def _normalized(x: NDArray, offset: NDArray | float, width: float, out: NDArray | None) -> NDArray:
+    """Writes (x - offset) / width into `out` buffer, which is allocated when not given"""
+    if out is None:
+        x = np.asarray(x)
+        dtype = x.dtype if np.issubdtype(x.dtype, np.floating) else np.float64
+        out = np.empty(np.broadcast_shapes(x.shape, np.shape(offset)), dtype=dtype)
+
+    np.subtract(x, offset, out=out)
+    np.divide(out, width, out=out)
+    return out
+
+
+class Kernel:
+    """
+    Interface for 1D interpolation kernel objects.
+    Kernels are called with the same arguments as kernel functions, so they can be used as `KernelCallable`,
+    but they evaluate the kernel in-place, in the buffer given as `out` or a single newly allocated array.
+    """
+
+    support: float = np.inf
+
+    @abstractmethod
+    def evaluate(self, u: NDArray) -> NDArray:
+        """Evaluates the kernel in-place on array of normalized coordinates u = (x - offset) / width"""
+        ...
+
+    @instrument("kernels.evaluate")
+    def __call__(
+        self, x: NDArray, offset: NDArray | float = 0, width: float = 1, out: NDArray | None = None
+    ) -> NDArray:
+        """
+        :param x: points at which kernel is evaluated
+        :param offset: centre of the kernel, broadcast with `x`
+        :param width: kernel width
+        :param out: optional floating point buffer of the broadcast shape of `x` and `offset`
+        """
+        return self.evaluate(_normalized(x, offset, width, out))
+
+
+class SampleHoldKernel(Kernel):
+    """Sample and hold interpolation kernel"""
+
+    support = 1
+
+    def evaluate(self, u: NDArray) -> NDArray:
+        u[...] = (u >= 0) & (u < 1)
+        return u
+
+
+class NearestNeighbourKernel(Kernel):
+    """Nearest neighbour interpolation kernel"""
+
+    support = 0.5
+
+    def evaluate(self, u: NDArray) -> NDArray:
+        u[...] = (u >= -0.5) & (u < 0.5)
+        return u
+
+
+class LinearKernel(Kernel):
+    """Linear interpolation kernel"""
+
+    support = 1
+
+    def evaluate(self, u: NDArray) -> NDArray:
+        np.abs(u, out=u)
+        np.subtract(1, u, out=u)
+        return np.maximum(u, 0, out=u)
+
+
+class SincKernel(Kernel):
+    """Normalized sine interpolation kernel, truncated to [-alpha, alpha) range"""
 
-def sample_hold_kernel(x: NDArray, offset: float, width: float) -> NDArray:
+    def __init__(self, alpha: float = np.inf):
+        self.alpha = alpha
+        self.support = alpha
+
+    def evaluate(self, u: NDArray) -> NDArray:
+        if not np.isfinite(self.alpha):
+            u[...] = np.sinc(u)
+            return u
+
+        inside = (u >= -self.alpha) & (u < self.alpha)
+        u[inside] = np.sinc(u[inside])
+        u[~inside] = 0
+        return u
+
+
+class KeysKernel(Kernel):
+    """
+    Interpolation kernel given by Keys bi-cubic function, each cubic segment is evaluated only where it applies
+
+    :references:
+        * https://en.wikipedia.org/wiki/Bicubic_interpolation#Bicubic_convolution_algorithm
+        * http://verona.fi-p.unam.mx/boris/practicas/CubConvInterp.pdf
+    """
+
+    support = 2
+
+    def __init__(self, alpha: float = -0.5):
+        self.alpha = alpha
+
+    def evaluate(self, u: NDArray) -> NDArray:
+        alpha = self.alpha
+        np.abs(u, out=u)
+        inner, outside = u < 1, u >= 2
+        outer = ~(inner | outside)
+
+        x = u[inner]  # polynomials are in Horner form, which needs no powers of x
+        u[inner] = ((alpha + 2) * x - (alpha + 3)) * x * x + 1
+        x = u[outer]
+        u[outer] = ((alpha * x - 5 * alpha) * x + 8 * alpha) * x - 4 * alpha
+        u[outside] = 0
+        return u
+
+
+class LookupKernel(Kernel):
+    """
+    Kernel tabulated once on a fine grid over its support and evaluated by linear interpolation between the table
+    entries, which replaces evaluating the kernel formula with two table lookups. Error is of order of the second
+    derivative of the kernel divided by resolution squared, kernels with discontinuities (such as nearest neighbour)
+    are smoothed over 1 / resolution.
+    """
+
+    def __init__(self, kernel: Kernel | Callable, resolution: int = 1024, support: float | None = None):
+        """
+        :param kernel: kernel object or kernel function with finite support
+        :param resolution: number of table entries per unit of normalized coordinates
+        :param support: support radius of the table, defaults to `kernel.support`, required for infinite support
+        """
+        support = getattr(kernel, "support", np.inf) if support is None else support
+        if not np.isfinite(support):
+            raise ValueError("Lookup table requires kernel with finite support!")
+
+        self.support = support
+        self.resolution = resolution
+        grid = np.linspace(-support, support, int(np.ceil(2 * support * resolution)) + 1)
+        self.values = np.asarray(kernel(grid, offset=0, width=1), dtype=float)  # type: ignore
+        self.slopes = np.append(np.diff(self.values), 0)  # slope after the last entry is never used
+        self.scale = (len(grid) - 1) / (2 * support)  # actual number of entries per unit
+
+    def evaluate(self, u: NDArray) -> NDArray:
+        last = len(self.values) - 1
+        # position in the table, integer part is the index of the entry and fractional part the interpolation weight
+        u += self.support
+        u *= self.scale
+        outside = (u < 0) | (u > last)
+        np.clip(u, 0, last, out=u)
+
+        index = u.astype(np.intp)
+        u -= index
+        u *= self.slopes[index]
+        u += self.values[index]
+        u[outside] = 0
+        return u
+
+
+class SeparableKernel2D:
+    """
+    2D kernel given as product of 1D kernels along both axes, all 2D kernels in this module are separable.
+    Called with the same arguments as 2D kernel functions, with optional `out` and `workspace` buffers.
+    """
+
+    def __init__(self, kernel: Kernel):
+        self.kernel = kernel
+        self.support = kernel.support
+
+    def __call__(
+        self,
+        xy: NDArray,
+        offset: NDArray | float = 0,
+        width: float = 1,
+        out: NDArray | None = None,
+        workspace: NDArray | None = None,
+    ) -> NDArray:
+        """
+        :param xy: array of 2D points, with coordinates in the last axis
+        :param offset: centre of the kernel, single float, 2-element array or array of points broadcast with `xy`
+        :param width: kernel width
+        :param out: optional buffer for the result, which has shape of `xy` without the last axis
+        :param workspace: optional buffer of the same shape as `out`, used for kernel values along the second axis
+        """
+        offset = np.asarray(offset)
+        x_offset, y_offset = (offset[..., 0], offset[..., 1]) if offset.ndim else (offset, offset)
+
+        out = self.kernel(xy[..., 0], x_offset, width, out=out)
+        np.multiply(out, self.kernel(xy[..., 1], y_offset, width, out=workspace), out=out)
+        return out
+
+
+@compact_support(1)
+def sample_hold_kernel(x: NDArray, offset: float, width: float, out: NDArray | None = None) -> NDArray:
     """Sample and hold interpolation kernel"""
-    x = x - offset
-    return (x >= 0) * (x < width)
+    return SampleHoldKernel()(x, offset, width, out=out)
 
 
-def nearest_neighbour_kernel(x: NDArray, offset: float, width: float) -> NDArray:
+@compact_support(0.5)
+def nearest_neighbour_kernel(x: NDArray, offset: float, width: float, out: NDArray | None = None) -> NDArray:
     """Nearest neighbour interpolation kernel"""
-    x = x - offset
-    return (x >= (-1 * width / 2)) * (x < width / 2)
+    return NearestNeighbourKernel()(x, offset, width, out=out)
 
 
-def linear_kernel(x: NDArray, offset: float, width: float) -> NDArray:
+@compact_support(1)
+def linear_kernel(x: NDArray, offset: float, width: float, out: NDArray | None = None) -> NDArray:
     """Linear interpolation kernel"""
-    x = x - offset
-    x = x / width
-    return (1 - np.abs(x)) * (np.abs(x) < 1)
+    return LinearKernel()(x, offset, width, out=out)
 
 
-def sinc_kernel(x: NDArray, offset: float, width: float, alpha: float = np.inf) -> NDArray:
+@compact_support(np.inf)
+def sinc_kernel(x: NDArray, offset: float, width: float, alpha: float = np.inf, out: NDArray | None = None) -> NDArray:
     """Normalized sine interpolation kernel"""
-    x = x - offset
-    x = x / width
-    return (x >= -alpha) * (x < alpha) * np.sinc(x)
+    return SincKernel(alpha)(x, offset, width, out=out)
 
 
-def keys_kernel(x: NDArray, offset: float, width: float, alpha: float = -0.5) -> NDArray:
+@compact_support(2)
+def keys_kernel(x: NDArray, offset: float, width: float, alpha: float = -0.5, out: NDArray | None = None) -> NDArray:
     """
     Interpolation kernel given by Keys bi-cubic function
 
@@ -36,75 +243,42 @@ def keys_kernel(x: NDArray, offset: float, width: float, alpha: float = -0.5) ->
         * https://en.wikipedia.org/wiki/Bicubic_interpolation#Bicubic_convolution_algorithm
         * http://verona.fi-p.unam.mx/boris/practicas/CubConvInterp.pdf
     """
-    x = x - offset
-    x = x / width
-    x = np.abs(x)
-    return ((alpha + 2) * x**3 - (alpha + 3) * x**2 + 1) * (x >= 0) * (x < 1) + (
-        alpha * x**3 - 5 * alpha * x**2 + 8 * alpha * x - 4 * alpha
-    ) * (x >= 1) * (x < 2) * (1 - (x >= 0) * (x < 1))
+    return KeysKernel(alpha)(x, offset, width, out=out)
 
 
-def sample_hold_kernel2d(xy: NDArray, offset: float | NDArray, width: float) -> NDArray:
+@compact_support(1)
+def sample_hold_kernel2d(xy: NDArray, offset: float | NDArray, width: float, out: NDArray | None = None) -> NDArray:
     """Sample and hold interpolation kernel. Offset can be single float or 2-element array"""
-    xy = xy - offset
-    x, y = xy[:, 0], xy[:, 1]
-    return (x >= 0) * (x < width) * (y >= 0) * (y < width)
+    return SeparableKernel2D(SampleHoldKernel())(xy, offset, width, out=out)
 
 
-def nearest_neighbour_kernel2d(xy: NDArray, offset: float, width: float) -> NDArray:
+@compact_support(0.5)
+def nearest_neighbour_kernel2d(xy: NDArray, offset: float, width: float, out: NDArray | None = None) -> NDArray:
     """Nearest neighbour interpolation kernel. Offset can be single float or 2-element array"""
-    xy = xy - offset
-    x, y = xy[:, 0], xy[:, 1]
-    return (x >= (-1 * width / 2)) * (x < width / 2) * (y >= (-1 * width / 2)) * (y < width / 2)
+    return SeparableKernel2D(NearestNeighbourKernel())(xy, offset, width, out=out)
 
 
-def linear_kernel2d(xy: NDArray, offset: float, width: float) -> NDArray:
+@compact_support(1)
+def linear_kernel2d(xy: NDArray, offset: float, width: float, out: NDArray | None = None) -> NDArray:
     """Linear interpolation kernel."""
-    xy = xy - offset
-    xy = xy / width
-    x, y = xy[:, 0], xy[:, 1]
-
-    return ((1 - np.abs(x)) * (1 - np.abs(y))) * (np.abs(x) < 1) * (np.abs(y) < 1)
+    return SeparableKernel2D(LinearKernel())(xy, offset, width, out=out)
 
 
-def sinc_kernel2d(xy: NDArray, offset: float, width: float, alpha: float = np.inf) -> NDArray:
+@compact_support(np.inf)
+def sinc_kernel2d(
+    xy: NDArray, offset: float, width: float, alpha: float = np.inf, out: NDArray | None = None
+) -> NDArray:
     """Normalized sine interpolation kernel"""
-    xy = xy - offset
-    xy = xy / width
-    x, y = xy[:, 0], xy[:, 1]
+    return SeparableKernel2D(SincKernel(alpha))(xy, offset, width, out=out)
 
-    return ((y >= -alpha) * (y < alpha) * (x >= -alpha) * (x < alpha)) * (np.sinc(x) * np.sinc(y))
 
-
-def keys_kernel2d(xy: NDArray, offset: float, width: float, alpha: float = -0.5) -> NDArray:
+@compact_support(2)
+def keys_kernel2d(xy: NDArray, offset: float, width: float, alpha: float = -0.5, out: NDArray | None = None) -> NDArray:
     """
-    Interpolation kernel given by Keys bi-cubic function extended to 2D
+    Interpolation kernel given by Keys bi-cubic function extended to 2D, as product of 1D kernels along both axes
 
     :references:
         * https://en.wikipedia.org/wiki/Bicubic_interpolation#Bicubic_convolution_algorithm
         * http://verona.fi-p.unam.mx/boris/practicas/CubConvInterp.pdf
     """
-
-    def xy_range(xs: NDArray, ys: NDArray, xlow: float, xhigh: float, ylow: float, yhigh: float) -> NDArray:
-        return (xs >= xlow) * (xs < xhigh) * (ys >= ylow) * (ys < yhigh)
-
-    xy = xy - offset
-    xy = xy / width
-    x, y = xy[:, 0], xy[:, 1]
-    x = np.abs(x)
-    y = np.abs(y)
-
-    return (
-        ((alpha + 2) * x**3 - (alpha + 3) * x**2 + 1)
-        * ((alpha + 2) * y**3 - (alpha + 3) * y**2 + 1)
-        * xy_range(x, y, xlow=0, xhigh=1, ylow=0, yhigh=1)
-        + (alpha * x**3 - 5 * alpha * x**2 + 8 * alpha * x - 4 * alpha)
-        * ((alpha + 2) * y**3 - (alpha + 3) * y**2 + 1)
-        * xy_range(x, y, xlow=1, xhigh=2, ylow=0, yhigh=1)
-        + (alpha * y**3 - 5 * alpha * y**2 + 8 * alpha * y - 4 * alpha)
-        * ((alpha + 2) * x**3 - (alpha + 3) * x**2 + 1)
-        * xy_range(x, y, xlow=0, xhigh=1, ylow=1, yhigh=2)
-        + (alpha * x**3 - 5 * alpha * x**2 + 8 * alpha * x - 4 * alpha)
-        * (alpha * y**3 - 5 * alpha * y**2 + 8 * alpha * y - 4 * alpha)
-        * xy_range(x, y, xlow=1, xhigh=2, ylow=1, yhigh=2)
-    )
+    return SeparableKernel2D(KeysKernel(alpha))(xy, offset, width, out=out)
@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Literal
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+# number of output rows processed by a single tile, tiles do not depend on the number of workers
+# so each tile is always computed in the same way, which makes the output deterministic
+TILE_ROWS = 32
+
+TileCallable = Callable[..., None]
+Executor = Literal["thread", "process"]
+
+
+def row_tiles(n_rows: int, tile_rows: int = TILE_ROWS) -> list[slice]:
+    """Splits range of output rows into consecutive tiles, last tile can be shorter"""
+    return [slice(start, min(start + tile_rows, n_rows)) for start in range(0, n_rows, tile_rows)]
+
+
+def axis_index(ndim: int, axis: int, index: slice) -> tuple[slice, ...]:
+    """Creates tuple indexing array with `ndim` dimensions with given slice along single axis"""
+    indices = [slice(None)] * ndim
+    indices[axis] = index
+    return tuple(indices)
+
+
+def read_rows(array: NDArray, start: int, stop: int, leading: int, axis: int = 0) -> NDArray:
+    """
+    Reads rows [start, stop) of the array along given axis, as if it was zero-padded with `leading` rows in front and
+    infinitely many rows at the end. Only the rows overlapping with the array are read, which is used to read tiles
+    with halo from memory-mapped arrays.
+
+    :param array: array to read from, such as `np.memmap`
+    :param start: first row to read, in padded coordinates
+    :param stop: row after the last row to read, in padded coordinates
+    :param leading: number of zero rows in front of the array
+    :param axis: axis along which rows are read
+    """
+    first, last = max(start - leading, 0), max(min(stop - leading, array.shape[axis]), 0)
+    rows = np.asarray(array[axis_index(array.ndim, axis, slice(first, last))])
+    before = min(max(leading - start, 0), stop - start)
+    after = (stop - start) - before - rows.shape[axis]
+
+    widths = [(0, 0)] * array.ndim
+    widths[axis] = (before, after)
+    return np.pad(rows, widths)
+
+
+class _SharedArray:
+    """Array stored in shared memory block, which can be attached to from worker processes by its name"""
+
+    def __init__(self, shape: tuple[int, ...], dtype: DTypeLike, name: str | None = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)  # shared memory block can not be empty
+        self.memory = SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+
+    @property
+    def spec(self) -> tuple[tuple[int, ...], str, str]:
+        """Arguments needed to attach to the shared array from another process"""
+        return self.shape, self.dtype.str, self.memory.name
+
+    def close(self, unlink: bool = False) -> None:
+        del self.array  # buffer can not be released, while array is still using it
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def _run_shared_tile(func: TileCallable, input_spec: tuple, output_spec: tuple, tile: slice, kwargs: dict) -> None:
+    # executed in worker process, input and output are attached from shared memory without copying
+    inputs, output = _SharedArray(*input_spec), _SharedArray(*output_spec)
+    try:
+        func(inputs.array, output.array, tile, **kwargs)
+    finally:
+        inputs.close()
+        output.close()
+
+
+def run_tiles(
+    func: TileCallable,
+    inputs: NDArray,
+    output: NDArray,
+    tiles: list[slice],
+    workers: int = 1,
+    executor: Executor = "thread",
+    **kwargs,
+) -> NDArray:
+    """
+    Runs tile function for each tile in parallel, each call computes part of the output from (a part of) the inputs.
+
+    Thread executor shares the arrays directly and is fast for NumPy code, which releases the GIL. Process executor
+    copies the inputs into shared memory once and workers write to shared output buffer, which is copied back after
+    all tiles are finished. For process executor, `func` and `kwargs` must be picklable (e.g. module level functions).
+
+    :param func: function called as `func(inputs, output, tile, **kwargs)`, which must write `output` part of the tile
+    :param inputs: input array, tile function reads all rows it needs, including halo
+    :param output: preallocated output array
+    :param tiles: slices of output rows, tiles should not depend on `workers` to keep the output deterministic
+    :param workers: number of threads or processes
+    :param executor: "thread" or "process" pool
+
+    :return: output array
+    """
+    if workers < 1:
+        raise ValueError(f"Number of workers must be positive! {workers} < 1")
+
+    match executor:
+        case "thread":
+            with ThreadPoolExecutor(workers) as pool:
+                futures = [pool.submit(func, inputs, output, tile, **kwargs) for tile in tiles]
+                for future in futures:
+                    future.result()  # re-raise exceptions from workers
+        case "process":
+            shared_inputs = _SharedArray(inputs.shape, inputs.dtype)
+            shared_output = _SharedArray(output.shape, output.dtype)
+            try:
+                shared_inputs.array[...] = inputs
+                with ProcessPoolExecutor(workers) as pool:
+                    specs = shared_inputs.spec, shared_output.spec
+                    futures = [pool.submit(_run_shared_tile, func, *specs, tile, kwargs) for tile in tiles]
+                    for future in futures:
+                        future.result()
+                output[...] = shared_output.array
+            finally:
+                shared_inputs.close(unlink=True)
+                shared_output.close(unlink=True)
+        case _:
+            raise ValueError(f"Executor {executor} not supported!")
+
+    return output
@@ -0,0 +1,336 @@
+from functools import partial
+from typing import Callable, Literal
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+from scipy import sparse
+
+from src.buffers import output_array, working_dtype
+from src.conv import conv_output_shape, convolve, separate_kernel
+from src.downsampling import Boundary, _output_size, downsample, nonlinear_downsample
+from src.interpolate.core import KernelCallable, _apply_weights, _axis_weights
+from src.parallel import TILE_ROWS, row_tiles, run_tiles
+
+RowsCallable = Callable[[int, int], NDArray]
+
+
+def _read_rows(parent: RowsCallable, start: int, stop: int, size: int) -> NDArray:
+    """Reads rows [start, stop) of the stage output, rows outside of [0, size) are zeros"""
+    first, last = min(max(start, 0), size), max(min(stop, size), 0)
+    rows = parent(first, last) if last > first else parent(0, 1)[:0]
+    before = min(max(-start, 0), stop - start)
+    return np.pad(rows, [(before, stop - start - before - len(rows))] + [(0, 0)] * (rows.ndim - 1))
+
+
+def _read_columns(rows: NDArray, start: int, stop: int) -> NDArray:
+    """Columns [start, stop) of the rows, columns outside of the rows are zeros"""
+    width = rows.shape[1]
+    cropped = rows[:, min(max(start, 0), width) : max(min(stop, width), 0)]
+    before = min(max(-start, 0), stop - start)
+    widths = [(0, 0), (before, stop - start - before - cropped.shape[1])] + [(0, 0)] * (rows.ndim - 2)
+    return np.pad(cropped, widths)
+
+
+def _direct_cost(kernel: NDArray) -> int:
+    # multiply-adds per output pixel of vectorized convolution, which runs low rank kernels as separable passes
+    return min(kernel.size, len(separate_kernel(kernel)[0]) * sum(kernel.shape))
+
+
+class _Stage:
+    """Single operation of the pipeline, which computes tile of its output rows from rows of the previous stage"""
+
+    def __init__(self, input_shape: tuple[int, int], shape: tuple[int, int]):
+        self.input_shape = input_shape
+        self.shape = shape
+
+    def rows(self, parent: RowsCallable, start: int, stop: int) -> NDArray:
+        """
+        :param parent: function returning rows of the previous stage output, with image axes in front
+        :param start: first output row
+        :param stop: row after the last output row
+        """
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__.lstrip('_')}({self.input_shape} -> {self.shape})"
+
+
+class _Window(_Stage):
+    """
+    Linear convolution stage, where output pixel (i, j) is F[start + step * (i, j)] of the full convolution F of the
+    input with the kernel, which is zero outside of the input. Convolution in any mode, with padding and step and block
+    mean downsampling are all windows, so they share the fusion rules. Window is complete, when it contains all
+    non-zero samples of F, then its output is exact zero-padded continuation of F, as for "full" mode.
+    """
+
+    def __init__(
+        self,
+        kernel: NDArray,
+        start: tuple[int, int],
+        step: int,
+        input_shape: tuple[int, int],
+        shape: tuple[int, int],
+        complete: bool,
+    ):
+        super().__init__(input_shape, shape)
+        self.kernel = kernel
+        self.start = start
+        self.step = step
+        self.complete = complete
+
+    @classmethod
+    def from_convolve(
+        cls, kernel: NDArray, step: int, padding: int, mode: str, input_shape: tuple[int, int]
+    ) -> "_Window":
+        # padding shifts the full convolution by `padding` samples, valid part starts at m - 1
+        start = tuple(-padding if mode == "full" else size - 1 - padding for size in kernel.shape)
+        shape = conv_output_shape(input_shape, kernel.shape, step, padding, mode)
+        return cls(kernel, start, step, input_shape, shape, complete=mode == "full")  # type: ignore
+
+    def reads_inside(self) -> bool:
+        """True, when the window reads only the samples of its input, without any zero padding"""
+        return all(
+            start - (kernel_size - 1) >= 0 and start + self.step * (count - 1) <= size - 1
+            for start, kernel_size, count, size in zip(self.start, self.kernel.shape, self.shape, self.input_shape)
+        )
+
+    def matrices(self) -> tuple[sparse.csr_matrix, sparse.csr_matrix] | None:
+        """Window with separable kernel as banded matrices of both axes, see `_Matrices`"""
+        columns, rows = separate_kernel(self.kernel)
+        if len(columns) > 1:
+            return None
+
+        weights = []
+        for kernel, start, count, size in zip((columns[0], rows[0]), self.start, self.shape, self.input_shape):
+            # output i is sum of input n with kernel element start + step * i - n
+            outputs, taps = np.meshgrid(np.arange(count), np.arange(len(kernel)), indexing="ij")
+            inputs = start + self.step * outputs - taps
+            valid = (inputs >= 0) & (inputs < size)
+            values = (kernel[taps[valid]], (inputs[valid], outputs[valid]))
+            weights.append(sparse.csr_matrix(values, shape=(size, count)))
+
+        return weights[0], weights[1]
+
+    def rows(self, parent: RowsCallable, start: int, stop: int) -> NDArray:
+        # only the output rows and columns kept by the step are computed, from input rows covering their windows
+        (kernel_height, kernel_width), step = self.kernel.shape, self.step
+        first = self.start[0] + step * start - (kernel_height - 1)
+        rows = _read_rows(parent, first, self.start[0] + step * (stop - 1) + 1, self.input_shape[0])
+        first = self.start[1] - (kernel_width - 1)
+        rows = _read_columns(rows, first, self.start[1] + step * (self.shape[1] - 1) + 1)
+        return convolve(rows, self.kernel, step, mode="valid", backend="vectorized", axes=(0, 1), dtype=rows.dtype)
+
+    def __repr__(self) -> str:
+        return f"Window(kernel={self.kernel.shape}, step={self.step}, {self.input_shape} -> {self.shape})"
+
+
+class _Matrices(_Stage):
+    """Separable linear stage, which multiplies rows and columns of the input with matrices, such as interpolation"""
+
+    def __init__(self, weights: tuple[NDArray | sparse.csr_matrix, NDArray | sparse.csr_matrix]):
+        super().__init__((weights[0].shape[0], weights[1].shape[0]), (weights[0].shape[1], weights[1].shape[1]))
+        self.weights = weights
+
+    def rows(self, parent: RowsCallable, start: int, stop: int) -> NDArray:
+        row_weights, column_weights = self.weights
+        # only input rows with non-zero weights for the output rows are read, banded matrices need a few of them
+        selected = row_weights[:, start:stop]
+        used = selected.getnnz(axis=1) if sparse.issparse(selected) else np.count_nonzero(selected, axis=1)
+        nonzero = np.flatnonzero(used)
+        first, last = (nonzero[0], nonzero[-1] + 1) if len(nonzero) else (0, 1)
+
+        rows = _apply_weights(parent(first, last), column_weights, axis=1)
+        return _apply_weights(rows, row_weights[first:last, start:stop], axis=0)
+
+    def __repr__(self) -> str:
+        kinds = ["sparse" if sparse.issparse(weights) else "dense" for weights in self.weights]
+        return f"Matrices({kinds[0]}, {kinds[1]}, {self.input_shape} -> {self.shape})"
+
+
+class _Reduce(_Stage):
+    """Block aggregation stage, such as downsampling with partial blocks or `np.max`, which is not fused"""
+
+    def __init__(self, reduce: Callable, kernel_size: int, boundary: Boundary, input_shape: tuple[int, int]):
+        shape = tuple(_output_size(size, kernel_size, boundary) for size in input_shape)
+        super().__init__(input_shape, shape)  # type: ignore
+        self.reduce = reduce
+        self.kernel_size = kernel_size
+
+    def rows(self, parent: RowsCallable, start: int, stop: int) -> NDArray:
+        rows = parent(start * self.kernel_size, min(stop * self.kernel_size, self.input_shape[0]))
+        return self.reduce(rows)
+
+
+class _Map(_Stage):
+    """Element-wise function applied to each tile"""
+
+    def __init__(self, func: Callable[[NDArray], NDArray], shape: tuple[int, int]):
+        super().__init__(shape, shape)
+        self.func = func
+
+    def rows(self, parent: RowsCallable, start: int, stop: int) -> NDArray:
+        return self.func(parent(start, stop))
+
+
+def _fuse_pair(first: _Stage, second: _Stage) -> _Stage | None:
+    """Single stage equivalent to two consecutive stages or None, when they can not be fused"""
+    match first, second:
+        case _Window(), _Window() if first.complete or second.reads_inside():
+            # second convolution reads every step-th sample of the first, which is convolution with kernel
+            # upsampled by the step (noble identity), so both are a single convolution with combined kernel
+            upsampled = np.zeros([(size - 1) * first.step + 1 for size in second.kernel.shape])
+            upsampled[:: first.step, :: first.step] = second.kernel
+            kernel = convolve(first.kernel, upsampled, mode="full", backend="vectorized")
+            start = tuple(first_start + first.step * start for first_start, start in zip(first.start, second.start))
+            fused = _Window(
+                kernel,
+                start,  # type: ignore
+                first.step * second.step,
+                first.input_shape,
+                second.shape,
+                first.complete and second.complete,
+            )
+            # combined kernel is larger, so it is used only when it does not cost more than two convolutions
+            separate = _direct_cost(first.kernel) * np.prod(first.shape) + _direct_cost(second.kernel) * np.prod(
+                second.shape
+            )
+            return fused if _direct_cost(kernel) * np.prod(second.shape) <= separate else None
+        case _Matrices(), _Matrices():
+            return _Matrices((first.weights[0] @ second.weights[0], first.weights[1] @ second.weights[1]))
+        case _Matrices(), _Window() if (weights := second.matrices()) is not None:
+            return _Matrices((first.weights[0] @ weights[0], first.weights[1] @ weights[1]))
+        case _Window(), _Matrices() if (weights := first.matrices()) is not None:
+            return _Matrices((weights[0] @ second.weights[0], weights[1] @ second.weights[1]))
+        case _:
+            return None
+
+
+def fuse_stages(stages: list[_Stage]) -> list[_Stage]:
+    """Fuses consecutive linear stages, for as long as any two of them can be fused"""
+    fused: list[_Stage] = []
+    for stage in stages:
+        fused.append(stage)
+        while len(fused) > 1 and (merged := _fuse_pair(fused[-2], fused[-1])) is not None:
+            fused[-2:] = [merged]
+
+    return fused
+
+
+def _evaluate_tile(image: NDArray, output: NDArray, tile: slice, rows: RowsCallable) -> None:
+    output[tile] = rows(tile.start, tile.stop)
+
+
+class Pipeline:
+    """
+    Lazy chain of image operations, which are recorded and evaluated only when `evaluate` is called.
+
+    Consecutive linear operations are fused before evaluation:
+        - consecutive convolutions are a single convolution with combined kernel, when it is not more expensive
+        - convolution followed by decimation, such as `downsample`, is a strided convolution, which computes only
+          the kept samples
+        - interpolation and separable convolutions (including `downsample`) next to it are multiplied into
+          a single pair of row and column matrices, so interpolation followed by downsampling collapses
+
+    Output is evaluated in tiles of rows, each stage computes only the rows needed for the tile of the next one,
+    so intermediate results never exist at full resolution.
+
+    Example:
+        >>> pipeline = Pipeline(frames, axes=(1, 2)).downsample(2).convolve(kernel, mode="valid")
+        >>> result = pipeline.interpolate(keys_kernel, ratio=2).evaluate()
+    """
+
+    def __init__(self, image: NDArray, axes: tuple[int, int] = (0, 1), dtype: DTypeLike = None):
+        """
+        :param image: greyscale image or batch of images, such as (N, H, W, C), can be memory-mapped
+        :param axes: height and width axes of the image, all remaining axes are processed independently
+        :param dtype: type of the computation, see `src.buffers.working_dtype`
+        """
+        self.image = image
+        self.axes = axes
+        self.dtype = working_dtype(image, dtype=dtype)
+        self.operations: list[_Stage] = []
+
+    @property
+    def image_shape(self) -> tuple[int, int]:
+        """Height and width of the output of recorded operations"""
+        if self.operations:
+            return self.operations[-1].shape
+        return self.image.shape[self.axes[0]], self.image.shape[self.axes[1]]
+
+    @property
+    def stages(self) -> list[_Stage]:
+        """Stages, which are evaluated, after fusion of recorded operations"""
+        return fuse_stages(self.operations)
+
+    def _extend(self, stage: _Stage) -> "Pipeline":
+        pipeline = Pipeline(self.image, self.axes, self.dtype)
+        pipeline.operations = self.operations + [stage]
+        return pipeline
+
+    def convolve(
+        self, kernel: NDArray, step: int = 1, padding: int = 0, mode: Literal["full", "valid"] = "full"
+    ) -> "Pipeline":
+        """Records 2D convolution, see `src.conv.convolve`"""
+        if np.ndim(kernel) != 2:
+            raise ValueError("Pipeline supports only 2D kernels!")
+
+        kernel = np.asarray(kernel, dtype=np.result_type(kernel, np.float64))
+        return self._extend(_Window.from_convolve(kernel, step, padding, mode, self.image_shape))
+
+    def downsample(self, kernel_size: int = 2, boundary: Boundary = "crop") -> "Pipeline":
+        """Records block mean downsampling, see `src.downsampling.downsample`"""
+        if boundary == "crop":
+            # mean of non-overlapping blocks is valid convolution with box kernel, which has step of the block size
+            box = np.full((kernel_size, kernel_size), 1 / kernel_size**2)
+            return self._extend(_Window.from_convolve(box, kernel_size, 0, "valid", self.image_shape))
+
+        reduce = partial(downsample, kernel_size=kernel_size, boundary=boundary, dtype=self.dtype)
+        return self._extend(_Reduce(reduce, kernel_size, boundary, self.image_shape))
+
+    def nonlinear_downsample(
+        self, aggregate: Callable, kernel_size: int = 2, boundary: Boundary = "crop"
+    ) -> "Pipeline":
+        """Records block aggregation, such as `np.max`, see `src.downsampling.nonlinear_downsample`"""
+        reduce = partial(nonlinear_downsample, aggregate=aggregate, kernel_size=kernel_size, boundary=boundary)
+        return self._extend(_Reduce(reduce, kernel_size, boundary, self.image_shape))
+
+    def interpolate(self, kernel: KernelCallable, ratio: int) -> "Pipeline":
+        """Records separable kernel interpolation, see `src.interpolate.core.image_interpolate1d`"""
+        height, width = self.image_shape
+        weights = _axis_weights(height, ratio, kernel, dtype=self.dtype), _axis_weights(
+            width, ratio, kernel, dtype=self.dtype
+        )
+        return self._extend(_Matrices(weights))
+
+    def apply(self, func: Callable[[NDArray], NDArray]) -> "Pipeline":
+        """Records element-wise function, such as `np.sqrt`, which is applied to each tile"""
+        return self._extend(_Map(func, self.image_shape))
+
+    def evaluate(self, out: NDArray | None = None, tile_rows: int = TILE_ROWS, workers: int | None = None) -> NDArray:
+        """
+        Evaluates fused stages tile by tile
+
+        :param out: output array, such as `np.memmap`, tiles are written directly into it
+        :param tile_rows: number of output rows of a single tile
+        :param workers: when given, tiles are evaluated in parallel threads, see `src.parallel.run_tiles`
+
+        :return: result of all recorded operations
+        """
+        moved = np.moveaxis(self.image, self.axes, (0, 1))
+        shape = (*self.image_shape, *moved.shape[2:])
+        output = output_array(None if out is None else np.moveaxis(out, self.axes, (0, 1)), shape, self.dtype)
+
+        def rows(start: int, stop: int) -> NDArray:
+            return np.asarray(moved[start:stop], dtype=self.dtype)
+
+        for stage in self.stages:
+            rows = partial(stage.rows, rows)
+
+        tiles = row_tiles(shape[0], tile_rows)
+        if workers is None:
+            for tile in tiles:
+                _evaluate_tile(moved, output, tile, rows)
+        else:
+            run_tiles(_evaluate_tile, moved, output, tiles, workers, "thread", rows=rows)
+
+        return out if out is not None else np.moveaxis(output, (0, 1), self.axes)
@@ -0,0 +1,210 @@
+from functools import lru_cache
+from typing import Literal
+
+import numpy as np
+from numpy.typing import NDArray
+
+from src.conv import convolve
+from src.parallel import TILE_ROWS, row_tiles
+
+Filter = Literal["mean", "gaussian"]
+Inverse = Literal["exact", "asymptotic", "algebraic"]
+
+# expected values of transformed Poisson variables are tabulated for means up to this value,
+# for larger means the bias of the asymptotic inverse (y / 2) ** 2 - 1/8 is below 1e-6
+_TABLE_MAX_MEAN = 200.0
+_TABLE_SIZE = 4096
+
+
+def anscombe(counts: NDArray, out: NDArray | None = None) -> NDArray:
+    """
+    Anscombe transform 2 * sqrt(x + 3/8), which turns Poisson noise into approximately Gaussian noise of unit variance
+
+    :param counts: photon counts, such as raw frames, can be integer
+    :param out: array to store the result, can be the same as `counts` to transform floating point arrays in place
+    """
+    counts = np.asarray(counts)
+    out = np.add(counts, 3 / 8, out=out, dtype=out.dtype if out is not None else np.result_type(counts, 1.0))
+    np.sqrt(out, out=out)
+    return np.multiply(out, 2, out=out)
+
+
+def _expected_anscombe(means: NDArray) -> NDArray:
+    # E[2 * sqrt(z + 3/8)] for z ~ Poisson(mean), summed over counts covering all of the probability mass
+    counts = np.arange(int(means.max() + 12 * np.sqrt(means.max()) + 64))
+    log_factorials = np.concatenate([[0.0], np.cumsum(np.log(counts[1:]))])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_probabilities = counts * np.log(means[:, np.newaxis]) - means[:, np.newaxis] - log_factorials
+    # for zero mean, the only possible count is zero
+    probabilities = np.where(means[:, np.newaxis] > 0, np.exp(log_probabilities), counts == 0)
+    return probabilities @ (2 * np.sqrt(counts + 3 / 8))
+
+
+@lru_cache(maxsize=1)
+def _exact_unbiased_table() -> tuple[NDArray, NDArray]:
+    # means are spaced quadratically, since the expected value changes fastest for small means
+    means = np.linspace(0, np.sqrt(_TABLE_MAX_MEAN), _TABLE_SIZE) ** 2
+    expected = _expected_anscombe(means)
+    expected.flags.writeable, means.flags.writeable = False, False
+    return expected, means
+
+
+def _squared_inverse(transformed: NDArray, offset: float, out: NDArray) -> NDArray:
+    # (y / 2) ** 2 - offset
+    np.multiply(transformed, 1 / 2, out=out)
+    np.multiply(out, out, out=out)
+    return np.subtract(out, offset, out=out)
+
+
+def inverse_anscombe(transformed: NDArray, method: Inverse = "exact", out: NDArray | None = None) -> NDArray:
+    """
+    Inverse Anscombe transform, which returns estimated Poisson means from denoised transformed values
+
+    :param transformed: denoised values of the Anscombe transform
+    :param method: "exact", "asymptotic" or "algebraic" inverse:
+                   "exact" is the exact unbiased inverse, which maps expected value of the transform to Poisson mean,
+                   it is needed for low counts, where the other inverses are biased
+                   "asymptotic" is (y / 2) ** 2 - 1/8, which is unbiased only for large counts
+                   "algebraic" is (y / 2) ** 2 - 3/8, the inverse of the transform itself
+    :param out: array to store the result, can be the same as `transformed` to invert floating point arrays in place
+    """
+    transformed = np.asarray(transformed)
+    if out is None:
+        out = np.empty(transformed.shape, dtype=np.result_type(transformed, 1.0))
+
+    match method:
+        case "exact":
+            expected, means = _exact_unbiased_table()
+            # values below expected transform of zero mean are mapped to zero
+            tabulated = transformed <= expected[-1]
+            interpolated = np.interp(transformed[tabulated], expected, means)
+            _squared_inverse(transformed, 1 / 8, out=out)
+            out[tabulated] = interpolated
+            return out
+        case "asymptotic":
+            return _squared_inverse(transformed, 1 / 8, out=out)
+        case "algebraic":
+            return _squared_inverse(transformed, 3 / 8, out=out)
+        case _:
+            raise ValueError(f"Inverse {method} not supported!")
+
+
+def filter_kernel(kind: Filter, size: int, sigma: float | None = None) -> NDArray:
+    """
+    Creates normalized 2D denoising kernel
+
+    :param kind: "mean" for box filter or "gaussian"
+    :param size: odd size of the kernel
+    :param sigma: standard deviation of the Gaussian kernel, defaults to a quarter of the kernel size
+    """
+    if size < 1 or size % 2 == 0:
+        raise ValueError(f"Kernel size must be odd and positive, got {size}!")
+
+    match kind:
+        case "mean":
+            weights = np.ones(size)
+        case "gaussian":
+            sigma = size / 4 if sigma is None else sigma
+            weights = np.exp(-0.5 * (np.arange(size) - size // 2) ** 2 / sigma**2)
+        case _:
+            raise ValueError(f"Filter {kind} not supported!")
+
+    weights /= weights.sum()
+    return np.outer(weights, weights)
+
+
+def _reflect(indices: NDArray, size: int) -> NDArray:
+    # reflection at the edges, which does not repeat the edge element, same as np.pad with mode="reflect"
+    period = 2 * (size - 1)
+    indices = np.abs(indices) % period
+    return np.where(indices < size, indices, period - indices)
+
+
+def denoise_poisson(
+    counts: NDArray,
+    kind: Filter = "gaussian",
+    size: int = 5,
+    sigma: float | None = None,
+    power: float = 1.0,
+    inverse: Inverse = "exact",
+    axes: tuple[int, int] = (-2, -1),
+    out: NDArray | None = None,
+    tile_rows: int = TILE_ROWS,
+) -> NDArray:
+    """
+    Removes Poisson noise by filtering in the Anscombe transformed domain, where the noise is approximately Gaussian.
+    Forward transform, filter and inverse transform are fused and applied to tiles of rows of all frames at once,
+    so memory used besides the output is a workspace of (tile_rows + size - 1) rows of all frames, which does not
+    depend on the height of the images.
+
+    Images are reflected at the edges. Transformed rows of each tile are carried as the halo of the next one, before
+    they are overwritten, so the output can be the same array as the input, which denoises floating point batches
+    in place.
+
+    :param counts: photon counts, such as (N, H, W) batch of low-light video frames, can be integer
+    :param kind: "mean" or "gaussian" weights of the filter, see `filter_kernel`
+    :param size: odd size of the filter kernel
+    :param sigma: standard deviation of the Gaussian kernel
+    :param power: exponent of weighted generalized mean of transformed values, 1 is linear filter,
+                  0 is geometric mean and -1 harmonic mean, which are less sensitive to bright outliers
+    :param inverse: inverse Anscombe transform, see `inverse_anscombe`
+    :param axes: axes of rows and columns of the images, all other axes are batch axes, such as frames or channels
+    :param out: array to store the result, defaults to new array of the type of `counts` or float64 for integers
+    :param tile_rows: number of output rows computed at once
+
+    :return: estimated Poisson means
+    """
+    counts = np.asarray(counts)
+    if out is None:
+        out = np.empty(counts.shape, dtype=counts.dtype if np.issubdtype(counts.dtype, np.floating) else np.float64)
+
+    if out.shape != counts.shape:
+        raise ValueError(f"Output must have shape {counts.shape}, got {out.shape}!")
+
+    kernel = filter_kernel(kind, size, sigma).astype(out.dtype)
+    radius = size // 2
+    # rows and columns are moved to the front, views share memory with counts and out
+    source, target = np.moveaxis(counts, axes, (0, 1)), np.moveaxis(out, axes, (0, 1))
+    height, width = source.shape[:2]
+    if radius >= min(height, width):
+        raise ValueError(f"Kernel of size {size} is too large for images of shape {(height, width)}!")
+
+    columns = _reflect(np.arange(-radius, width + radius), width)
+    workspace = np.empty((tile_rows + 2 * radius, width + 2 * radius, *source.shape[2:]), dtype=out.dtype)
+    previous = 0
+
+    for tile in row_tiles(height, tile_rows):
+        # row i of the padded tile is image row tile.start - radius + i, halo rows of the previous tile are reused
+        n_rows = tile.stop - tile.start + 2 * radius
+        carried = 0 if tile.start == 0 else 2 * radius
+        workspace[:carried] = workspace[previous - carried : previous]
+        rows = _reflect(np.arange(tile.start - radius + carried, tile.stop + radius), height)
+
+        # bottom reflection of short last tile can reach rows above the tile, which are already overwritten in place,
+        # their transformed values are taken from the carried halo instead
+        reused = rows < tile.start
+        padded = workspace[:n_rows]
+        anscombe(source[np.where(reused, tile.start, rows)[:, np.newaxis], columns], out=padded[carried:])
+        match power:
+            case 1:
+                pass
+            case 0:
+                np.log(padded[carried:], out=padded[carried:])
+            case _:
+                np.power(padded[carried:], power, out=padded[carried:])
+
+        padded[carried:][reused] = padded[rows[reused] - (tile.start - radius)]
+
+        filtered = convolve(padded, kernel, mode="valid", backend="vectorized", axes=(0, 1))
+        match power:
+            case 1:
+                pass
+            case 0:
+                np.exp(filtered, out=filtered)
+            case _:
+                np.power(filtered, 1 / power, out=filtered)
+
+        target[tile] = inverse_anscombe(filtered, inverse, out=filtered)
+        previous = n_rows
+
+    return out
@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, NamedTuple
+
+import numpy as np
+
+
+class Event(NamedTuple):
+    """Single recorded call of an instrumented function, times are in nanoseconds of `time.perf_counter_ns`"""
+
+    name: str
+    start: int
+    duration: int
+    self_duration: int  # duration without instrumented functions called inside
+    thread: int
+    depth: int
+    shapes: tuple[tuple[int, ...], ...]  # shapes of array arguments
+    allocated: int | None  # peak bytes allocated during the call, when memory is tracked
+
+
+class Registry:
+    """
+    In-process registry of calls of instrumented functions, such as `convolve` or `downsample`.
+
+    Recording is disabled by default, when disabled instrumented functions only check a single flag before calling
+    the original function. When enabled, each call appends an event with its wall time, time spent outside of nested
+    instrumented calls, shapes of array arguments and optionally bytes allocated, measured with `tracemalloc`.
+    Memory tracking slows numpy allocations down, so it is enabled separately. Allocations are traced for the whole
+    process, so with multiple threads they are attributed to all calls running at the same time.
+
+    Calls in worker processes (`executor="process"`) are recorded in registries of the workers and are not collected.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.events: list[Event] = []
+        self.origin = time.perf_counter_ns()
+        self._local = threading.local()
+        self._started_tracing = False
+
+    def enable(self, memory: bool = False) -> None:
+        """
+        :param memory: when True, bytes allocated by each call are recorded with `tracemalloc`
+        """
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def clear(self) -> None:
+        self.events = []
+        self.origin = time.perf_counter_ns()
+
+    def _frames(self) -> list[list[int]]:
+        # stack of calls running in the current thread, each frame is [children duration, start memory, peak memory]
+        if not hasattr(self._local, "frames"):
+            self._local.frames = []
+        return self._local.frames
+
+    def call(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        """Calls the function and records the event"""
+        frames = self._frames()
+        shapes = tuple(np.shape(value) for value in (*args, *kwargs.values()) if isinstance(value, np.ndarray))
+        memory = self.memory and tracemalloc.is_tracing()
+        frame = [0, 0, 0]
+        if memory:
+            # peak is reset for each call, so peaks reached so far are kept in frames of the calls running around it
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in frames:
+                outer[2] = max(outer[2], peak)
+            tracemalloc.reset_peak()
+            frame[1:] = current, current
+
+        frames.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter_ns() - start
+            frames.pop()
+            allocated = None
+            if memory:
+                peak = max(frame[2], tracemalloc.get_traced_memory()[1])
+                allocated = peak - frame[1]
+                for outer in frames:
+                    outer[2] = max(outer[2], peak)
+            if frames:
+                frames[-1][0] += duration
+
+            event = Event(
+                name, start, duration, duration - frame[0], threading.get_ident(), len(frames), shapes, allocated
+            )
+            self.events.append(event)  # appending to a list is atomic, so events of all threads are kept
+
+    def summary(self) -> dict[str, dict]:
+        """Statistics of each instrumented function, sorted by total time spent in the function itself"""
+        grouped = defaultdict(list)
+        for event in self.events:
+            grouped[event.name].append(event)
+
+        summary = {}
+        for name, events in grouped.items():
+            durations = np.array([event.duration for event in events]) / 1e9
+            allocated = [event.allocated for event in events if event.allocated is not None]
+            summary[name] = {
+                "calls": len(events),
+                "total_seconds": float(durations.sum()),
+                "self_seconds": sum(event.self_duration for event in events) / 1e9,
+                "mean_seconds": float(durations.mean()),
+                "max_seconds": float(durations.max()),
+                "allocated_bytes": sum(allocated) if allocated else None,
+                "max_allocated_bytes": max(allocated) if allocated else None,
+                "shapes": {str(shapes): count for shapes, count in Counter(e.shapes for e in events).most_common(5)},
+            }
+
+        return dict(sorted(summary.items(), key=lambda item: item[1]["self_seconds"], reverse=True))
+
+    def report(self) -> str:
+        """Summary formatted as a table"""
+        lines = [f"{'function':<40} {'calls':>8} {'total':>12} {'self':>12} {'allocated':>12}"]
+        for name, stats in self.summary().items():
+            allocated = "-" if stats["allocated_bytes"] is None else f"{stats['allocated_bytes'] / 2**20:.2f}MB"
+            lines.append(
+                f"{name:<40} {stats['calls']:>8} {stats['total_seconds'] * 1000:>10.2f}ms "
+                f"{stats['self_seconds'] * 1000:>10.2f}ms {allocated:>12}"
+            )
+
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        """Summary and all events as JSON serializable dictionary, event times are in seconds since `clear`"""
+        events = [
+            {
+                "name": event.name,
+                "start": (event.start - self.origin) / 1e9,
+                "duration": event.duration / 1e9,
+                "self_duration": event.self_duration / 1e9,
+                "thread": event.thread,
+                "depth": event.depth,
+                "shapes": [list(shape) for shape in event.shapes],
+                "allocated": event.allocated,
+            }
+            for event in self.events
+        ]
+        return {"summary": self.summary(), "events": events}
+
+    def to_chrome_trace(self) -> dict:
+        """Events in Chrome trace format, which can be opened in chrome://tracing or https://ui.perfetto.dev"""
+        pid = os.getpid()
+        events = [
+            {
+                "name": event.name,
+                "cat": event.name.split(".")[0],
+                "ph": "X",  # complete event with duration
+                "ts": (event.start - self.origin) / 1e3,  # microseconds
+                "dur": event.duration / 1e3,
+                "pid": pid,
+                "tid": event.thread,
+                "args": {"shapes": [list(shape) for shape in event.shapes], "allocated": event.allocated},
+            }
+            for event in self.events
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_json(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.to_json(), file, indent=2)
+
+    def save_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+
+
+REGISTRY = Registry()
+
+
+def instrument(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording calls of the function in `REGISTRY`, when it is enabled
+
+    :param name: name of the function in the records, such as "conv.convolve", part before the dot is its category
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return func(*args, **kwargs)
+            return REGISTRY.call(name, func, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profile(memory: bool = False) -> Iterator[Registry]:
+    """
+    Records calls of all instrumented functions inside the context, previous records are cleared
+
+    Example:
+        >>> with profile(memory=True) as registry:
+        >>>     image_interpolate1d(image, keys_kernel, ratio=2)
+        >>> print(registry.report())
+        >>> registry.save_chrome_trace("trace.json")
+    """
+    REGISTRY.clear()
+    REGISTRY.enable(memory)
+    try:
+        yield REGISTRY
+    finally:
+        REGISTRY.disable()
@@ -0,0 +1,122 @@
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+from src.buffers import working_dtype
+from src.conv import conv_output_shape, convolve, separate_kernel
+from src.parallel import read_rows
+
+
+def open_raw(path: str | Path, shape: tuple[int, ...], dtype: DTypeLike, mode: str = "r") -> np.memmap:
+    """
+    Opens raw binary file (without header) as memory-mapped array
+
+    :param path: path to the file
+    :param shape: shape of the array stored in the file
+    :param dtype: type of the array elements
+    :param mode: numpy memmap mode, "r" for reading, "w+" creates new file and "r+" writes into existing one
+    """
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def _rows_per_tile(
+    signal_shape: tuple[int, ...],
+    output_shape: tuple[int, ...],
+    kernel: NDArray,
+    step: int,
+    tile_budget: int,
+    dtype: DTypeLike = np.float64,
+) -> int:
+    # tile of R output rows reads (R - 1) * s + m input rows of zero-padded signal, which is then convolved in memory
+    # peak memory is dominated by the input tile, intermediate column pass of separable kernels and the output tile
+    padded_width = int(
+        np.prod([size + 2 * (kernel_size - 1) for size, kernel_size in zip(signal_shape[1:], kernel.shape[1:])])
+    )
+    output_width = int(np.prod(output_shape[1:]))
+    rank = len(separate_kernel(kernel)[0]) if kernel.ndim == 2 else 0
+    itemsize = np.dtype(dtype).itemsize
+
+    halo_bytes = (kernel.shape[0] - 1) * padded_width * itemsize
+    row_bytes = (step * padded_width + rank * padded_width + output_width) * itemsize
+    rows = (tile_budget - halo_bytes) // row_bytes
+
+    if rows < 1:
+        raise ValueError(
+            f"Tile budget of {tile_budget} bytes is too small, at least {halo_bytes + row_bytes} required!"
+        )
+
+    return int(min(rows, output_shape[0]))
+
+
+def tiled_convolve(
+    signal: NDArray | str | Path,
+    kernel: NDArray,
+    output: NDArray | str | Path,
+    step: int = 1,
+    padding: int = 0,
+    mode: Literal["full", "valid"] = "full",
+    backend: Literal["loop", "vectorized"] = "vectorized",
+    tile_budget: int = 2**27,
+    shape: tuple[int, ...] | None = None,
+    dtype: DTypeLike = None,
+) -> NDArray:
+    """
+    Out-of-core version of `src.conv.convolve` for 1D or 2D signals, which do not fit in memory.
+
+    Signal is processed in tiles of consecutive output rows, each tile reads only the input rows it needs, including
+    halo of (m - 1) rows overlapping with the neighbouring tiles, so padded copy of the signal is never created.
+    Each tile is computed with direct in-memory convolution, so the result is bit-identical to `convolve` with the
+    same backend. Default backend is "vectorized", unlike in `convolve`, so results of both functions with default
+    arguments differ by rounding errors.
+
+    :param signal: array, such as `np.memmap`, or path to raw binary file, in which case `shape` and `dtype` are
+                   required
+    :param kernel: kernel to convolve with the signal, must have the same dimensionality as the signal
+    :param output: array of the output shape, such as `np.memmap`, or path to raw binary file, which will be created
+                   output has the working type of the signal, float32 for single precision signals and float64
+                   otherwise, same as `convolve`, see `src.buffers.working_dtype`
+    :param step: step size for the convolution
+    :param padding: input padding for the convolution, applied to signal on both sides
+    :param mode: "full" or "valid" mode for the convolution
+    :param backend: "loop" or "vectorized" implementation used for each tile
+    :param tile_budget: approximate peak memory in bytes used for a single tile
+    :param shape: shape of the signal, only used when signal is a path
+    :param dtype: type of the signal, only used when signal is a path
+
+    :return: output array, memory-mapped when path was given
+    """
+    if isinstance(signal, (str, Path)):
+        if shape is None or dtype is None:
+            raise ValueError("Shape and dtype are required to read signal from raw file!")
+        signal = open_raw(signal, shape, dtype)
+
+    if signal.ndim != kernel.ndim or signal.ndim > 2:
+        raise ValueError("Only 1D and 2D signals with kernels of the same dimensionality are supported!")
+
+    output_shape = conv_output_shape(signal.shape, kernel.shape, step, padding, mode)
+    work_dtype = working_dtype(signal)
+    if isinstance(output, (str, Path)):
+        output = open_raw(output, output_shape, work_dtype, mode="w+")
+
+    if output.shape != output_shape:
+        raise ValueError(f"Output must have shape {output_shape}, got {output.shape}!")
+
+    # for full mode, zero-padding with (m - 1) elements is applied explicitly, so each tile is a valid convolution
+    halo = [kernel_size - 1 if mode == "full" else 0 for kernel_size in kernel.shape]
+    leading = padding + halo[0]
+    widths = [(padding + size, padding + size) for size in halo[1:]]
+    rows_per_tile = _rows_per_tile(signal.shape, output_shape, kernel, step, tile_budget, work_dtype)
+
+    for first_row in range(0, output_shape[0], rows_per_tile):
+        last_row = min(first_row + rows_per_tile, output_shape[0])
+        # output row r is computed from padded input rows [r * s, r * s + m)
+        tile = read_rows(signal, first_row * step, (last_row - 1) * step + kernel.shape[0], leading)
+        tile = np.pad(tile.astype(work_dtype, copy=False), [(0, 0)] + widths)
+        output[first_row:last_row] = convolve(tile, kernel, step=step, mode="valid", backend=backend, dtype=work_dtype)
+
+    if isinstance(output, np.memmap):
+        output.flush()
+
+    return output
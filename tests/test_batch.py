@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from skimage import io
+
+from src.batch import find_images, parse_operation, prefetch, process_batch, process_files
+from src.conv import convolve
+from src.downsampling import downsample
+from src.fourier import WaveletTransform2D
+
+
+def test_parse_operation():
+    assert parse_operation("downsample:2").kwargs == {"kernel_size": 2}
+    assert parse_operation("convolve:gaussian5").kwargs["padding"] == 2
+    assert isinstance(parse_operation("compress:wavelet:0.9:haar:2").kwargs["transform"], WaveletTransform2D)
+
+    for spec in ["blur:3", "interpolate:2:cubic", "compress:wavelet:0.9:haar"]:
+        with pytest.raises(ValueError):
+            parse_operation(spec)
+
+
+def test_process_batch_same_as_operations():
+    batch = np.random.default_rng(0).random((3, 20, 24, 3)).astype(np.float32)
+    operations = [parse_operation("convolve:sharpen"), parse_operation("downsample:2")]
+
+    sharpened = convolve(
+        batch, operations[0].kwargs["kernel"], padding=1, mode="valid", backend="vectorized", axes=(1, 2)
+    )
+    result = process_batch(batch, operations)
+    assert result.dtype == np.float32
+    assert np.allclose(result, downsample(sharpened, 2, axes=(1, 2)), atol=1e-5)
+
+
+def test_prefetch_keeps_order():
+    with ThreadPoolExecutor(3) as executor:
+        assert list(prefetch(executor, lambda x: x * 2, range(10), size=2)) == list(range(0, 20, 2))
+
+
+def test_process_files(tmp_path):
+    rng = np.random.default_rng(0)
+    for index, shape in enumerate([(16, 16, 3), (16, 16, 3), (12, 10), (16, 16, 3)]):
+        io.imsave(tmp_path / f"{index}.png", rng.integers(0, 256, shape, dtype=np.uint8), check_contrast=False)
+
+    paths = find_images([str(tmp_path)])
+    operations = [parse_operation("interpolate:2:linear"), parse_operation("compress:fourier:0.5")]
+    report = process_files(paths, str(tmp_path / "out"), operations, batch_size=2, workers=2, prefetch_size=1)
+
+    assert report.images == 4 and report.images_per_second > 0
+    assert io.imread(tmp_path / "out" / "0.png").shape == (32, 32, 3)
+    assert io.imread(tmp_path / "out" / "2.png").shape == (24, 20)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from benchmarks.suite import Case, all_cases, compare, run_case
+
+
+def test_run_case_scaling_curve():
+    case = Case("sum", lambda size: ((lambda: np.ones(size).sum()), size), (1000, 4000))
+    result = run_case(case, repeats=1)
+
+    assert list(result["curve"]) == ["1000", "4000"]
+    assert result["curve"]["4000"]["peak_bytes"] >= 4000 * 8
+    assert result["exponent"] is not None
+
+
+def test_compare_reports_only_regressions_beyond_threshold():
+    baseline = {
+        "conv": {"curve": {"64": {"seconds": 1.0, "peak_bytes": 100}, "128": {"seconds": 2.0, "peak_bytes": 200}}}
+    }
+    results = {
+        "conv": {"curve": {"64": {"seconds": 1.2, "peak_bytes": 100}, "128": {"seconds": 3.0, "peak_bytes": 400}}},
+        "new": {"curve": {"64": {"seconds": 9.0, "peak_bytes": 900}}},
+    }
+
+    regressions = compare(results, baseline, threshold=0.25, memory_threshold=0.1)
+    assert len(regressions) == 2
+    assert all(regression.startswith("conv size=128") for regression in regressions)
+
+
+def test_all_convolve_backends_and_methods_are_measured():
+    names = [case.name for case in all_cases()]
+    assert any(name.startswith("convolve/loop/") for name in names)
+    assert any(name.startswith("convolve/vectorized/") for name in names)
+    assert any(name.startswith("convolve/overlap-add/") for name in names)
+    assert len(names) == len(set(names))
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from src.buffers import Workspace, output_array, working_dtype
+
+
+@pytest.mark.parametrize(
+    "dtype, expected",
+    [
+        (np.uint8, np.float64),
+        (np.uint16, np.float64),
+        (np.float16, np.float32),
+        (np.float32, np.float32),
+        (np.float64, np.float64),
+        (np.complex64, np.complex64),
+        (np.complex128, np.complex128),
+    ],
+)
+def test_working_dtype(dtype, expected):
+    assert working_dtype(np.zeros(3, dtype=dtype)) == expected
+    assert working_dtype(np.zeros(3, dtype=dtype), dtype=np.float64) == np.float64
+
+
+def test_output_array():
+    out = np.empty((2, 3), dtype=np.float32)
+    assert output_array(out, (2, 3), np.float64) is out
+    assert output_array(None, (4,), np.float32).dtype == np.float32
+
+    with pytest.raises(ValueError):
+        output_array(out, (3, 2), np.float32)
+
+
+def test_workspace():
+    workspace = Workspace()
+    first = workspace.get("padded", (4, 5), np.float32)
+    smaller = workspace.get("padded", (3, 3), np.float32)
+
+    assert smaller.shape == (3, 3)
+    assert np.shares_memory(first, smaller)
+    assert workspace.nbytes == 4 * 5 * 4
+
+    assert not np.shares_memory(first, workspace.get("padded", (5, 5), np.float32))
+    assert workspace.get("padded", (5, 5), np.float64).dtype == np.float64
+    assert workspace.get("other", (2,), np.float32).shape == (2,)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from src.codec import (
+    CompressedReader,
+    CompressedWriter,
+    decode_image,
+    decode_varint,
+    encode_image,
+    encode_varint,
+    read_images,
+    write_images,
+)
+from src.fourier import FourierTransform2D, WaveletTransform2D, compress_and_decompress
+
+TRANSFORMS = [FourierTransform2D(), FourierTransform2D(real=True), WaveletTransform2D("db2", 2)]
+
+
+def test_varint():
+    values = np.asarray([0, 1, 127, 128, 16383, 16384, 2**32 + 1, 2**64 - 1], dtype=np.uint64)
+    encoded = encode_varint(values)
+
+    assert len(encoded) == 1 + 1 + 1 + 2 + 2 + 3 + 5 + 10
+    assert np.array_equal(values, decode_varint(np.frombuffer(encoded, np.uint8)))
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS)
+@pytest.mark.parametrize("compression", [0.2, 0.95])
+@pytest.mark.parametrize("shape", [(32, 32), (21, 34)])
+def test_encode_image(transform, compression, shape):
+    image = np.random.rand(*shape)
+    record = encode_image(image, transform, compression, bits=32)
+
+    expected = compress_and_decompress(image, transform, compression)
+    assert np.allclose(expected, decode_image(record, transform, bits=32), atol=1e-6)
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS)
+def test_encoded_size(transform):
+    image = np.random.rand(64, 64)
+    assert len(encode_image(image, transform, 0.9, bits=16)) < image.nbytes / 10
+
+
+@pytest.mark.parametrize("bits", [8, 16])
+def test_quantization_error(bits):
+    image = np.random.rand(32, 32)
+    transform = WaveletTransform2D("db1", 1)
+    decoded = decode_image(encode_image(image, transform, 0.5, bits=bits), transform, bits=bits)
+
+    # error of each coefficient is at most half of the quantization step, which is relative to the largest coefficient
+    expected = compress_and_decompress(image, transform, 0.5)
+    assert np.max(np.abs(expected - decoded)) < 4 * 2.0 ** (1 - bits)
+
+
+@pytest.mark.parametrize("transform", TRANSFORMS)
+def test_compressed_archive(tmp_path, transform):
+    path = tmp_path / "images.mvcz"
+    images = np.random.rand(5, 24, 20)
+    write_images(path, images, transform, compression=0.5, bits=32)
+
+    expected = [compress_and_decompress(image, transform, 0.5) for image in images]
+    reader = CompressedReader(path)
+    assert len(reader) == 5
+    assert reader.description["transform"]["name"] in ("fourier", "wavelet")
+    assert np.allclose(expected[3], reader[3], atol=1e-6)
+    assert np.allclose(expected, list(read_images(path)), atol=1e-6)
+
+
+def test_unfinished_archive(tmp_path):
+    path = tmp_path / "images.mvcz"
+    writer = CompressedWriter(path, FourierTransform2D(), compression=0.5)
+    writer.write(np.random.rand(8, 8))
+    writer.file.flush()
+
+    with pytest.raises(ValueError):
+        CompressedReader(path)
+
+    writer.close()
+    assert len(CompressedReader(path)) == 1
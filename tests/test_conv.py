@@ -1,7 +1,9 @@
 import numpy as np
 import pytest
+from scipy.signal import convolve2d
 
-from src.conv import convolve
+from src.buffers import Workspace
+from src.conv import convolve, separate_kernel
 
 
 @pytest.mark.repeat(10)  # repeat the test 10 times
@@ -11,3 +13,157 @@ def test_conv(mode):
     k = np.random.randn(3)
 
     assert np.allclose(np.convolve(x, k, mode=mode), convolve(x, k, mode=mode))  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "backend, method", [("loop", "direct"), ("vectorized", "direct"), ("loop", "fft"), ("loop", "overlap-add")]
+)
+@pytest.mark.parametrize("mode", ["full", "valid"])
+@pytest.mark.parametrize("step", [1, 2, 3])
+@pytest.mark.parametrize("padding", [0, 2])
+@pytest.mark.parametrize("kernel_size", [1, 3, 4])
+@pytest.mark.parametrize("complex_input", ["none", "signal", "kernel"])
+def test_conv1d_equivalence(backend, method, mode, step, padding, kernel_size, complex_input):
+    x = np.random.randn(17) + (1j * np.random.randn(17) if complex_input == "signal" else 0)
+    k = np.random.randn(kernel_size) + (1j * np.random.randn(kernel_size) if complex_input == "kernel" else 0)
+
+    expected = np.convolve(np.pad(x, padding), k, mode=mode)[::step]
+    result = convolve(x, k, step=step, padding=padding, mode=mode, backend=backend, method=method)
+    assert np.allclose(expected, result)
+
+
+@pytest.mark.parametrize("backend, method", [("loop", "direct"), ("vectorized", "direct"), ("loop", "fft")])
+@pytest.mark.parametrize("mode", ["full", "valid"])
+@pytest.mark.parametrize("step", [1, 2, 3])
+@pytest.mark.parametrize("padding", [0, 2])
+@pytest.mark.parametrize("kernel_shape", [(1, 1), (3, 3), (2, 5)])
+def test_conv2d_equivalence(backend, method, mode, step, padding, kernel_shape):
+    x = np.random.randn(11, 13)
+    k = np.random.randn(*kernel_shape)
+
+    expected = convolve2d(np.pad(x, padding), k, mode=mode)[::step, ::step]
+    result = convolve(x, k, step=step, padding=padding, mode=mode, backend=backend, method=method)
+    assert np.allclose(expected, result)
+
+
+@pytest.mark.parametrize("mode", ["full", "valid"])
+@pytest.mark.parametrize("shapes", [((5000,), (3,)), ((5000,), (301,)), ((64, 64), (3, 3)), ((64, 64), (31, 31))])
+def test_conv_auto_method(mode, shapes):
+    signal_shape, kernel_shape = shapes
+    x = np.random.randn(*signal_shape)
+    k = np.random.randn(*kernel_shape)
+
+    expected = convolve(x, k, mode=mode, backend="vectorized")
+    assert np.allclose(expected, convolve(x, k, mode=mode, method="auto"))
+
+
+@pytest.mark.parametrize("method", ["direct", "fft"])
+@pytest.mark.parametrize("shapes", [((5,), (7,)), ((4, 4), (5, 3))])
+def test_valid_conv_kernel_too_large(method, shapes):
+    signal_shape, kernel_shape = shapes
+
+    with pytest.raises(ValueError):
+        convolve(np.ones(signal_shape), np.ones(kernel_shape), mode="valid", backend="vectorized", method=method)
+
+
+@pytest.mark.parametrize(
+    "kernel, rank",
+    [
+        (np.ones((5, 5)) / 25, 1),  # box
+        (np.outer(np.exp(-np.linspace(-2, 2, 9) ** 2), np.exp(-np.linspace(-2, 2, 9) ** 2)), 1),  # gaussian
+        (np.array([[1, 0, -1], [2, 0, -2], [1, 0, -1]]), 1),  # sobel
+        (np.outer(np.ones(7), np.arange(7)) + np.outer(np.arange(7), np.ones(7)), 2),  # sum of two separable terms
+    ],
+)
+def test_separate_kernel(kernel, rank):
+    columns, rows = separate_kernel(kernel)
+
+    assert len(columns) == len(rows) == rank
+    assert np.allclose(kernel, columns.T @ rows)
+
+
+@pytest.mark.parametrize("mode", ["full", "valid"])
+@pytest.mark.parametrize("step", [1, 2])
+@pytest.mark.parametrize(
+    "kernel", [np.ones((5, 5)), np.outer(np.ones(7), np.arange(7)) + np.outer(np.arange(7), np.ones(7))]
+)
+def test_separable_conv2d(mode, step, kernel):
+    x = np.random.randn(20, 23)
+
+    expected = convolve2d(np.pad(x, 1), kernel, mode=mode)[::step, ::step]
+    assert np.allclose(expected, convolve(x, kernel, step=step, padding=1, mode=mode, backend="vectorized"))
+
+
+@pytest.mark.parametrize(
+    "backend, method", [("loop", "direct"), ("vectorized", "direct"), ("loop", "fft"), ("loop", "auto")]
+)
+@pytest.mark.parametrize("mode", ["full", "valid"])
+@pytest.mark.parametrize("kernel", [np.random.randn(3, 3), np.ones((3, 5))])
+def test_batched_conv2d(backend, method, mode, kernel):
+    images = np.random.randn(4, 9, 11, 3)  # (N, H, W, C) batch of color images
+
+    result = convolve(images, kernel, step=2, padding=1, mode=mode, backend=backend, method=method, axes=(1, 2))
+    expected = np.stack(
+        [
+            np.stack([convolve(image[:, :, c], kernel, step=2, padding=1, mode=mode) for c in range(3)], axis=-1)
+            for image in images
+        ]
+    )
+    assert np.allclose(expected, result)
+
+
+@pytest.mark.parametrize("method", ["direct", "fft", "overlap-add"])
+@pytest.mark.parametrize("dtype", [np.float64, np.complex128])
+def test_batched_conv1d(method, dtype):
+    signals = np.random.randn(5, 40).astype(dtype)
+    if np.iscomplexobj(signals):
+        signals.imag = np.random.randn(5, 40)
+    kernel = np.random.randn(4)
+
+    expected = np.stack([np.convolve(signal, kernel) for signal in signals], axis=1)
+    assert np.allclose(expected, convolve(signals.T, kernel, backend="vectorized", method=method, axes=(0,)))
+
+
+@pytest.mark.parametrize(
+    "backend, method", [("loop", "direct"), ("vectorized", "direct"), ("loop", "fft"), ("loop", "overlap-add")]
+)
+@pytest.mark.parametrize("kernel_shape", [(3,), (5,)])
+def test_conv_preserves_float32(backend, method, kernel_shape):
+    signal = np.random.rand(4, 40).astype(np.float32)
+    kernel = np.random.rand(*kernel_shape)
+    expected = convolve(signal.astype(np.float64), kernel, axes=(1,), backend="vectorized")
+
+    convolved = convolve(signal, kernel, axes=(1,), backend=backend, method=method)
+    assert convolved.dtype == np.float32
+    assert np.allclose(expected, convolved, atol=1e-5)
+
+    # float64 accumulation written into float32 output
+    out = np.empty_like(convolved)
+    assert convolve(signal, kernel, axes=(1,), backend=backend, method=method, out=out, dtype=np.float64) is out
+    assert np.allclose(expected.astype(np.float32), out)
+
+
+@pytest.mark.parametrize("kernel", [np.random.rand(5, 5), np.outer([1, 2, 1], [1, 0, -1])])
+@pytest.mark.parametrize("mode", ["full", "valid"])
+def test_conv_workspace(kernel, mode):
+    images = np.random.rand(3, 20, 24, 2).astype(np.float32)
+    expected = convolve(images, kernel, mode=mode, step=2, padding=1, backend="vectorized", axes=(1, 2))
+
+    workspace = Workspace()
+    out = np.empty_like(expected)
+    for _ in range(2):  # second call reuses buffers of the first one
+        convolve(
+            images,
+            kernel,
+            mode=mode,
+            step=2,
+            padding=1,
+            backend="vectorized",
+            axes=(1, 2),
+            out=out,
+            workspace=workspace,
+        )
+        assert np.array_equal(expected, out)
+
+    with pytest.raises(ValueError):
+        convolve(images, kernel, mode=mode, backend="vectorized", axes=(1, 2), out=out)
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.demosaic import BGGR, GBRG, GRBG, RGGB, XTRANS, CFAPattern, bilinear_demosaic, demosaic, malvar_demosaic
+
+PATTERNS = [RGGB, BGGR, GRBG, GBRG, XTRANS]
+
+
+def smooth_image(height, width):
+    y, x = np.mgrid[0:height, 0:width] / 64
+    return np.stack([np.sin(3 * x + y), np.cos(2 * y) + x, x * y], axis=-1)
+
+
+def reference_bilinear_demosaic(raw, pattern, radius):
+    # weighted mean of measured neighbours of each color, computed pixel by pixel on reflected image
+    weights = radius + 1 - np.abs(np.arange(-radius, radius + 1))
+    kernel = np.outer(weights, weights)
+    masks = pattern.masks(raw.shape)
+    padded = np.pad(raw, radius, mode="reflect")
+    padded_masks = np.pad(masks, [(radius, radius), (radius, radius), (0, 0)], mode="reflect")
+
+    rgb = np.zeros((*raw.shape, 3))
+    for y, x, color in np.ndindex(*rgb.shape):
+        window = padded[y : y + 2 * radius + 1, x : x + 2 * radius + 1]
+        measured = kernel * padded_masks[y : y + 2 * radius + 1, x : x + 2 * radius + 1, color]
+        rgb[y, x, color] = raw[y, x] if masks[y, x, color] else np.sum(measured * window) / np.sum(measured)
+
+    return rgb
+
+
+def test_cfa_pattern():
+    assert np.array_equal(RGGB.colors, [[0, 1], [1, 2]])
+    assert CFAPattern.bayer("BGGR").layout == BGGR.layout
+    assert XTRANS.shape == (6, 6)
+
+    masks = XTRANS.masks((7, 8))
+    assert masks.shape == (7, 8, 3)
+    assert np.all(masks.sum(axis=-1) == 1)
+
+    image = np.random.rand(5, 7, 3)
+    assert np.array_equal(np.sum(image * RGGB.masks((5, 7)), axis=-1), RGGB.mosaic(image))
+
+    with pytest.raises(ValueError):
+        CFAPattern(["RG", "GBX"])
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+@pytest.mark.parametrize("shape", [(12, 12), (13, 19)])
+def test_bilinear_demosaic(pattern, shape):
+    raw = np.random.rand(*shape)
+    radius = 1 if pattern.shape == (2, 2) else 2
+    assert np.allclose(reference_bilinear_demosaic(raw, pattern, radius), bilinear_demosaic(raw, pattern))
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+@pytest.mark.parametrize("method", ["bilinear", "malvar"])
+def test_demosaic_smooth_image(pattern, method):
+    if method == "malvar" and pattern is XTRANS:
+        pytest.skip("Malvar-He-Cutler demosaicking is defined only for Bayer patterns")
+
+    image = smooth_image(48, 54)
+    rgb = demosaic(pattern.mosaic(image), pattern, method)
+
+    assert np.array_equal(rgb[pattern.masks(image.shape[:2])], image[pattern.masks(image.shape[:2])])
+    assert np.max(np.abs(rgb - image)[4:-4, 4:-4]) < 1e-2
+
+
+def test_malvar_demosaic_reduces_error():
+    # gradient correction assumes correlated color channels, which holds exactly for grey image
+    y, x = np.mgrid[0:48, 0:54]
+    image = np.repeat((np.sin(x / 3 + y / 5) + np.cos(y / 2.5))[..., np.newaxis], 3, axis=-1)
+    raw = RGGB.mosaic(image)
+
+    bilinear, malvar = bilinear_demosaic(raw, RGGB), malvar_demosaic(raw, RGGB)
+    assert np.mean(np.abs(malvar - image)[4:-4, 4:-4]) < np.mean(np.abs(bilinear - image)[4:-4, 4:-4])
+
+
+@pytest.mark.parametrize("method", ["bilinear", "malvar"])
+@pytest.mark.parametrize("pattern", [RGGB, GBRG])
+def test_demosaic_batch(method, pattern):
+    frames = np.random.randint(0, 4096, size=(3, 16, 22), dtype=np.uint16)
+    rgb = demosaic(frames, pattern, method)
+
+    assert rgb.shape == (3, 16, 22, 3)
+    for frame, result in zip(frames, rgb):
+        assert np.allclose(demosaic(frame, pattern, method), result)
+
+
+def test_malvar_demosaic_requires_bayer():
+    with pytest.raises(ValueError):
+        malvar_demosaic(np.random.rand(12, 12), XTRANS)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src.interpolate import kernels
+from src.interpolate.dirac import dirac_interpolate, dirac_interpolate2d, stream_dirac_interpolate
+
+
+@pytest.mark.parametrize("kernel", [kernels.linear_kernel, kernels.keys_kernel, kernels.sinc_kernel])
+@pytest.mark.parametrize("ratio", [1, 2, 3, 5])
+@pytest.mark.parametrize("kernel_size", [1, 4, 9, 20, 64])
+def test_polyphase_dirac_interpolate(kernel, ratio, kernel_size):
+    x = np.linspace(0, 1, 13)
+    y = np.random.randn(13)
+
+    expected = dirac_interpolate(x, y, ratio, kernel_size, 0.3, kernel, method="zero-stuffing")
+    assert np.allclose(expected, dirac_interpolate(x, y, ratio, kernel_size, 0.3, kernel))
+
+
+@pytest.mark.parametrize("ratio", [2, 3])
+@pytest.mark.parametrize("kernel_size", [3, 10])
+def test_dirac_interpolate2d(ratio, kernel_size):
+    image = np.random.randn(7, 10)
+
+    def interpolate_rows(rows):
+        x = np.arange(rows.shape[1])
+        return np.asarray([dirac_interpolate(x, row, ratio, kernel_size, 0.5, kernels.linear_kernel) for row in rows])
+
+    expected = interpolate_rows(interpolate_rows(image).T).T
+    assert np.allclose(expected, dirac_interpolate2d(image, ratio, kernel_size, 0.5, kernels.linear_kernel))
+
+
+@pytest.mark.parametrize("ratio", [1, 2, 4])
+@pytest.mark.parametrize("kernel_size", [1, 3, 8, 21])
+@pytest.mark.parametrize("chunk_size", [1, 5, 100])
+def test_stream_dirac_interpolate(ratio, kernel_size, chunk_size):
+    y = np.random.randn(100)
+    chunks = np.split(y, range(chunk_size, len(y), chunk_size))
+
+    expected = dirac_interpolate(np.arange(len(y)), y, ratio, kernel_size, 0.2, kernels.keys_kernel)
+    streamed = np.concatenate(list(stream_dirac_interpolate(chunks, ratio, kernel_size, 0.2, kernels.keys_kernel)))
+    assert np.allclose(expected, streamed)
+
+
+def test_stream_dirac_interpolate_float32():
+    y = np.random.randn(50).astype(np.float32)
+    streamed = list(stream_dirac_interpolate(np.split(y, [20, 35]), 2, 8, 0.2, kernels.keys_kernel))
+
+    assert all(chunk.dtype == np.float32 for chunk in streamed)
+    expected = dirac_interpolate(np.arange(len(y)), y, 2, 8, 0.2, kernels.keys_kernel)
+    assert np.allclose(expected, np.concatenate(streamed), atol=1e-5)
+
+
+@pytest.mark.parametrize("method", ["polyphase", "zero-stuffing"])
+def test_dirac_interpolate_out(method):
+    y = np.random.randn(50).astype(np.float32)
+    expected = dirac_interpolate(np.arange(50), y.astype(np.float64), 2, 8, 0.2, kernels.keys_kernel, method=method)
+
+    interpolated = dirac_interpolate(np.arange(50), y, 2, 8, 0.2, kernels.keys_kernel, method=method)
+    assert interpolated.dtype == np.float32
+    assert np.allclose(expected, interpolated, atol=1e-5)
+
+    out = np.empty_like(expected)
+    assert dirac_interpolate(np.arange(50), y, 2, 8, 0.2, kernels.keys_kernel, method, out, np.float64) is out
+    assert np.allclose(expected, out)
+
+
+def test_dirac_interpolate_unknown_method():
+    with pytest.raises(ValueError):
+        dirac_interpolate(np.arange(5), np.ones(5), 2, 4, 0.5, kernels.linear_kernel, method="zero-padding")
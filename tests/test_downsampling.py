@@ -0,0 +1,113 @@
+import operator
+
+import numpy as np
+import pytest
+
+from src.buffers import Workspace
+from src.downsampling import box_downsample, build_pyramid, downsample, nonlinear_downsample
+
+
+def reference_box_downsample(image, box_size, step, partial=False):
+    height, width = image.shape
+    rows = range(0, height if partial else height - box_size + 1, step)
+    columns = range(0, width if partial else width - box_size + 1, step)
+    return np.asarray([[np.mean(image[y : y + box_size, x : x + box_size]) for x in columns] for y in rows])
+
+
+@pytest.mark.parametrize("shape", [(12, 12), (13, 17)])
+@pytest.mark.parametrize("kernel_size", [1, 2, 3, 5])
+@pytest.mark.parametrize("boundary", ["crop", "partial"])
+def test_downsample(shape, kernel_size, boundary):
+    image = np.random.rand(*shape)
+    expected = reference_box_downsample(image, kernel_size, kernel_size, partial=boundary == "partial")
+
+    assert np.allclose(expected, downsample(image, kernel_size, boundary=boundary))
+    assert np.allclose(expected, box_downsample(image, kernel_size, boundary=boundary))
+
+
+@pytest.mark.parametrize("aggregate", [np.max, np.min, np.median, np.sum])
+@pytest.mark.parametrize("boundary", ["crop", "partial"])
+def test_nonlinear_downsample(aggregate, boundary):
+    images = np.random.randint(0, 4096, size=(2, 11, 14, 3), dtype=np.uint16)
+    downsampled = nonlinear_downsample(images, aggregate, 4, axes=(1, 2), boundary=boundary)
+
+    rows = range(0, 11 if boundary == "partial" else 8, 4)
+    columns = range(0, 14 if boundary == "partial" else 12, 4)
+    expected = [[aggregate(images[:, y : y + 4, x : x + 4], axis=(1, 2)) for x in columns] for y in rows]
+    assert np.array_equal(np.moveaxis(expected, (0, 1), (1, 2)), downsampled)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_nonlinear_downsample_single_axis_aggregate(workers):
+    images = np.random.rand(2, 11, 14)
+
+    def median(array, axis):
+        return np.median(array, axis=operator.index(axis))  # raises TypeError for tuple of axes
+
+    expected = nonlinear_downsample(images, np.median, 3, axes=(1, 2), boundary="partial")
+    assert np.array_equal(expected, nonlinear_downsample(images, median, 3, (1, 2), workers, boundary="partial"))
+
+
+@pytest.mark.parametrize("box_size, step", [(3, 1), (4, 2), (5, 3)])
+@pytest.mark.parametrize("boundary", ["crop", "partial"])
+def test_overlapping_box_downsample(box_size, step, boundary):
+    images = np.random.rand(2, 15, 13)
+    downsampled = box_downsample(images, box_size, step, axes=(1, 2), boundary=boundary)
+
+    for image, result in zip(images, downsampled):
+        assert np.allclose(reference_box_downsample(image, box_size, step, partial=boundary == "partial"), result)
+
+
+def test_build_pyramid():
+    image = np.random.rand(100, 37, 3)
+    pyramid = build_pyramid(image)
+
+    assert [level.shape[:2] for level in pyramid] == [
+        (100, 37),
+        (50, 19),
+        (25, 10),
+        (13, 5),
+        (7, 3),
+        (4, 2),
+        (2, 1),
+        (1, 1),
+    ]
+    for previous, level in zip(pyramid, pyramid[1:]):
+        assert np.allclose(downsample(previous, 2, boundary="partial"), level)
+
+    maximum = build_pyramid(image, levels=20, aggregate=np.max)
+    assert len(maximum) == 8
+    assert np.array_equal(maximum[-1][0, 0], image.max(axis=(0, 1)))
+    assert len(build_pyramid(image, levels=2, kernel_size=4)) == 3
+
+
+@pytest.mark.parametrize("boundary", ["crop", "partial"])
+def test_downsample_out(boundary):
+    images = np.random.rand(2, 13, 17).astype(np.float32)
+    expected = downsample(images.astype(np.float64), 3, axes=(1, 2), boundary=boundary)
+
+    downsampled = downsample(images, 3, axes=(1, 2), boundary=boundary)
+    assert downsampled.dtype == np.float32
+    assert np.allclose(expected, downsampled)
+
+    out = np.empty_like(expected)
+    assert downsample(images, 3, axes=(1, 2), boundary=boundary, out=out, workspace=Workspace()) is out
+    assert np.allclose(expected, out)
+
+    out = np.empty(expected.shape, dtype=images.dtype)
+    assert nonlinear_downsample(images, np.max, 3, axes=(1, 2), boundary=boundary, out=out) is out
+    assert np.array_equal(nonlinear_downsample(images, np.max, 3, axes=(1, 2), boundary=boundary), out)
+
+
+@pytest.mark.parametrize("boundary", ["crop", "partial"])
+def test_box_downsample_out(boundary):
+    images = np.random.rand(2, 13, 17).astype(np.float32)
+    expected = box_downsample(images.astype(np.float64), 4, 3, axes=(1, 2), boundary=boundary)
+
+    downsampled = box_downsample(images, 4, 3, axes=(1, 2), boundary=boundary)
+    assert downsampled.dtype == np.float32
+    assert np.allclose(expected, downsampled)
+
+    out = np.empty_like(expected)
+    assert box_downsample(images, 4, 3, axes=(1, 2), boundary=boundary, out=out) is out
+    assert np.array_equal(expected, out)
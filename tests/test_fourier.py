@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.fourier import (
+    FourierTransform2D,
+    WaveletTransform2D,
+    apply_rgb,
+    coefficient_thresholds,
+    compress_and_decompress,
+    compression_sweep,
+)
+
+
+def sorted_threshold_compression(image, transform, compression):
+    transformed = transform.forward(image, axes=(0, 1))
+    threshold = np.sort(np.abs(transformed).ravel())[int(compression * transformed.size)]
+    return transform.backward(transformed * (np.abs(transformed) > threshold), axes=(0, 1))
+
+
+@pytest.mark.parametrize("transform", [FourierTransform2D(), WaveletTransform2D("db2", 2)])
+@pytest.mark.parametrize("compression", [0, 0.5, 0.95])
+def test_compress_and_decompress(transform, compression):
+    image = np.random.rand(32, 32)
+
+    expected = sorted_threshold_compression(image, transform, compression)
+    assert np.allclose(expected, compress_and_decompress(image, transform, compression))
+
+
+@pytest.mark.parametrize("shape", [(16, 20), (15, 21)])
+def test_real_fourier_transform(shape):
+    image = np.random.rand(*shape)
+    transform = FourierTransform2D(real=True)
+
+    assert transform.forward(image, axes=(0, 1)).shape == (shape[0], shape[1] // 2 + 1)
+    assert np.allclose(image, transform.backward(transform.forward(image, axes=(0, 1)), axes=(0, 1), shape=shape))
+    assert compress_and_decompress(image, transform, 0.5).shape == shape
+
+
+@pytest.mark.parametrize(
+    "transform", [FourierTransform2D(), FourierTransform2D(real=True), WaveletTransform2D("db1", 2)]
+)
+def test_compression_sweep(transform):
+    images = np.random.rand(2, 16, 16, 3)
+    compressions = [0.9, 0.1, 0.5]
+
+    results = compression_sweep(images, transform, compressions, axes=(1, 2), data_range=1)
+    for result, compression in zip(results, compressions):
+        assert result.compression == compression
+        assert np.allclose(result.image, compress_and_decompress(images, transform, compression, axes=(1, 2)))
+        assert np.isclose(result.psnr, 10 * np.log10(1 / np.mean((images - result.image) ** 2)))
+
+    # more compression keeps fewer coefficients and gives worse reconstruction
+    assert results[1].kept > results[2].kept > results[0].kept
+    assert results[1].psnr > results[2].psnr > results[0].psnr
+
+
+def test_compression_sweep_float32():
+    images = np.random.default_rng(0).random((2, 16, 16)).astype(np.float32)
+    transform = FourierTransform2D(real=True)
+
+    for result in compression_sweep(images, transform, [0.5, 0.9], axes=(1, 2), data_range=1):
+        assert result.image.dtype == np.float32
+        assert np.allclose(result.image, compress_and_decompress(images, transform, result.compression, (1, 2)))
+
+
+def test_apply_rgb():
+    image = np.random.rand(16, 16, 3)
+    expected = np.dstack([compress_and_decompress(image[:, :, c], FourierTransform2D(), 0.5) for c in range(3)])
+
+    assert np.allclose(expected, apply_rgb(compress_and_decompress, image, FourierTransform2D(), 0.5))
+    # functions without axes argument are applied to each channel separately
+    assert np.allclose(image.sum(axis=(0, 1)), apply_rgb(lambda channel: channel.sum(keepdims=True), image))
+
+
+def test_compression_ratio_out_of_range():
+    with pytest.raises(ValueError):
+        compress_and_decompress(np.random.rand(8, 8), FourierTransform2D(), 1)
+
+
+@pytest.mark.parametrize("wavelet, level", [("db1", 3), ("db2", 2), ("sym4", 1)])
+@pytest.mark.parametrize("shape", [(32, 32), (21, 34)])
+def test_wavelet_transform_batch(wavelet, level, shape):
+    images = np.random.rand(3, *shape, 2)
+    transform = WaveletTransform2D(wavelet, level)
+
+    coefficients = transform.forward(images, axes=(1, 2))
+    for index in range(3):
+        assert np.allclose(coefficients[index, ..., 1], transform.forward(images[index, ..., 1], axes=(0, 1)))
+
+    # new instance does not need to run forward transform first, layout is found from the coefficient shape
+    reconstructed = WaveletTransform2D(wavelet, level).backward(coefficients, axes=(1, 2), shape=shape)
+    assert np.allclose(images, reconstructed)
+    assert np.allclose(images, transform.backward(coefficients, axes=(1, 2))[:, : shape[0], : shape[1]])
+
+
+def test_wavelet_transform_threads():
+    transform = WaveletTransform2D("db2", 2)
+    images = [np.random.rand(16 + index % 5, 20 + index % 3) for index in range(40)]
+
+    def round_trip(image):
+        return transform.backward(transform.forward(image), shape=image.shape)
+
+    with ThreadPoolExecutor(8) as pool:
+        for image, reconstructed in zip(images, pool.map(round_trip, images)):
+            assert np.allclose(image, reconstructed)
+
+
+@pytest.mark.parametrize(
+    "transform", [FourierTransform2D(), FourierTransform2D(real=True), WaveletTransform2D("db2", 2)]
+)
+def test_compress_and_decompress_float32(transform):
+    images = np.random.default_rng(0).random((2, 16, 20)).astype(np.float32)
+    # coefficients with magnitudes close to the threshold, such as Hermitian pairs of real transform, can be kept or
+    # removed depending on rounding, so double precision reference removes the same coefficients as float32
+    magnitudes = np.abs(transform.forward(images, axes=(1, 2)))
+    (threshold,) = coefficient_thresholds(magnitudes, [0.5], axes=(1, 2))
+    coefficients = transform.forward(images.astype(np.float64), axes=(1, 2)) * (magnitudes > threshold)
+    expected = transform.backward(coefficients, axes=(1, 2), shape=(16, 20))
+
+    decompressed = compress_and_decompress(images, transform, 0.5, axes=(1, 2))
+    assert decompressed.dtype == np.float32
+    assert np.allclose(expected, decompressed, atol=1e-5)
+
+    out = np.empty(images.shape)
+    expected = compress_and_decompress(images.astype(np.float64), transform, 0.5, axes=(1, 2))
+    assert compress_and_decompress(images, transform, 0.5, axes=(1, 2), out=out, dtype=np.float64) is out
+    assert np.allclose(expected, out)
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from src.buffers import Workspace
+from src.interpolate import kernels
+from src.interpolate.core import (
+    convolve_interpolate,
+    image_interpolate1d,
+    image_interpolate2d,
+    kernel_matrix,
+    product_interpolate,
+    sparse_kernel_matrix,
+)
+
+
+@pytest.mark.parametrize(
+    "kernel",
+    [kernels.sample_hold_kernel2d, kernels.nearest_neighbour_kernel2d, kernels.linear_kernel2d, kernels.keys_kernel2d],
+)
+@pytest.mark.parametrize("shape", [(6, 6), (5, 9)])
+@pytest.mark.parametrize("eps", [0, 0.01])
+def test_sparse_interpolate2d(kernel, shape, eps):
+    image = np.random.rand(*shape)
+
+    dense = image_interpolate2d(image, kernel, ratio=3, eps=eps, support=np.inf)
+    assert np.allclose(dense, image_interpolate2d(image, kernel, ratio=3, eps=eps))
+
+
+def test_truncated_sinc_interpolate2d():
+    image = np.random.rand(8, 8)
+
+    # sinc kernel truncated with alpha is zero outside of its support, so sparse evaluation must give the same result
+    def truncated_sinc(xy, offset, width):
+        return kernels.sinc_kernel2d(xy, offset, width, alpha=3)
+
+    dense = image_interpolate2d(image, truncated_sinc, ratio=2)
+    assert np.allclose(dense, image_interpolate2d(image, truncated_sinc, ratio=2, support=3))
+
+
+def test_non_square_interpolate2d():
+    image = np.random.rand(4, 7)
+    interpolated = image_interpolate2d(image, kernels.linear_kernel2d, ratio=1)
+
+    assert np.allclose(image, interpolated)
+
+
+@pytest.mark.parametrize("kernel", [kernels.linear_kernel, kernels.keys_kernel, kernels.sinc_kernel])
+@pytest.mark.parametrize("shape", [(4, 6), (40, 33)])
+def test_image_interpolate1d(kernel, shape):
+    image = np.random.rand(*shape)
+
+    def interpolate_rows(rows):
+        x_measure = np.arange(rows.shape[1])
+        x_interpolate = np.linspace(0, rows.shape[1], 2 * rows.shape[1], endpoint=False)
+        return np.asarray([product_interpolate(x_measure, row, x_interpolate, kernel) for row in rows])
+
+    expected = interpolate_rows(interpolate_rows(image).T).T
+    assert np.allclose(expected, image_interpolate1d(image, kernel, ratio=2))
+
+
+@pytest.mark.parametrize(
+    "kernel", [kernels.sample_hold_kernel, kernels.nearest_neighbour_kernel, kernels.linear_kernel, kernels.keys_kernel]
+)
+def test_sparse_kernel_matrix(kernel):
+    # non-uniformly spaced and unsorted measurements
+    x_measure = np.random.permutation(np.cumsum(np.random.uniform(0.5, 1.5, size=30)))
+    x_interpolate = np.linspace(0, 35, 200)
+    width = (x_measure.max() - x_measure.min()) / 29
+    dense = np.asarray([kernel(x_interpolate, offset=offset, width=width) for offset in x_measure])
+
+    weights = sparse_kernel_matrix(x_measure, x_interpolate, kernel)
+    assert weights.nnz <= np.count_nonzero(dense)
+    assert np.allclose(dense, weights.toarray())
+
+
+@pytest.mark.parametrize("kernel", [kernels.nearest_neighbour_kernel, kernels.sample_hold_kernel])
+def test_sparse_weights_at_support_edge(kernel):
+    # nearest neighbour kernel is 1 at the edge of its support, so half-pixel targets of even ratios are kept
+    image = np.random.rand(40, 40)
+    x_measure, x_interpolate = np.arange(40), np.linspace(0, 40, 80, endpoint=False)
+    dense = kernel_matrix(x_measure, x_interpolate, kernel)
+
+    assert np.allclose(image_interpolate1d(image, kernel, ratio=2), dense.T @ image @ dense)
+    x_interpolate = np.linspace(0, 1, 97)
+    x_measure = np.linspace(0, 1, 40)
+    expected = image[0] @ kernel_matrix(x_measure, x_interpolate, kernel)
+    assert np.allclose(product_interpolate(x_measure, image[0], x_interpolate, kernel), expected)
+
+
+@pytest.mark.parametrize("kernel", [kernels.linear_kernel, kernels.keys_kernel, kernels.sinc_kernel])
+def test_convolve_interpolate(kernel):
+    x_measure = np.arange(20)
+    y_measure = np.random.rand(20)
+    x_interpolate = np.linspace(0, 20, 57)
+
+    interpolated, scaled_kernels = convolve_interpolate(
+        x_measure, y_measure, x_interpolate, kernel, return_kernels=True
+    )
+    assert np.allclose(product_interpolate(x_measure, y_measure, x_interpolate, kernel), interpolated)
+    assert np.allclose(interpolated, np.sum(scaled_kernels, axis=0))
+    assert np.allclose(interpolated, convolve_interpolate(x_measure, y_measure, x_interpolate, kernel))
+
+
+@pytest.mark.parametrize("kernel", [kernels.linear_kernel, kernels.sinc_kernel])
+def test_image_interpolate1d_out(kernel):
+    images = np.random.rand(2, 12, 9).astype(np.float32)
+    expected = image_interpolate1d(images.astype(np.float64), kernel, ratio=2, axes=(1, 2))
+
+    interpolated = image_interpolate1d(images, kernel, ratio=2, axes=(1, 2))
+    assert interpolated.dtype == np.float32
+    assert np.allclose(expected, interpolated, atol=1e-5)
+
+    out, workspace = np.empty(expected.shape, dtype=np.float32), Workspace()
+    assert image_interpolate1d(images, kernel, ratio=2, axes=(1, 2), out=out, workspace=workspace) is out
+    assert np.array_equal(interpolated, out)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from src.interpolate import kernels
+from src.interpolate.core import image_interpolate2d
+
+
+def reference_keys_kernel(x, alpha=-0.5):
+    x = np.abs(x)
+    inner = ((alpha + 2) * x**3 - (alpha + 3) * x**2 + 1) * (x < 1)
+    outer = (alpha * x**3 - 5 * alpha * x**2 + 8 * alpha * x - 4 * alpha) * (x >= 1) * (x < 2)
+    return inner + outer
+
+
+@pytest.mark.parametrize("alpha", [-0.5, -0.75])
+def test_keys_kernel(alpha):
+    x = np.concatenate([np.linspace(-3, 3, 601), [-2, -1, 0, 1, 2]])
+
+    assert np.allclose(reference_keys_kernel((x - 0.2) / 0.5, alpha), kernels.keys_kernel(x, 0.2, 0.5, alpha=alpha))
+    assert np.allclose(kernels.keys_kernel(np.arange(-3, 4), 0, 1), [0, 0, 0, 1, 0, 0, 0])
+
+
+def test_kernel_out_buffer():
+    x = np.linspace(-2, 2, 50, dtype=np.float32)
+    out = np.empty_like(x)
+
+    result = kernels.KeysKernel()(x, offset=0.1, width=0.8, out=out)
+    assert result is out and out.dtype == np.float32
+    assert np.allclose(out, kernels.keys_kernel(x.astype(float), 0.1, 0.8), atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "kernel", [kernels.LinearKernel(), kernels.KeysKernel(), kernels.SincKernel(alpha=3), kernels.keys_kernel]
+)
+def test_lookup_kernel(kernel):
+    x = np.random.uniform(-4, 4, 1000)
+    lookup = kernels.LookupKernel(kernel, resolution=1024)
+
+    assert np.allclose(kernel(x, offset=0.3, width=1.5), lookup(x, offset=0.3, width=1.5), atol=1e-5)
+
+
+def test_lookup_kernel_infinite_support():
+    with pytest.raises(ValueError):
+        kernels.LookupKernel(kernels.SincKernel())
+
+
+def test_separable_kernel2d():
+    xy = np.random.uniform(-3, 3, (100, 2))
+    offsets = np.random.uniform(-1, 1, (100, 2))
+    kernel = kernels.SeparableKernel2D(kernels.KeysKernel())
+
+    expected = reference_keys_kernel(xy[:, 0] - offsets[:, 0]) * reference_keys_kernel(xy[:, 1] - offsets[:, 1])
+    assert np.allclose(expected, kernel(xy, offset=offsets, width=1))
+    assert np.allclose(expected, kernels.keys_kernel2d(xy, offsets, 1))
+
+
+def test_kernel_objects_interpolate2d():
+    image = np.random.rand(6, 5)
+    kernel = kernels.SeparableKernel2D(kernels.LookupKernel(kernels.KeysKernel()))
+
+    expected = image_interpolate2d(image, kernels.keys_kernel2d, ratio=2)
+    assert np.allclose(expected, image_interpolate2d(image, kernel, ratio=2), atol=1e-5)
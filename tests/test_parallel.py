@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src.conv import convolve
+from src.downsampling import downsample, nonlinear_downsample
+from src.interpolate import kernels
+from src.interpolate.core import image_interpolate1d, image_interpolate2d
+from src.parallel import read_rows
+
+
+def assert_deterministic(func, expected_close):
+    results = [func(workers=1), func(workers=3), func(workers=2, executor="process")]
+
+    assert np.allclose(expected_close, results[0])
+    for result in results[1:]:
+        assert np.array_equal(results[0], result)
+
+
+@pytest.mark.parametrize("method", ["direct", "fft"])
+@pytest.mark.parametrize("mode", ["full", "valid"])
+def test_parallel_convolve(method, mode):
+    images = np.random.randn(2, 75, 40, 3)
+    kernel = np.random.randn(4, 3)
+
+    def func(**kwargs):
+        return convolve(images, kernel, 2, 1, mode, "vectorized", method, axes=(1, 2), **kwargs)
+
+    assert_deterministic(func, func(workers=None))
+
+
+def test_parallel_downsample():
+    images = np.random.randint(0, 256, size=(2, 70, 33, 3), dtype=np.uint8)
+
+    assert_deterministic(lambda **kwargs: downsample(images, 3, axes=(1, 2), **kwargs), downsample(images, 3, (1, 2)))
+    assert_deterministic(
+        lambda **kwargs: nonlinear_downsample(images, np.max, 3, axes=(1, 2), **kwargs),
+        nonlinear_downsample(images, np.max, 3, axes=(1, 2)),
+    )
+
+
+def test_parallel_interpolate():
+    images = np.random.rand(2, 40, 9)
+
+    assert_deterministic(
+        lambda **kwargs: image_interpolate1d(images, kernels.keys_kernel, 2, axes=(1, 2), **kwargs),
+        image_interpolate1d(images, kernels.keys_kernel, 2, axes=(1, 2)),
+    )
+    assert_deterministic(
+        lambda **kwargs: image_interpolate2d(images, kernels.linear_kernel2d, 2, axes=(1, 2), **kwargs),
+        image_interpolate2d(images, kernels.linear_kernel2d, 2, axes=(1, 2)),
+    )
+
+
+@pytest.mark.parametrize("start, stop", [(0, 3), (0, 12), (2, 9), (9, 14), (11, 15)])
+def test_read_rows(start, stop):
+    array = np.arange(1, 21).reshape(5, 4).T  # 4 rows along axis 0, 5 along axis 1
+    padded = np.pad(array, ((0, 0), (3, 20)))
+
+    assert np.array_equal(padded[:, start:stop], read_rows(array, start, stop, leading=3, axis=1))
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from src.conv import convolve
+from src.downsampling import downsample, nonlinear_downsample
+from src.interpolate import kernels
+from src.interpolate.core import image_interpolate1d
+from src.pipeline import Pipeline
+
+GAUSSIAN = np.outer([1, 4, 6, 4, 1], [1, 4, 6, 4, 1]) / 256
+
+
+def eager_convolve(image, kernel, **kwargs):
+    return convolve(image, kernel, backend="vectorized", axes=(1, 2), **kwargs)
+
+
+@pytest.fixture
+def frames():
+    return np.random.default_rng(0).random((3, 45, 52))
+
+
+def test_conv_and_downsample_fused_into_strided_conv(frames):
+    kernel = np.random.default_rng(1).random((3, 3))
+    pipeline = Pipeline(frames, axes=(1, 2)).convolve(kernel, mode="valid").downsample(2)
+
+    expected = downsample(eager_convolve(frames, kernel, mode="valid"), 2, axes=(1, 2))
+    assert len(pipeline.stages) == 1
+    assert np.allclose(pipeline.evaluate(tile_rows=7), expected)
+
+
+def test_full_convolutions_with_padding_and_step(frames):
+    kernel = np.random.default_rng(1).random((3, 3))
+    pipeline = Pipeline(frames, axes=(1, 2)).convolve(kernel).convolve(GAUSSIAN, step=2, padding=1)
+
+    expected = eager_convolve(eager_convolve(frames, kernel), GAUSSIAN, step=2, padding=1)
+    assert np.allclose(pipeline.evaluate(tile_rows=5), expected)
+
+
+def test_valid_conv_with_padding_is_not_fused_with_next_conv(frames):
+    pipeline = Pipeline(frames, axes=(1, 2)).convolve(GAUSSIAN, mode="valid", padding=1).convolve(GAUSSIAN)
+
+    expected = eager_convolve(eager_convolve(frames, GAUSSIAN, mode="valid", padding=1), GAUSSIAN)
+    assert len(pipeline.stages) == 2
+    assert np.allclose(pipeline.evaluate(), expected)
+
+
+@pytest.mark.parametrize("kernel", [kernels.linear_kernel, kernels.keys_kernel])
+def test_interpolate_and_downsample_collapse(frames, kernel):
+    pipeline = Pipeline(frames, axes=(1, 2)).convolve(GAUSSIAN, mode="valid").interpolate(kernel, 2).downsample(2)
+
+    interpolated = image_interpolate1d(eager_convolve(frames, GAUSSIAN, mode="valid"), kernel, 2, axes=(1, 2))
+    assert len(pipeline.stages) == 1
+    assert np.allclose(pipeline.evaluate(tile_rows=6), downsample(interpolated, 2, axes=(1, 2)))
+
+
+def test_dense_interpolation_followed_by_conv(frames):
+    kernel = np.random.default_rng(1).random((3, 3))
+    pipeline = Pipeline(frames, axes=(1, 2)).interpolate(kernels.sinc_kernel, 2).convolve(kernel, mode="valid")
+
+    expected = eager_convolve(image_interpolate1d(frames, kernels.sinc_kernel, 2, axes=(1, 2)), kernel, mode="valid")
+    assert np.allclose(pipeline.evaluate(tile_rows=9), expected)
+
+
+def test_apply_and_nonlinear_stages(frames):
+    pipeline = Pipeline(frames, axes=(1, 2)).apply(np.sqrt).downsample(3, boundary="partial")
+    pipeline = pipeline.nonlinear_downsample(np.max, 2)
+
+    partial = downsample(np.sqrt(frames), 3, axes=(1, 2), boundary="partial")
+    assert np.allclose(pipeline.evaluate(tile_rows=2), nonlinear_downsample(partial, np.max, 2, axes=(1, 2)))
+
+
+def test_evaluate_into_output_with_workers():
+    image = np.random.default_rng(0).random((64, 48, 3)).astype(np.float32)
+    pipeline = Pipeline(image).downsample(2).interpolate(kernels.keys_kernel, 2)
+    out = np.empty((64, 48, 3), dtype=np.float32)
+
+    expected = image_interpolate1d(downsample(image, 2, axes=(0, 1)), kernels.keys_kernel, 2, axes=(0, 1))
+    assert pipeline.evaluate(out=out, tile_rows=8, workers=2) is out
+    assert np.allclose(out, expected, atol=1e-5)
+
+
+def test_recording_does_not_modify_pipeline(frames):
+    pipeline = Pipeline(frames, axes=(1, 2))
+    pipeline.downsample(2)
+
+    assert pipeline.image_shape == (45, 52)
+    assert np.allclose(pipeline.evaluate(), frames)
+    with pytest.raises(ValueError):
+        pipeline.convolve(np.ones(3))
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from src.conv import convolve
+from src.poisson import anscombe, denoise_poisson, filter_kernel, inverse_anscombe
+
+
+def expected_anscombe(mean):
+    # E[2 * sqrt(z + 3/8)] for z ~ Poisson(mean) summed directly over counts
+    counts = np.arange(int(mean + 20 * np.sqrt(mean) + 50))
+    probabilities = np.exp(counts * np.log(mean) - mean - np.cumsum(np.log(np.maximum(counts, 1))))
+    return np.sum(probabilities * 2 * np.sqrt(counts + 3 / 8))
+
+
+def reference_denoise(counts, kind, size, power):
+    radius = size // 2
+    transformed = np.pad(anscombe(counts), [(0, 0), (radius, radius), (radius, radius)], mode="reflect")
+    transformed = np.log(transformed) if power == 0 else transformed**power
+    filtered = convolve(transformed, filter_kernel(kind, size), mode="valid", backend="vectorized", axes=(1, 2))
+    return inverse_anscombe(np.exp(filtered) if power == 0 else filtered ** (1 / power))
+
+
+def test_anscombe_round_trip():
+    counts = np.random.randint(0, 1000, size=(4, 5), dtype=np.uint16)
+    assert np.allclose(counts, inverse_anscombe(anscombe(counts), method="algebraic"))
+
+    frames = counts.astype(np.float32)
+    assert anscombe(frames, out=frames) is frames
+    assert frames.dtype == np.float32
+
+
+@pytest.mark.parametrize("mean", [0.1, 0.5, 2, 10, 150, 500])
+def test_exact_unbiased_inverse(mean):
+    transformed = np.asarray([expected_anscombe(mean)])
+    assert np.allclose(mean, inverse_anscombe(transformed), rtol=1e-4)
+
+    # other inverses are biased for low counts
+    if mean < 1:
+        assert not np.allclose(mean, inverse_anscombe(transformed, method="asymptotic"), rtol=1e-2)
+
+
+@pytest.mark.parametrize("kind", ["mean", "gaussian"])
+@pytest.mark.parametrize("power", [1, 0, -1, 2])
+@pytest.mark.parametrize("tile_rows", [4, 32])
+def test_denoise_poisson(kind, power, tile_rows):
+    counts = np.random.poisson(5, size=(3, 19, 23))
+    denoised = denoise_poisson(counts, kind, size=5, power=power, tile_rows=tile_rows)
+    assert np.allclose(reference_denoise(counts, kind, 5, power), denoised)
+
+
+def test_denoise_poisson_in_place():
+    y, x = np.mgrid[0:40, 0:50]
+    means = 5 + 4 * np.sin(x / 9) * np.cos(y / 7)
+    frames = np.random.poisson(means, size=(4, 2, 40, 50)).astype(np.float32)
+    expected = denoise_poisson(frames, size=5, axes=(2, 3))
+
+    assert denoise_poisson(frames, size=5, axes=(2, 3), out=frames, tile_rows=8) is frames
+    assert np.allclose(expected, frames, atol=1e-5)
+    assert np.mean(np.abs(frames - means)) < np.mean(np.abs(np.random.poisson(means) - means)) / 2
+
+
+@pytest.mark.parametrize("height, tile_rows", [(33, 32), (17, 8), (41, 8)])
+def test_denoise_poisson_in_place_short_last_tile(height, tile_rows):
+    counts = np.random.default_rng(0).poisson(5, size=(2, height, 21)).astype(np.float64)
+    expected = denoise_poisson(counts, size=5, tile_rows=tile_rows)
+
+    denoise_poisson(counts, size=5, out=counts, tile_rows=tile_rows)
+    assert np.allclose(expected, counts)
+
+
+def test_kernel_too_large():
+    with pytest.raises(ValueError):
+        denoise_poisson(np.ones((3, 10)), size=7)
@@ -0,0 +1,51 @@
+import json
+
+import numpy as np
+
+from src.conv import convolve
+from src.downsampling import downsample
+from src.fourier import WaveletTransform2D, compress_and_decompress
+from src.interpolate.core import _axis_weights, image_interpolate1d
+from src.interpolate.kernels import keys_kernel
+from src.profiling import REGISTRY, instrument, profile
+
+
+@instrument("test.outer")
+def outer(image):
+    return downsample(convolve(image, np.ones((3, 3)), backend="vectorized"), 2)
+
+
+def test_disabled_registry_records_nothing():
+    REGISTRY.clear()
+    convolve(np.ones((8, 8)), np.ones((3, 3)), backend="vectorized")
+    assert REGISTRY.events == []
+
+
+def test_nested_calls_and_self_time():
+    image = np.random.rand(32, 32)
+    with profile() as registry:
+        outer(image)
+
+    names = [event.name for event in registry.events]
+    assert names[-1] == "test.outer" and "conv.convolve" in names and "downsampling.downsample" in names
+
+    summary = registry.summary()
+    assert summary["test.outer"]["calls"] == 1
+    assert summary["test.outer"]["self_seconds"] < summary["test.outer"]["total_seconds"]
+    assert summary["conv.convolve"]["shapes"] == {"((32, 32), (3, 3))": 1}
+    assert REGISTRY.enabled is False
+
+
+def test_memory_and_exports():
+    _axis_weights.cache_clear()  # kernel is evaluated only when weights are not cached
+    with profile(memory=True) as registry:
+        image_interpolate1d(np.random.rand(64, 64), keys_kernel, ratio=2)
+        compress_and_decompress(np.random.rand(64, 64), WaveletTransform2D("haar", level=2), compression=0.5)
+
+    summary = registry.summary()
+    assert summary["interpolate.image_interpolate1d"]["allocated_bytes"] >= 128 * 128 * 8
+    assert "kernels.evaluate" in summary and "fourier.WaveletTransform2D.forward" in summary
+
+    trace = json.loads(json.dumps(registry.to_chrome_trace()))
+    assert {event["ph"] for event in trace["traceEvents"]} == {"X"}
+    assert len(json.loads(json.dumps(registry.to_json()))["events"]) == len(registry.events)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from src.conv import convolve
+from src.tiled import open_raw, tiled_convolve
+
+
+@pytest.mark.parametrize("mode", ["full", "valid"])
+@pytest.mark.parametrize("step", [1, 2, 3])
+@pytest.mark.parametrize("padding", [0, 2])
+@pytest.mark.parametrize("kernel", [np.random.randn(3, 4), np.ones((5, 5)) / 25, np.random.randn(1, 2)])
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_tiled_convolve_bit_identical(tmp_path, mode, step, padding, kernel, dtype):
+    image = np.random.randn(37, 29).astype(dtype)
+    image.tofile(tmp_path / "image.raw")
+
+    expected = convolve(image, kernel, step=step, padding=padding, mode=mode, backend="vectorized")
+    # budget small enough to force many tiles, each a few rows high
+    result = tiled_convolve(
+        tmp_path / "image.raw",
+        kernel,
+        tmp_path / "output.raw",
+        step=step,
+        padding=padding,
+        mode=mode,
+        tile_budget=8 * 60 * (kernel.shape[0] + 4 * step),
+        shape=image.shape,
+        dtype=image.dtype,
+    )
+
+    assert isinstance(result, np.memmap)
+    assert result.dtype == expected.dtype == dtype
+    assert np.array_equal(expected, result)
+    assert np.array_equal(expected, open_raw(tmp_path / "output.raw", expected.shape, dtype))
+
+
+@pytest.mark.parametrize("mode", ["full", "valid"])
+def test_tiled_convolve1d(mode):
+    signal = np.random.randn(1000)
+    kernel = np.random.randn(7)
+    output = np.empty_like(convolve(signal, kernel, step=2, mode=mode, backend="vectorized"))
+
+    tiled_convolve(signal, kernel, output, step=2, mode=mode, tile_budget=512)
+    assert np.array_equal(convolve(signal, kernel, step=2, mode=mode, backend="vectorized"), output)
+
+
+def test_tiled_convolve_default_backend_close_to_convolve():
+    image = np.random.randn(37, 29)
+    kernel = np.random.randn(5, 3)
+    output = np.empty_like(convolve(image, kernel))
+
+    tiled_convolve(image, kernel, output, tile_budget=8 * 60 * 9)
+    assert np.allclose(convolve(image, kernel), output)
+
+
+def test_tiled_convolve_budget_too_small():
+    with pytest.raises(ValueError):
+        tiled_convolve(np.ones((100, 100)), np.ones((3, 3)), np.empty((102, 102)), tile_budget=100)